@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class BlogConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = 'blog'
+
+    def ready(self):
+        from . import search
+
+        search.connect_signals()
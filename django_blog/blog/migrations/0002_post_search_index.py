@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from blog import search
+
+    if schema_editor.connection.vendor == "sqlite":
+        search.install(schema_editor, apps.get_model("blog", "Post"))
+
+
+def uninstall_search_index(apps, schema_editor):
+    from blog import search
+
+    if schema_editor.connection.vendor == "sqlite":
+        search.uninstall(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
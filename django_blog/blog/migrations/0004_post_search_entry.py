@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 20:13
+
+import blog.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_comment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSearchEntry',
+            fields=[
+                ('post', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='blog.post')),
+                ('document', blog.models.FullTextDocument(db_column='blog_post_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'blog_post_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -47,4 +47,42 @@ class Comment(models.Model):
         return f"Comment by {self.author.username} on {self.post.title}"
 
     class Meta:
-        ordering = ["created_at"]
\ No newline at end of file
+        ordering = ["created_at"]
+
+class FullTextDocument(models.TextField):
+    """
+    An FTS5 table's hidden column named after the table, which MATCH
+    queries compare against; see PostSearchEntry.
+    """
+
+
+@FullTextDocument.register_lookup
+class FullTextMatch(models.Lookup):
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", [*lhs_params, *rhs_params]
+
+
+class PostSearchEntry(models.Model):
+    """
+    A post's row in the SQLite FTS5 index kept by blog.search. Unmanaged:
+    the table is created by migration 0002_post_search_index and only
+    exists on SQLite.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column="rowid",
+        related_name="search_entry",
+    )
+    document = FullTextDocument(db_column="blog_post_fts")
+    # bm25() score of the current MATCH; lower is better
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = "blog_post_fts"
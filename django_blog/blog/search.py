@@ -0,0 +1,137 @@
+"""
+Full-text search for blog posts.
+
+On SQLite the posts are indexed in an FTS5 table holding each post's title,
+content and tag names, ranked with bm25(). Tags live in a many-to-many table
+that triggers cannot see, so the index is kept in sync from signals (wired
+in BlogConfig.ready) instead. Other databases fall back to icontains.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+
+from .models import Post, PostSearchEntry, Tag
+
+FTS_TABLE = PostSearchEntry._meta.db_table
+
+
+def is_indexed():
+    return connection.vendor == "sqlite"
+
+
+def install(schema_editor, post_model):
+    """
+    Create the index and fill it with the existing posts. Migrations pass
+    their historical Post model, which matches the schema at that point.
+    """
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(title, content, tags)"
+    )
+    for post in post_model.objects.prefetch_related("tags"):
+        index_post(post)
+
+
+def uninstall(schema_editor):
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def index_post(post):
+    tags = " ".join(tag.name for tag in post.tags.all())
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}(rowid, title, content, tags) VALUES (%s, %s, %s, %s)",
+            [post.pk, post.title, post.content, tags],
+        )
+
+
+def unindex_post(post_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post_id])
+
+
+def build_match_query(query):
+    """Quote each word so user input cannot inject FTS5 syntax"""
+    return " ".join(f'"{term}"*' for term in re.findall(r"\w+", query))
+
+
+def search(query, queryset=None):
+    """Posts matching `query` in their title, content or tags, best first"""
+    if queryset is None:
+        queryset = Post.objects.all()
+    if not is_indexed():
+        return queryset.filter(
+            Q(title__icontains=query)
+            | Q(content__icontains=query)
+            | Q(tags__name__icontains=query)
+        ).distinct()
+
+    match = build_match_query(query)
+    if not match:
+        return queryset.none()
+    # Joined rather than ranked in a subquery, which would re-run the MATCH per row
+    return queryset.filter(search_entry__document__match=match).order_by(
+        "search_entry__rank", "-published_date"
+    )
+
+
+def post_saved(sender, instance, raw=False, **kwargs):
+    if is_indexed() and not raw:
+        index_post(instance)
+
+
+def post_deleted(sender, instance, **kwargs):
+    if is_indexed():
+        unindex_post(instance.pk)
+
+
+def reindex_posts(post_ids):
+    for post in Post.objects.filter(pk__in=post_ids).prefetch_related("tags"):
+        index_post(post)
+
+
+def remember_tag_posts(tag):
+    # A tag's posts are detached before post_clear/post_delete fire
+    tag._search_post_ids = list(tag.posts.values_list("id", flat=True))
+
+
+def tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not is_indexed():
+        return
+    if reverse and action == "pre_clear":
+        remember_tag_posts(instance)
+    elif action in ("post_add", "post_remove", "post_clear"):
+        if not reverse:
+            index_post(instance)
+        elif action == "post_clear":
+            reindex_posts(getattr(instance, "_search_post_ids", []))
+        else:
+            reindex_posts(pk_set)
+
+
+def tag_saved(sender, instance, created, raw=False, **kwargs):
+    if is_indexed() and not created and not raw:
+        reindex_posts(instance.posts.values_list("id", flat=True))
+
+
+def tag_deleting(sender, instance, **kwargs):
+    if is_indexed():
+        remember_tag_posts(instance)
+
+
+def tag_deleted(sender, instance, **kwargs):
+    if is_indexed():
+        reindex_posts(getattr(instance, "_search_post_ids", []))
+
+
+def connect_signals():
+    post_save.connect(post_saved, sender=Post, dispatch_uid="blog_search_post_saved")
+    post_delete.connect(post_deleted, sender=Post, dispatch_uid="blog_search_post_deleted")
+    m2m_changed.connect(
+        tags_changed, sender=Post.tags.through, dispatch_uid="blog_search_tags_changed"
+    )
+    post_save.connect(tag_saved, sender=Tag, dispatch_uid="blog_search_tag_saved")
+    pre_delete.connect(tag_deleting, sender=Tag, dispatch_uid="blog_search_tag_deleting")
+    post_delete.connect(tag_deleted, sender=Tag, dispatch_uid="blog_search_tag_deleted")
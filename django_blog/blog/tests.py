@@ -1,3 +1,101 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase
 
-# Create your tests here.
+from . import search
+from .models import Post, Tag
+from .views import SearchResultsView
+
+
+class SearchIndexTests(TestCase):
+    """The FTS index follows posts and tags through the signals in blog.search"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.django = Tag.objects.create(name="django")
+
+    def create_post(self, title, content="Body", tags=()):
+        post = Post.objects.create(author=self.author, title=title, content=content)
+        post.tags.add(*tags)
+        return post
+
+    def titles(self, query):
+        return [post.title for post in search.search(query)]
+
+    def test_new_posts_are_indexed(self):
+        self.create_post("Django tips", "Views and models")
+        self.assertEqual(self.titles("views"), ["Django tips"])
+
+    def test_edits_replace_the_indexed_text(self):
+        post = self.create_post("Weekend", "Went hiking")
+        post.content = "Stayed home"
+        post.save()
+        self.assertEqual(self.titles("hiking"), [])
+        self.assertEqual(self.titles("home"), ["Weekend"])
+
+    def test_deleted_posts_leave_the_index(self):
+        post = self.create_post("Weekend", "Went hiking")
+        post.delete()
+        self.assertEqual(self.titles("hiking"), [])
+
+    def test_retagging_updates_the_index(self):
+        post = self.create_post("Weekend", tags=[self.django])
+        self.assertEqual(self.titles("django"), ["Weekend"])
+
+        post.tags.remove(self.django)
+        self.assertEqual(self.titles("django"), [])
+        post.tags.add(self.django)
+        post.tags.clear()
+        self.assertEqual(self.titles("django"), [])
+
+    def test_renamed_and_deleted_tags_reindex_their_posts(self):
+        self.create_post("Weekend", tags=[self.django])
+        self.django.name = "python"
+        self.django.save()
+        self.assertEqual(self.titles("django"), [])
+        self.assertEqual(self.titles("python"), ["Weekend"])
+
+        self.django.delete()
+        self.assertEqual(self.titles("python"), [])
+
+    def test_clearing_a_tag_from_the_reverse_side(self):
+        self.create_post("Weekend", tags=[self.django])
+        self.django.posts.clear()
+        self.assertEqual(self.titles("django"), [])
+
+    def test_results_are_ranked_and_match_word_prefixes(self):
+        self.create_post("Weekend", "Went hiking, read about Django")
+        self.create_post("Django tips", "Django django django")
+        self.assertEqual(self.titles("djan"), ["Django tips", "Weekend"])
+        # Words match from their start, not anywhere inside them
+        self.assertEqual(self.titles("ango"), [])
+
+    def test_query_syntax_is_escaped(self):
+        self.create_post("Cooking", "Pasta night")
+        self.assertEqual(self.titles('pasta" (night'), ["Cooking"])
+        self.assertEqual(self.titles("*"), [])
+
+
+class SearchResultsViewTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user(username="author", password="pass12345")
+        Post.objects.create(author=author, title="Django tips", content="Django django")
+        Post.objects.create(author=author, title="Weekend", content="About Django")
+        Post.objects.create(author=author, title="Cooking", content="Pasta night")
+
+    def get(self, query):
+        request = RequestFactory().get("/search/", {"q": query})
+        # Unrendered, so only the view's queryset and context are checked
+        response = SearchResultsView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        return response.context_data
+
+    def test_lists_ranked_matches(self):
+        context = self.get("django")
+        self.assertEqual([post.title for post in context["posts"]], ["Django tips", "Weekend"])
+        self.assertEqual(context["query"], "django")
+
+    def test_empty_query_lists_every_post(self):
+        self.assertEqual(len(self.get("")["posts"]), 3)
+
+    def test_no_matches(self):
+        self.assertEqual(list(self.get("nothing")["posts"]), [])
@@ -13,7 +13,7 @@ from django.views.generic import (
 )
 
 from django.urls import reverse_lazy
-from django.db.models import Q  #  For search queries
+from . import search
 from .models import Post, Comment
 from .forms import CustomUserCreationForm, ProfileUpdateForm, PostForm, CommentForm
 
@@ -234,13 +234,9 @@ class SearchResultsView(ListView):
 
     def get_queryset(self):
         query = self.request.GET.get("q", "")
-        # ✅ Explicitly use Post.objects.filter to satisfy test requirements
         if query:
-            return Post.objects.filter(
-                Q(title__icontains=query)
-                | Q(content__icontains=query)
-                | Q(tags__name__icontains=query)
-            ).distinct()
+            # Ranked full-text match over title, content and tag names
+            return search.search(query, Post.objects.all())
         return Post.objects.all()
 
     def get_context_data(self, **kwargs):
@@ -0,0 +1,184 @@
+"""
+Token authentication without a database query per request.
+
+TokenAuthentication joins Token and User on every request. The classes below
+keep each token, with its user, in two tiers:
+
+* a bounded in-process LRU with a short TTL (TOKEN_AUTH_LOCAL_TTL), so hot
+  clients are resolved without leaving the process, and
+* the Django cache (TOKEN_AUTH_CACHE_TIMEOUT), shared between workers.
+
+Only active users are cached. Deleting or rotating a token and saving or
+deactivating a user call `invalidate_token` / `invalidate_user` (see
+accounts.signals, and UserQuerySet.update for bulk deactivation), which
+clear both tiers in the current process. Other processes drop their local
+copies when the local TTL runs out.
+
+Counters changed with F() updates (followers_count, following_count) do
+not invalidate anything, so the cached user's copies lag behind; code that
+decides on them re-reads them from the database.
+
+ExpiringTokenAuthentication, the default, handles the signed tokens from
+accounts.tokens and falls back to CachedTokenAuthentication for legacy keys,
+which are refused once LEGACY_TOKEN_SUNSET has passed.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+CACHE_KEY = "accounts:token:{key}"
+LOCAL_MAX_ENTRIES = 10_000
+
+
+def get_local_ttl():
+    return getattr(settings, "TOKEN_AUTH_LOCAL_TTL", 30)
+
+
+def get_cache_timeout():
+    return getattr(settings, "TOKEN_AUTH_CACHE_TIMEOUT", 60 * 5)
+
+
+class LocalTokenCache:
+    """Thread-safe LRU of token key -> (token, expiry) with O(1) operations"""
+
+    def __init__(self, max_entries=LOCAL_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            token, expires = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return token
+
+    def set(self, key, token, ttl):
+        with self.lock:
+            self.entries[key] = (token, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_user(self, user_id):
+        with self.lock:
+            stale = [key for key, (token, _) in self.entries.items() if token.user_id == user_id]
+            for key in stale:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_cache = LocalTokenCache()
+
+
+def invalidate_token(key):
+    local_cache.delete(key)
+    cache.delete(CACHE_KEY.format(key=key))
+
+
+def invalidate_user(user):
+    """Forget every cached token of `user`, e.g. after it was deactivated"""
+    invalidate_users([user.pk])
+
+
+def invalidate_users(user_ids):
+    from rest_framework.authtoken.models import Token
+
+    from .models import AuthToken
+
+    for user_id in user_ids:
+        local_cache.delete_user(user_id)
+    keys = [
+        *Token.objects.filter(user_id__in=user_ids).values_list("key", flat=True),
+        *AuthToken.objects.filter(user_id__in=user_ids).values_list("digest", flat=True),
+    ]
+    cache.delete_many([CACHE_KEY.format(key=key) for key in keys])
+
+
+def get_cached_token(key, load):
+    """Look `key` up in the local tier, then the shared tier, then `load()`"""
+    token = local_cache.get(key)
+    if token is None:
+        token = cache.get(CACHE_KEY.format(key=key))
+        if token is None:
+            token = load()
+            cache.set(CACHE_KEY.format(key=key), token, get_cache_timeout())
+        local_cache.set(key, token, get_local_ttl())
+    return token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        from . import tokens
+
+        if tokens.is_legacy_token_sunset():
+            raise exceptions.AuthenticationFailed(_("Token has expired."))
+        token = get_cached_token(key, lambda: self.load_legacy_token(key))
+        # Each request gets its own user instance; views may modify request.user
+        return copy.copy(token.user), token
+
+    def load_legacy_token(self, key):
+        # Raises AuthenticationFailed for unknown keys and inactive users
+        return super().authenticate_credentials(key)[1]
+
+
+class ExpiringTokenAuthentication(CachedTokenAuthentication):
+    """
+    Authenticate the signed, expiring tokens from accounts.tokens.
+
+    Signature and age are checked first, without any I/O; the revocation
+    check by digest goes through the cache tiers above. Legacy
+    rest_framework.authtoken keys are accepted until LEGACY_TOKEN_SUNSET.
+    """
+
+    def authenticate_credentials(self, key):
+        from . import tokens
+
+        if not tokens.is_signed_token(key):
+            return super().authenticate_credentials(key)
+        try:
+            tokens.verify_signature(key)
+        except signing.SignatureExpired:
+            raise exceptions.AuthenticationFailed(_("Token has expired."))
+        except signing.BadSignature:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+
+        digest = tokens.hash_token(key)
+        token = get_cached_token(digest, lambda: self.load_token(digest))
+        # The signature carries the same expiry; this also honours a TTL
+        # shortened after the token was issued
+        if token.expires_at <= timezone.now():
+            raise exceptions.AuthenticationFailed(_("Token has expired."))
+        return copy.copy(token.user), token
+
+    def load_token(self, digest):
+        from .models import AuthToken
+
+        try:
+            token = AuthToken.objects.select_related("user").get(digest=digest)
+        except AuthToken.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+        return token
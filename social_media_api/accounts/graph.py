@@ -0,0 +1,139 @@
+"""
+Follow graph helpers.
+
+Follows are stored in the `User.followers` through table, where `from_user`
+is the account being followed and `to_user` the follower. The ids each user
+follows are cached as a set so feeds and "is following" checks do not query
+the through table; every write below invalidates the follower's entry.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+FOLLOWING_CACHE_KEY = "accounts:following:{user_id}"
+FOLLOW_BATCH_SIZE = 500
+
+
+def get_follow_model():
+    return get_user_model().followers.through
+
+
+def get_cache_timeout():
+    return getattr(settings, "FOLLOWING_CACHE_TIMEOUT", 60 * 60)
+
+
+def get_following_ids(user_id):
+    """Set of ids `user_id` follows, served from the cache when possible"""
+    key = FOLLOWING_CACHE_KEY.format(user_id=user_id)
+    following_ids = cache.get(key)
+    if following_ids is None:
+        following_ids = set(
+            get_follow_model()
+            .objects.filter(to_user_id=user_id)
+            .values_list("from_user_id", flat=True)
+        )
+        cache.set(key, following_ids, get_cache_timeout())
+    return following_ids
+
+
+async def aget_following_ids(user_id):
+    """Async get_following_ids() for async views"""
+    key = FOLLOWING_CACHE_KEY.format(user_id=user_id)
+    following_ids = await cache.aget(key)
+    if following_ids is None:
+        follows = (
+            get_follow_model()
+            .objects.filter(to_user_id=user_id)
+            .values_list("from_user_id", flat=True)
+        )
+        following_ids = {following_id async for following_id in follows}
+        await cache.aset(key, following_ids, get_cache_timeout())
+    return following_ids
+
+
+def is_following(user_id, target_id):
+    return target_id in get_following_ids(user_id)
+
+
+def invalidate_following(user_id):
+    cache.delete(FOLLOWING_CACHE_KEY.format(user_id=user_id))
+
+
+def lock_follower(user):
+    """
+    Lock `user`'s row for the rest of the transaction, so concurrent follows
+    and unfollows by the same account run one at a time
+    """
+    get_user_model().objects.select_for_update().filter(pk=user.pk).values_list("pk").get()
+
+
+def follow_users(user, target_ids):
+    """
+    Make `user` follow every existing account in `target_ids`.
+
+    Returns the ids that were newly followed. Unknown ids, `user` itself and
+    accounts already followed are skipped. Which follows already exist is
+    read from the database under a lock, never from the cache, so the
+    counters only move for rows actually inserted.
+    """
+    User = get_user_model()
+    Follow = get_follow_model()
+    target_ids = set(target_ids) - {user.id}
+    if not target_ids:
+        return set()
+
+    with transaction.atomic():
+        lock_follower(user)
+        existing_ids = set(User.objects.filter(id__in=target_ids).values_list("id", flat=True))
+        followed_ids = set(
+            Follow.objects.filter(to_user_id=user.id, from_user_id__in=existing_ids).values_list(
+                "from_user_id", flat=True
+            )
+        )
+        new_ids = existing_ids - followed_ids
+        if not new_ids:
+            return set()
+
+        Follow.objects.bulk_create(
+            [Follow(from_user_id=target_id, to_user_id=user.id) for target_id in new_ids],
+            batch_size=FOLLOW_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        User.objects.filter(id__in=new_ids).update(followers_count=F("followers_count") + 1)
+        User.objects.filter(id=user.id).update(
+            following_count=F("following_count") + len(new_ids)
+        )
+    invalidate_following(user.id)
+    return new_ids
+
+
+def unfollow_users(user, target_ids):
+    """
+    Make `user` stop following `target_ids`; returns the ids unfollowed.
+
+    The counters are decremented by the rows the DELETE actually removed.
+    """
+    User = get_user_model()
+    Follow = get_follow_model()
+    with transaction.atomic():
+        lock_follower(user)
+        follows = Follow.objects.filter(to_user_id=user.id, from_user_id__in=set(target_ids))
+        removed_ids = set(follows.values_list("from_user_id", flat=True))
+        if not removed_ids:
+            return set()
+
+        deleted, _ = follows.filter(from_user_id__in=removed_ids).delete()
+        if not deleted:
+            return set()
+        # Clamped at zero: the counters are unsigned and may have drifted low
+        User.objects.filter(id__in=removed_ids).update(
+            followers_count=Greatest(F("followers_count") - 1, 0)
+        )
+        User.objects.filter(id=user.id).update(
+            following_count=Greatest(F("following_count") - deleted, 0)
+        )
+    invalidate_following(user.id)
+    return removed_ids
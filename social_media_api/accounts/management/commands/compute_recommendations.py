@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from accounts import recommendations
+
+
+class Command(BaseCommand):
+    help = "Precompute and cache 'people you may know' recommendations"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--limit", type=int, default=recommendations.RECOMMENDATIONS_LIMIT
+        )
+
+    def handle(self, *args, **options):
+        user_ids = (
+            get_user_model()
+            .objects.filter(is_active=True)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        batch, total = [], 0
+        for user_id in user_ids.iterator():
+            batch.append(user_id)
+            if len(batch) == options["batch_size"]:
+                total += self.compute(batch, options["limit"])
+                batch = []
+        if batch:
+            total += self.compute(batch, options["limit"])
+
+        self.stdout.write(self.style.SUCCESS(f"Cached recommendations for {total} users"))
+
+    def compute(self, user_ids, limit):
+        results = recommendations.compute_recommendations(user_ids, limit)
+        recommendations.store_recommendations(results)
+        return len(results)
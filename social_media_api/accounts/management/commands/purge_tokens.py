@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import tokens
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired API tokens in batches, and legacy authtoken keys once "
+        "LEGACY_TOKEN_SUNSET has passed. See accounts.tokens."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=tokens.DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Run again every this many seconds instead of once",
+        )
+
+    def handle(self, *args, **options):
+        if options["interval"] is None:
+            self.run(options)
+            return
+
+        self.stdout.write(f"Purging tokens every {options['interval']:g}s (Ctrl+C to stop)")
+        try:
+            while True:
+                self.run(options)
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
+
+    def run(self, options):
+        purged = tokens.purge_tokens(options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Purged {purged['expired']} expired tokens and {purged['legacy']} legacy keys"
+            )
+        )
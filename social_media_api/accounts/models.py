@@ -1,7 +1,26 @@
-from django.contrib.auth.models import AbstractUser, Group, Permission
+from django.conf import settings
+from django.contrib.auth.models import AbstractUser, Group, Permission, UserManager
 from django.db import models
 
 
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        if "is_active" not in kwargs:
+            return super().update(**kwargs)
+        from .authentication import invalidate_users
+
+        # Bulk updates send no post_save, so drop the cached tokens of the
+        # users being (de)activated here
+        user_ids = list(self.values_list("pk", flat=True))
+        updated = super().update(**kwargs)
+        invalidate_users(user_ids)
+        return updated
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
+
+
 class User(AbstractUser):
     bio = models.TextField(max_length=500, blank=True)
     profile_picture = models.ImageField(
@@ -10,6 +29,11 @@ class User(AbstractUser):
     followers = models.ManyToManyField(
         "self", symmetrical=False, related_name="following", blank=True
     )
+    # Denormalized totals, kept in step with F() updates in accounts.graph
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    objects = CustomUserManager()
 
     groups = models.ManyToManyField(
         Group,
@@ -24,4 +48,20 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.username
-    
\ No newline at end of file
+    
+
+class AuthToken(models.Model):
+    """
+    An issued API token. Only its SHA-256 digest is stored, so a leaked
+    table cannot be replayed; see accounts.tokens.
+    """
+
+    digest = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="auth_tokens"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Token for {self.user_id} expiring {self.expires_at:%Y-%m-%d %H:%M}"
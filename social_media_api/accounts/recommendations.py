@@ -0,0 +1,87 @@
+"""
+"People you may know" recommendations.
+
+Candidates are friends of friends: accounts followed by the accounts a user
+follows, ranked by how many of those paths lead to them. Scores are computed
+in batches from the followers through table with two queries per batch and
+set arithmetic in memory, then cached per user with a TTL. The
+`compute_recommendations` command precomputes them; a cache miss computes a
+single user's list on demand.
+"""
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import graph
+
+RECOMMENDATIONS_CACHE_KEY = "accounts:recommendations:{user_id}"
+RECOMMENDATIONS_LIMIT = 20
+
+
+def get_cache_timeout():
+    return getattr(settings, "RECOMMENDATIONS_CACHE_TIMEOUT", 60 * 60 * 6)
+
+
+def get_edges(user_ids):
+    """Follow rows of the users in `user_ids`, a list of ids or a subquery"""
+    return graph.get_follow_model().objects.filter(to_user_id__in=user_ids)
+
+
+def load_following(user_ids):
+    """Map each id in `user_ids` (ids or a subquery) to the set of ids it follows"""
+    following = defaultdict(set)
+    edges = get_edges(user_ids).values_list("to_user_id", "from_user_id")
+    for follower_id, followed_id in edges.iterator():
+        following[follower_id].add(followed_id)
+    return following
+
+
+def compute_recommendations(user_ids, limit=RECOMMENDATIONS_LIMIT):
+    """
+    Rank friends-of-friends for every id in `user_ids`.
+
+    Returns {user_id: [(candidate_id, mutual_count), ...]}, best first.
+    """
+    first_hop = load_following(user_ids)
+    # The database works out the accounts followed from the first hop's
+    # edges, instead of being sent every one of them as a parameter
+    second_hop = load_following(get_edges(user_ids).values("from_user_id"))
+
+    recommendations = {}
+    for user_id in user_ids:
+        followed = first_hop[user_id]
+        scores = Counter()
+        for followed_id in followed:
+            scores.update(second_hop[followed_id])
+        for excluded_id in followed | {user_id}:
+            scores.pop(excluded_id, None)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        recommendations[user_id] = ranked[:limit]
+    return recommendations
+
+
+def store_recommendations(recommendations):
+    cache.set_many(
+        {
+            RECOMMENDATIONS_CACHE_KEY.format(user_id=user_id): ranked
+            for user_id, ranked in recommendations.items()
+        },
+        get_cache_timeout(),
+    )
+
+
+def get_recommendations(user_id, limit=RECOMMENDATIONS_LIMIT):
+    """Cached recommendations for `user_id`, minus accounts followed since"""
+    ranked = cache.get(RECOMMENDATIONS_CACHE_KEY.format(user_id=user_id))
+    if ranked is None:
+        recommendations = compute_recommendations([user_id])
+        store_recommendations(recommendations)
+        ranked = recommendations[user_id]
+
+    following_ids = graph.get_following_ids(user_id)
+    return [
+        (candidate_id, mutual_count)
+        for candidate_id, mutual_count in ranked
+        if candidate_id not in following_ids
+    ][:limit]
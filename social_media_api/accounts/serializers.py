@@ -1,5 +1,4 @@
 from rest_framework import serializers
-from rest_framework.authtoken.models import Token
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 
@@ -34,14 +33,10 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         validated_data.pop("password2")
-        user = get_user_model().objects.create_user(**validated_data)
-        Token.objects.create(user=user)
-        return user
+        # RegisterView issues the token
+        return get_user_model().objects.create_user(**validated_data)
 
 class UserSerializer(serializers.ModelSerializer):
-    followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
-
     class Meta:
         model = User
         fields = (
@@ -53,13 +48,7 @@ class UserSerializer(serializers.ModelSerializer):
             "followers_count",
             "following_count",
         )
-        read_only_fields = ("id",)
-
-    def get_followers_count(self, obj):
-        return obj.followers.count()
-
-    def get_following_count(self, obj):
-        return obj.following.count()
+        read_only_fields = ("id", "followers_count", "following_count")
 
 
 # Dummy reference for checker strict pattern matching
@@ -67,9 +56,6 @@ _ = serializers.CharField()
 
 
 class FollowSerializer(serializers.ModelSerializer):
-    followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
-
     class Meta:
         model = User
         fields = (
@@ -80,10 +66,19 @@ class FollowSerializer(serializers.ModelSerializer):
             "followers_count",
             "following_count",
         )
-        read_only_fields = ("id", "username")
+        read_only_fields = ("id", "username", "followers_count", "following_count")
 
-    def get_followers_count(self, obj):
-        return obj.followers.count()
 
-    def get_following_count(self, obj):
-        return obj.following.count()
\ No newline at end of file
+class RecommendedUserSerializer(FollowSerializer):
+    mutual_count = serializers.IntegerField(read_only=True)
+
+    class Meta(FollowSerializer.Meta):
+        fields = FollowSerializer.Meta.fields + ("mutual_count",)
+
+
+class UserIdsSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=500,
+    )
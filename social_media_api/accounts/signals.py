@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token, invalidate_user
+from .models import AuthToken
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def forget_cached_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=AuthToken)
+@receiver(post_delete, sender=AuthToken)
+def forget_cached_auth_token(sender, instance, **kwargs):
+    invalidate_token(instance.digest)
+
+
+@receiver(post_save, sender=get_user_model())
+def forget_cached_user(sender, instance, created, **kwargs):
+    # Covers deactivation as well as any other change to the cached user
+    if not created:
+        invalidate_user(instance)
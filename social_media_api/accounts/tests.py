@@ -1,3 +1,294 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from posts.models import Post, TimelineEntry
+
+from . import graph, recommendations, tokens
+from .authentication import local_cache
+from .models import AuthToken
+
+User = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class BatchFollowTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="newcomer", password="pass12345")
+        self.suggested = [User.objects.create(username=f"suggested{i}") for i in range(50)]
+        for account in self.suggested[:5]:
+            Post.objects.create(author=account, title="Hi", content="body")
+        self.client.force_authenticate(user=self.user)
+
+    def test_batch_follow_uses_a_fixed_number_of_queries(self):
+        ids = [account.id for account in self.suggested] + [self.user.id, 9999]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("follow-users"), {"user_ids": ids}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLess(len(queries), 15)
+        self.assertEqual(len(response.data["followed"]), 50)
+        self.assertEqual(response.data["skipped"], sorted([self.user.id, 9999]))
+
+        self.user.refresh_from_db()
+        self.suggested[0].refresh_from_db()
+        self.assertEqual(self.user.following_count, 50)
+        self.assertEqual(self.suggested[0].followers_count, 1)
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.user).count(), 5)
+
+        # Following again is a no-op
+        response = self.client.post(reverse("follow-users"), {"user_ids": ids}, format="json")
+        self.assertEqual(response.data["followed"], [])
+
+    def test_batch_unfollow_and_cache_invalidation(self):
+        ids = [account.id for account in self.suggested[:3]]
+        self.client.post(reverse("follow-users"), {"user_ids": ids}, format="json")
+        self.assertEqual(graph.get_following_ids(self.user.id), set(ids))
+
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_following(self.user.id, ids[0]))
+
+        response = self.client.post(
+            reverse("unfollow-users"), {"user_ids": ids[:2]}, format="json"
+        )
+        self.assertEqual(response.data["unfollowed"], sorted(ids[:2]))
+        self.assertEqual(graph.get_following_ids(self.user.id), {ids[2]})
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.user).count(), 1)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.following_count, 1)
+
+    def test_stale_cache_does_not_inflate_counters(self):
+        target = self.suggested[0]
+        # Cache the empty set, then follow behind its back, as another
+        # worker would
+        self.assertEqual(graph.get_following_ids(self.user.id), set())
+        target.followers.add(self.user)
+
+        self.assertEqual(graph.follow_users(self.user, [target.id]), set())
+        self.user.refresh_from_db()
+        target.refresh_from_db()
+        self.assertEqual((self.user.following_count, target.followers_count), (0, 0))
+
+    def test_follow_reports_a_follow_that_wrote_nothing(self):
+        target = self.suggested[0]
+        # Cache the empty set, then follow behind its back, as another
+        # worker would
+        self.assertEqual(graph.get_following_ids(self.user.id), set())
+        target.followers.add(self.user)
+
+        response = self.client.post(reverse("follow-user", args=[target.id]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["error"], "You are already following this user")
+
+    def test_repeated_unfollow_only_decrements_once(self):
+        target = self.suggested[0]
+        graph.follow_users(self.user, [target.id])
+        self.assertEqual(graph.unfollow_users(self.user, [target.id]), {target.id})
+        self.assertEqual(graph.unfollow_users(self.user, [target.id]), set())
+
+        self.user.refresh_from_db()
+        target.refresh_from_db()
+        self.assertEqual((self.user.following_count, target.followers_count), (0, 0))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class RecommendationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        names = ("me", "alice", "bob", "carol", "dave")
+        self.me, self.alice, self.bob, self.carol, self.dave = [
+            User.objects.create(username=name) for name in names
+        ]
+        self.me.following.add(self.alice, self.bob)
+        self.alice.following.add(self.carol, self.dave, self.me)
+        self.bob.following.add(self.carol)
+        self.client.force_authenticate(user=self.me)
+
+    def test_friends_of_friends_ranked_by_mutual_follows(self):
+        results = recommendations.compute_recommendations([self.me.id, self.bob.id])
+        self.assertEqual(results[self.me.id], [(self.carol.id, 2), (self.dave.id, 1)])
+        self.assertEqual(results[self.bob.id], [])
+
+    def test_second_hop_does_not_send_followed_ids(self):
+        def second_hop_sql():
+            with CaptureQueriesContext(connection) as queries:
+                recommendations.compute_recommendations([self.me.id])
+            self.assertEqual(len(queries), 2)
+            return queries[1]["sql"]
+
+        sql = second_hop_sql()
+        self.me.following.add(*[User.objects.create(username=f"other{i}") for i in range(50)])
+        self.assertEqual(second_hop_sql(), sql)
+
+    def test_endpoint_serves_precomputed_results(self):
+        call_command("compute_recommendations", stdout=StringIO())
+        graph.get_following_ids(self.me.id)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("recommendations"))
+        self.assertEqual(
+            [(user["username"], user["mutual_count"]) for user in response.data],
+            [("carol", 2), ("dave", 1)],
+        )
+
+        self.client.post(reverse("follow-user", args=[self.carol.id]))
+        response = self.client.get(reverse("recommendations"))
+        self.assertEqual([user["username"] for user in response.data], ["dave"])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = User.objects.create_user(username="member", password="pass12345")
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def authenticated_get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("unread-notifications-count"))
+        token_queries = [q for q in queries.captured_queries if "authtoken_token" in q["sql"]]
+        return response, len(token_queries)
+
+    def test_token_lookup_is_cached(self):
+        response, first = self.authenticated_get()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(first, 1)
+        self.assertEqual(self.authenticated_get()[1], 0)
+
+        # The shared tier answers when the local one is cold
+        local_cache.clear()
+        self.assertEqual(self.authenticated_get()[1], 0)
+
+    def test_deactivated_user_is_rejected(self):
+        self.authenticated_get()
+        self.user.is_active = False
+        self.user.save()
+        response, _ = self.authenticated_get()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_bulk_deactivated_user_is_rejected(self):
+        self.authenticated_get()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response, _ = self.authenticated_get()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_is_rejected(self):
+        self.authenticated_get()
+        self.token.delete()
+        response, _ = self.authenticated_get()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_legacy_keys_are_refused_after_the_sunset(self):
+        with self.settings(LEGACY_TOKEN_SUNSET="2999-01-01"):
+            self.assertEqual(self.authenticated_get()[0].status_code, status.HTTP_200_OK)
+        # Even while the token is still cached
+        with self.settings(LEGACY_TOKEN_SUNSET="2000-01-01"):
+            response, _ = self.authenticated_get()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ExpiringTokenTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+
+    def register(self):
+        return self.client.post(
+            reverse("register"),
+            {
+                "username": "newuser",
+                "email": "new@example.com",
+                "password": "Str0ng-pass-phrase",
+                "password2": "Str0ng-pass-phrase",
+            },
+        )
+
+    def get_with_token(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("unread-notifications-count"))
+        return response, len(queries)
+
+    def test_registration_writes_one_hashed_token(self):
+        response = self.register()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        token = response.data["token"]
+
+        self.assertFalse(Token.objects.exists())
+        auth_token = AuthToken.objects.get()
+        self.assertEqual(auth_token.digest, tokens.hash_token(token))
+        self.assertNotIn(token, auth_token.digest)
+        self.assertEqual(self.get_with_token(token)[0].status_code, status.HTTP_200_OK)
+
+    def test_login_issues_a_new_token(self):
+        first = self.register().data["token"]
+        second = self.client.post(
+            reverse("login"), {"username": "newuser", "password": "Str0ng-pass-phrase"}
+        ).data["token"]
+        self.assertNotEqual(first, second)
+        self.assertEqual(AuthToken.objects.count(), 2)
+
+    def test_forged_and_expired_tokens_fail_without_queries(self):
+        token = self.register().data["token"]
+        response, queries = self.get_with_token(token[:-2] + "xx")
+        self.assertEqual((response.status_code, queries), (status.HTTP_401_UNAUTHORIZED, 0))
+
+        with self.settings(AUTH_TOKEN_TTL=0):
+            response, queries = self.get_with_token(token)
+        self.assertEqual((response.status_code, queries), (status.HTTP_401_UNAUTHORIZED, 0))
+
+    def test_revoked_token_is_rejected(self):
+        token = self.register().data["token"]
+        self.assertEqual(self.get_with_token(token)[0].status_code, status.HTTP_200_OK)
+        AuthToken.objects.all().delete()
+        self.assertEqual(self.get_with_token(token)[0].status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PurgeTokensTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="member", password="pass12345")
+        self.live = tokens.issue_token(self.user)[1]
+        self.expired = [tokens.issue_token(self.user)[1] for _ in range(3)]
+        AuthToken.objects.filter(id__in=[token.id for token in self.expired]).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        self.legacy = Token.objects.create(user=self.user)
+
+    def test_purges_expired_tokens_in_batches(self):
+        out = StringIO()
+        call_command("purge_tokens", batch_size=2, stdout=out)
+        self.assertIn("Purged 3 expired tokens and 0 legacy keys", out.getvalue())
+        self.assertEqual(list(AuthToken.objects.all()), [self.live])
+        self.assertTrue(Token.objects.exists())
+
+    def test_purges_legacy_keys_after_the_sunset(self):
+        with self.settings(LEGACY_TOKEN_SUNSET="2000-01-01T00:00:00Z"):
+            purged = tokens.purge_tokens()
+        self.assertEqual(purged, {"expired": 3, "legacy": 1})
+        self.assertFalse(Token.objects.exists())
+
+    def test_sunset_setting_is_parsed(self):
+        with self.settings(LEGACY_TOKEN_SUNSET=""):
+            self.assertIsNone(tokens.get_legacy_token_sunset())
+        with self.settings(LEGACY_TOKEN_SUNSET="2030-06-01"):
+            self.assertEqual(tokens.get_legacy_token_sunset().date().isoformat(), "2030-06-01")
+        with self.settings(LEGACY_TOKEN_SUNSET="soon"):
+            with self.assertRaises(ImproperlyConfigured):
+                tokens.get_legacy_token_sunset()
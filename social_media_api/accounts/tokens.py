@@ -0,0 +1,113 @@
+"""
+Expiring, hashed API tokens.
+
+A token is a signed, timestamped payload (django.core.signing) naming its
+user, so its integrity and age can be verified from the string alone: a
+forged, truncated or expired token is rejected without touching the
+database. Tokens that pass are looked up by their SHA-256 digest, the only
+form in which they are stored, which lets them be revoked by deleting the
+row; accounts.authentication caches that lookup.
+
+Tokens live for AUTH_TOKEN_TTL seconds. Every login issues a new one.
+Legacy rest_framework.authtoken keys have no expiry of their own; they are
+refused from LEGACY_TOKEN_SUNSET on. `purge_tokens()` (the purge_tokens
+command) deletes expired tokens, and legacy keys once the sunset has passed.
+"""
+import hashlib
+import secrets
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.authtoken.models import Token
+
+from .models import AuthToken
+
+DEFAULT_BATCH_SIZE = 1000
+
+SIGNING_SALT = "accounts.tokens"
+
+
+def get_token_ttl():
+    return getattr(settings, "AUTH_TOKEN_TTL", 60 * 60 * 24 * 14)
+
+
+def get_legacy_token_sunset():
+    """When legacy authtoken keys stop working, or None if they never do"""
+    value = getattr(settings, "LEGACY_TOKEN_SUNSET", None)
+    if not value:
+        return None
+    if isinstance(value, str):
+        parsed = parse_datetime(value) or parse_date(value)
+        if parsed is None:
+            raise ImproperlyConfigured(f"LEGACY_TOKEN_SUNSET is not a date: {value!r}")
+        value = parsed
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time.min)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def is_legacy_token_sunset():
+    sunset = get_legacy_token_sunset()
+    return sunset is not None and sunset <= timezone.now()
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def is_signed_token(token):
+    # Legacy rest_framework.authtoken keys are plain hex
+    return ":" in token
+
+
+def issue_token(user):
+    """Create a token for `user`; returns (token string, AuthToken)"""
+    token = signing.dumps({"u": user.pk, "n": secrets.token_hex(8)}, salt=SIGNING_SALT)
+    auth_token = AuthToken.objects.create(
+        digest=hash_token(token),
+        user=user,
+        expires_at=timezone.now() + timedelta(seconds=get_token_ttl()),
+    )
+    return token, auth_token
+
+
+def verify_signature(token):
+    """
+    Check a token's signature and age without the database.
+
+    Raises signing.SignatureExpired or signing.BadSignature.
+    """
+    return signing.loads(token, salt=SIGNING_SALT, max_age=get_token_ttl())
+
+
+def purge_batch(queryset, batch_size):
+    """Delete up to `batch_size` rows of `queryset`; returns how many went"""
+    with transaction.atomic():
+        ids = list(queryset.order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return 0
+        # Deleting through the ORM sends post_delete, which drops cached copies
+        deleted, _ = queryset.model.objects.filter(pk__in=ids).delete()
+    return deleted
+
+
+def purge_tokens(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Delete expired tokens in batches, and every legacy key once
+    LEGACY_TOKEN_SUNSET has passed. Returns {"expired": n, "legacy": n}.
+    """
+    purged = {"expired": 0, "legacy": 0}
+    querysets = {"expired": AuthToken.objects.filter(expires_at__lte=timezone.now())}
+    if is_legacy_token_sunset():
+        querysets["legacy"] = Token.objects.all()
+    for kind, queryset in querysets.items():
+        while deleted := purge_batch(queryset, batch_size):
+            purged[kind] += deleted
+    return purged
@@ -5,6 +5,9 @@ from .views import (
     ProfileView,
     FollowUserView,
     UnfollowUserView,
+    BatchFollowView,
+    BatchUnfollowView,
+    RecommendationsView,
 )
 
 urlpatterns = [
@@ -13,4 +16,7 @@ urlpatterns = [
     path("profile/", ProfileView.as_view(), name="profile"),
      path("follow/<int:user_id>/", FollowUserView.as_view(), name="follow-user"),
     path("unfollow/<int:user_id>/", UnfollowUserView.as_view(), name="unfollow-user"),
+    path("follow/", BatchFollowView.as_view(), name="follow-users"),
+    path("unfollow/", BatchUnfollowView.as_view(), name="unfollow-users"),
+    path("recommendations/", RecommendationsView.as_view(), name="recommendations"),
 ]
\ No newline at end of file
@@ -1,10 +1,16 @@
 from rest_framework import status, generics, permissions
 from rest_framework.response import Response
-from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
-from .serializers import UserRegistrationSerializer, UserSerializer
+from posts import timeline
+from . import graph, recommendations, tokens
+from .serializers import (
+    RecommendedUserSerializer,
+    UserIdsSerializer,
+    UserRegistrationSerializer,
+    UserSerializer,
+)
 
 # Assume your actual custom user model is CustomUser
 CustomUser = get_user_model()
@@ -19,10 +25,14 @@ class RegisterView(generics.CreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
-        token, created = Token.objects.get_or_create(user=user)
+        token, auth_token = tokens.issue_token(user)
 
         return Response(
-            {"user": UserSerializer(user).data, "token": token.key},
+            {
+                "user": UserSerializer(user).data,
+                "token": token,
+                "expires_at": auth_token.expires_at,
+            },
             status=status.HTTP_201_CREATED,
         )
 
@@ -33,9 +43,16 @@ class LoginView(ObtainAuthToken):
         )
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data["user"]
-        token, created = Token.objects.get_or_create(user=user)
+        # A fresh expiring token per login
+        token, auth_token = tokens.issue_token(user)
 
-        return Response({"user": UserSerializer(user).data, "token": token.key})
+        return Response(
+            {
+                "user": UserSerializer(user).data,
+                "token": token,
+                "expires_at": auth_token.expires_at,
+            }
+        )
 
 
 class ProfileView(generics.RetrieveUpdateAPIView):
@@ -43,7 +60,8 @@ class ProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        # request.user may come from the token cache; show current counters
+        return CustomUser.objects.get(pk=self.request.user.pk)
 
 
 class FollowUserView(generics.GenericAPIView):
@@ -60,13 +78,20 @@ class FollowUserView(generics.GenericAPIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        if request.user.following.filter(id=user_id).exists():
+        if graph.is_following(request.user.id, user_id):
             return Response(
                 {"error": "You are already following this user"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        request.user.following.add(user_to_follow)
+        followed_ids = graph.follow_users(request.user, [user_id])
+        if not followed_ids:
+            # A concurrent request followed first; the cached check missed it
+            return Response(
+                {"error": "You are already following this user"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        timeline.backfill_timeline(request.user, followed_ids)
         return Response(
             {"message": f"You are now following {user_to_follow.username}"},
             status=status.HTTP_200_OK,
@@ -81,18 +106,88 @@ class UnfollowUserView(generics.GenericAPIView):
         """Unfollow a user"""
         user_to_unfollow = get_object_or_404(CustomUser, id=user_id)
 
-        if not request.user.following.filter(id=user_id).exists():
+        if not graph.is_following(request.user.id, user_id):
             return Response(
                 {"error": "You are not following this user"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        request.user.following.remove(user_to_unfollow)
+        unfollowed_ids = graph.unfollow_users(request.user, [user_id])
+        if not unfollowed_ids:
+            # A concurrent request unfollowed first
+            return Response(
+                {"error": "You are not following this user"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        timeline.remove_authors_from_timeline(request.user, unfollowed_ids)
         return Response(
             {"message": f"You have unfollowed {user_to_unfollow.username}"},
             status=status.HTTP_200_OK,
         )
 
 
+class BatchFollowView(generics.GenericAPIView):
+    """Follow several users at once, e.g. suggested accounts during onboarding"""
+
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = UserIdsSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user_ids = set(serializer.validated_data["user_ids"])
+
+        followed_ids = graph.follow_users(request.user, user_ids)
+        timeline.backfill_timeline(request.user, followed_ids)
+        return Response(
+            {
+                "followed": sorted(followed_ids),
+                "skipped": sorted(user_ids - followed_ids),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class BatchUnfollowView(generics.GenericAPIView):
+    """Unfollow several users at once"""
+
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = UserIdsSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user_ids = set(serializer.validated_data["user_ids"])
+
+        unfollowed_ids = graph.unfollow_users(request.user, user_ids)
+        timeline.remove_authors_from_timeline(request.user, unfollowed_ids)
+        return Response(
+            {
+                "unfollowed": sorted(unfollowed_ids),
+                "skipped": sorted(user_ids - unfollowed_ids),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class RecommendationsView(generics.GenericAPIView):
+    """People the current user may know, ranked by mutual follows"""
+
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = RecommendedUserSerializer
+
+    def get(self, request):
+        ranked = recommendations.get_recommendations(request.user.id)
+        users = CustomUser.objects.in_bulk([candidate_id for candidate_id, _ in ranked])
+
+        results = []
+        for candidate_id, mutual_count in ranked:
+            user = users.get(candidate_id)
+            if user is not None and user.is_active:
+                user.mutual_count = mutual_count
+                results.append(user)
+        return Response(self.get_serializer(results, many=True).data)
+
+
 # Dummy reference to ensure the checker detects this literal string
 _ = CustomUser.objects.all()
\ No newline at end of file
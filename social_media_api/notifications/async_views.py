@@ -0,0 +1,82 @@
+"""
+Async versions of the notifications read endpoints, for deployments under
+ASGI.
+
+They return the same responses as their counterparts in
+notifications.views but await the database instead of blocking a worker
+thread on it.
+"""
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from rest_framework.response import Response
+from social_media_api.async_api import async_api_view
+from social_media_api.conditional import arespond_conditionally
+from social_media_api.pagination import NotificationPagination
+from . import stream
+from .models import Notification
+from .serializers import NotificationValuesSerializer
+from .views import UNREAD_LIST_LIMIT, UNREAD_LIST_MAX_LIMIT, get_read_state_version
+
+
+async def aget_read_state_version(request):
+    return await sync_to_async(get_read_state_version)(request)
+
+
+@async_api_view()
+async def notification_list(request):
+    """Async NotificationListView"""
+    notifications = Notification.objects.filter(recipient=request.user).with_related()
+
+    async def render():
+        rows = NotificationValuesSerializer.get_queryset(notifications)
+        paginator = NotificationPagination()
+        page = await paginator.apaginate_queryset(rows, request)
+        if page is not None:
+            serializer = NotificationValuesSerializer(page)
+            return paginator.get_paginated_response(await serializer.adata())
+        return Response(await NotificationValuesSerializer(rows).adata())
+
+    version = await aget_read_state_version(request)
+    return await arespond_conditionally(request, notifications, "timestamp", render, version)
+
+
+@async_api_view()
+async def unread_notifications(request):
+    """
+    Get the most recent unread notifications for the current user.
+
+    Same parameters and response as notifications.views.unread_notifications.
+    """
+    try:
+        limit = int(request.query_params.get("limit", UNREAD_LIST_LIMIT))
+    except ValueError:
+        limit = UNREAD_LIST_LIMIT
+    limit = min(max(limit, 1), UNREAD_LIST_MAX_LIMIT)
+
+    unread = Notification.objects.filter(recipient=request.user, read=False)
+
+    async def render():
+        rows = NotificationValuesSerializer.get_queryset(unread.with_related())
+        serializer = NotificationValuesSerializer(rows[:limit])
+        return Response({"count": version[0], "notifications": await serializer.adata()})
+
+    version = await aget_read_state_version(request)
+    return await arespond_conditionally(request, unread, "timestamp", render, version)
+
+
+@async_api_view()
+async def notification_stream(request):
+    """
+    Push the current user's new notifications as server-sent events.
+
+    Send Last-Event-ID (EventSource does so when it reconnects) to resume
+    after that event; see notifications.stream.
+    """
+    response = StreamingHttpResponse(
+        stream.stream_notifications(request.user.id, request.headers.get("Last-Event-ID")),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,80 @@
+"""
+Per-user unread notification counters.
+
+The count lives in the cache and is adjusted in place when notifications
+are created, marked read or deleted, after the change commits. On a cache
+miss it is recomputed from the database, so a lost or evicted key only
+costs one COUNT(*).
+
+A recount can race a write: the write's adjustment may find no key yet and
+be dropped while the COUNT missed it, or land on a stored count that
+already included it. Keys therefore expire after
+NOTIFICATION_UNREAD_COUNT_TIMEOUT (five minutes by default; cache.incr()
+keeps the expiry), which bounds how long such a count can be off.
+
+Each user also has a list version stamp, bumped when notifications are
+deleted; together with the unread count it versions the conditional GET
+validators of the notification lists.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Notification
+
+CACHE_KEY = "notifications:unread:{user_id}"
+VERSION_KEY = "notifications:version:{user_id}"
+
+
+def get_cache_timeout():
+    return getattr(settings, "NOTIFICATION_UNREAD_COUNT_TIMEOUT", 60 * 5)
+
+
+def get_unread_count(user_id):
+    key = CACHE_KEY.format(user_id=user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, read=False).count()
+        cache.add(key, count, get_cache_timeout())
+    return max(count, 0)
+
+
+def adjust_unread_count(user_id, delta):
+    """
+    Shift a cached counter by `delta` once the current transaction commits,
+    so a rolled back write never moves it; uncached counters are left to
+    the DB.
+    """
+    if not delta:
+        return
+
+    def adjust():
+        try:
+            cache.incr(CACHE_KEY.format(user_id=user_id), delta)
+        except ValueError:
+            pass
+
+    transaction.on_commit(adjust)
+
+
+def reset_unread_count(user_id):
+    cache.delete(CACHE_KEY.format(user_id=user_id))
+
+
+def get_list_version(user_id):
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so an evicted stamp never repeats an old value
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key, 0)
+    return version
+
+
+def bump_list_version(user_id):
+    """Change `user_id`'s list version once the current transaction commits"""
+    transaction.on_commit(
+        lambda: cache.set(VERSION_KEY.format(user_id=user_id), time.time_ns(), None)
+    )
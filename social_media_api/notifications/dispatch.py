@@ -0,0 +1,220 @@
+"""
+Notification dispatch pipeline.
+
+Views call `notify()`, which by default delivers directly on the request
+path with `deliver()`. Deployments that run the `process_notifications`
+worker set NOTIFICATION_DISPATCH = "queue": `notify()` then only appends a
+NotificationEvent to the queue table, and the worker drains it in batches.
+Without a running worker queued events are never delivered.
+
+Delivery aggregates: events sharing a recipient, verb and target are folded
+into the recipient's unread notification for that target if one was created
+within NOTIFICATION_AGGREGATION_WINDOW seconds of its first event ("alice
+and 41 others liked your post"), which is updated in place rather than
+joined by a new row. The window does not slide with later events, so a
+busy target still starts a new notification once the window has passed.
+Every created or updated notification takes a new stream position from
+NotificationSequence; once the batch commits, the recipients' event streams
+are woken (see notifications.stream).
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import stream
+from .counters import adjust_unread_count
+from .models import Notification, NotificationEvent, NotificationSequence
+
+DEFAULT_BATCH_SIZE = 500
+# How many actor ids an aggregated notification remembers
+RECENT_ACTORS_LIMIT = 3
+
+
+def is_queued():
+    return getattr(settings, "NOTIFICATION_DISPATCH", "inline") == "queue"
+
+
+def get_aggregation_window():
+    seconds = getattr(settings, "NOTIFICATION_AGGREGATION_WINDOW", 60 * 60 * 24)
+    return timedelta(seconds=seconds)
+
+
+def build_event(recipient_id, actor_id, verb, target=None):
+    event = NotificationEvent(recipient_id=recipient_id, actor_id=actor_id, verb=verb)
+    if target is not None:
+        event.target_content_type = ContentType.objects.get_for_model(target)
+        event.target_object_id = target.pk
+    return event
+
+
+def notify(recipient_id, actor_id, verb, target=None):
+    """Queue (or, in inline mode, deliver) a notification for `recipient_id`"""
+    event = build_event(recipient_id, actor_id, verb, target)
+    if is_queued():
+        event.save()
+    else:
+        with transaction.atomic():
+            deliver([event])
+
+
+def notify_many(notifications):
+    """
+    `notify()` for many (recipient_id, actor_id, verb, target) tuples, queued
+    with one bulk insert per DEFAULT_BATCH_SIZE events.
+    """
+    events = [build_event(*notification) for notification in notifications]
+    if not events:
+        return
+    if is_queued():
+        NotificationEvent.objects.bulk_create(events, batch_size=DEFAULT_BATCH_SIZE)
+    else:
+        with transaction.atomic():
+            deliver(events)
+
+
+def get_group_key(item):
+    """Events and notifications aggregate on (recipient, verb, target)"""
+    return (
+        item.recipient_id,
+        item.verb,
+        item.target_content_type_id,
+        item.target_object_id,
+    )
+
+
+def merge_actors(recent_actors, new_actor_ids):
+    """
+    Newest-first actor ids without duplicates, and how many are new.
+
+    Only RECENT_ACTORS_LIMIT ids are remembered, so an actor who has dropped
+    out of `recent_actors` counts as new again; actor counts built from this
+    are an upper bound on the distinct actors.
+    """
+    merged = list(dict.fromkeys([*reversed(new_actor_ids), *recent_actors]))
+    added = len(set(new_actor_ids) - set(recent_actors))
+    return merged[:RECENT_ACTORS_LIMIT], added
+
+
+def allocate_sequence(count):
+    """Take `count` new stream positions from NotificationSequence's ids"""
+    tickets = [NotificationSequence() for _ in range(count)]
+    if connection.features.can_return_rows_from_bulk_insert:
+        NotificationSequence.objects.bulk_create(tickets)
+    else:
+        for ticket in tickets:
+            ticket.save()
+    ids = [ticket.pk for ticket in tickets]
+    NotificationSequence.objects.filter(pk__in=ids).delete()
+    return ids
+
+
+def deliver(events):
+    """
+    Turn events into notifications, updating recent aggregates in place.
+
+    Must run inside a transaction. Returns the number of notifications
+    created; updated aggregates are not counted.
+    """
+    groups = {}
+    for event in events:
+        key = get_group_key(event)
+        if event.target_object_id is None:
+            # Untargeted events never aggregate; keep them apart
+            key += (event.actor_id,)
+        groups.setdefault(key, []).append(event)
+
+    candidates = (
+        Notification.objects.select_for_update()
+        .filter(
+            recipient_id__in={event.recipient_id for event in events},
+            target_object_id__in={event.target_object_id for event in events},
+            read=False,
+            created_at__gte=timezone.now() - get_aggregation_window(),
+        )
+        .order_by("timestamp")
+    )
+    # Later rows win, so each key maps to its most recent aggregate
+    aggregates = {
+        get_group_key(notification): notification
+        for notification in candidates
+        if get_group_key(notification) in groups
+    }
+
+    now = timezone.now()
+    to_create, to_update = [], []
+    for key, group in groups.items():
+        actor_ids = [event.actor_id for event in group]
+        notification = aggregates.get(key)
+        if notification is None:
+            recent_actors, added = merge_actors([], actor_ids)
+            to_create.append(
+                Notification(
+                    recipient_id=group[0].recipient_id,
+                    actor_id=actor_ids[-1],
+                    verb=group[0].verb,
+                    target_content_type_id=group[0].target_content_type_id,
+                    target_object_id=group[0].target_object_id,
+                    actor_count=added,
+                    recent_actors=recent_actors,
+                )
+            )
+            continue
+
+        notification.recent_actors, added = merge_actors(
+            notification.recent_actors or [notification.actor_id], actor_ids
+        )
+        notification.actor_id = actor_ids[-1]
+        notification.actor_count += added
+        notification.timestamp = now
+        to_update.append(notification)
+
+    changed = [*to_create, *to_update]
+    if changed:
+        for notification, sequence in zip(changed, allocate_sequence(len(changed))):
+            notification.sequence = sequence
+
+    Notification.objects.bulk_create(to_create)
+    Notification.objects.bulk_update(
+        to_update, ["actor", "actor_count", "recent_actors", "timestamp", "sequence"]
+    )
+
+    # bulk_create skips post_save, so keep the unread counters in step here
+    created = Counter(notification.recipient_id for notification in to_create)
+    for recipient_id, count in created.items():
+        adjust_unread_count(recipient_id, count)
+
+    recipient_ids = {notification.recipient_id for notification in changed}
+    transaction.on_commit(lambda: stream.publish(recipient_ids))
+    return len(to_create)
+
+
+def process_events(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Deliver up to `batch_size` queued events.
+
+    Returns the number of events consumed.
+    """
+    with transaction.atomic():
+        events = list(
+            NotificationEvent.objects.select_for_update(skip_locked=True).order_by("id")[
+                :batch_size
+            ]
+        )
+        if not events:
+            return 0
+
+        deliver(events)
+        NotificationEvent.objects.filter(id__in=[event.id for event in events]).delete()
+    return len(events)
+
+
+def drain_queue(batch_size=DEFAULT_BATCH_SIZE):
+    """Process batches until the queue is empty; returns events consumed"""
+    total = 0
+    while processed := process_events(batch_size):
+        total += processed
+    return total
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications import dispatch
+
+
+class Command(BaseCommand):
+    help = "Run the notification worker: turn queued events into notifications"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=dispatch.DEFAULT_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Drain the queue once and exit"
+        )
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            processed = dispatch.drain_queue(options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} events"))
+            return
+
+        self.stdout.write("Waiting for notification events (Ctrl+C to stop)")
+        try:
+            while True:
+                processed = dispatch.process_events(options["batch_size"])
+                if processed:
+                    self.stdout.write(f"Processed {processed} events")
+                else:
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
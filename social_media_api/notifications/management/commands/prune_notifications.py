@@ -0,0 +1,81 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications import retention
+
+
+class Command(BaseCommand):
+    help = (
+        "Compact and delete (or archive) old read notifications in batches, "
+        "then ANALYZE or VACUUM the table. See notifications.retention."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            help="Delete read notifications older than this "
+            "(default NOTIFICATION_RETENTION_DAYS)",
+        )
+        parser.add_argument(
+            "--compact-after-days",
+            type=int,
+            help="Fold read notifications for the same target older than this "
+            "(default NOTIFICATION_COMPACT_AFTER_DAYS)",
+        )
+        parser.add_argument("--no-compact", action="store_false", dest="compact")
+        parser.add_argument(
+            "--batch-size", type=int, default=retention.DEFAULT_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--archive",
+            metavar="PATH",
+            help="Append deleted rows to this gzipped NDJSON file",
+        )
+        parser.add_argument(
+            "--vacuum",
+            action="store_true",
+            help="VACUUM as well as ANALYZE afterwards (rewrites the SQLite file)",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Run again every this many seconds instead of once",
+        )
+
+    def handle(self, *args, **options):
+        if options["interval"] is None:
+            self.run(options)
+            return
+
+        self.stdout.write(
+            f"Pruning notifications every {options['interval']:g}s (Ctrl+C to stop)"
+        )
+        try:
+            while True:
+                self.run(options)
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
+
+    def run(self, options):
+        report = retention.run_retention(
+            retention_days=options["days"],
+            compact_after_days=options["compact_after_days"],
+            batch_size=options["batch_size"],
+            archive_to=options["archive"],
+            compact=options["compact"],
+            vacuum=options["vacuum"],
+            on_batch=self.report_batch if options["verbosity"] > 1 else None,
+        )
+        for phase, stats in report.summary().items():
+            self.stdout.write(
+                f"{phase:<12} {stats['rows']:>8} rows in {stats['batches']} batches, "
+                f"{stats['seconds'] * 1000:.1f} ms (slowest batch "
+                f"{stats['max_batch_seconds'] * 1000:.1f} ms)"
+            )
+        self.stdout.write(self.style.SUCCESS("Notification retention done"))
+
+    def report_batch(self, stats):
+        self.stdout.write(f"  {stats.phase}: {stats.rows} rows in {stats.seconds * 1000:.1f} ms")
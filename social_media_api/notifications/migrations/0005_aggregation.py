@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_notificationevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='recent_actors',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 19:33
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def copy_timestamps(apps, schema_editor):
+    # Existing rows have no record of their first event; their timestamp is
+    # the closest thing to it
+    Notification = apps.get_model("notifications", "Notification")
+    Notification.objects.update(created_at=models.F("timestamp"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0005_aggregation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copy_timestamps, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 6.0 on 2026-10-18 19:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def number_notifications(apps, schema_editor):
+    # Existing rows get stream positions in (timestamp, id) order, the
+    # order streams used to read them in
+    Notification = apps.get_model("notifications", "Notification")
+    NotificationSequence = apps.get_model("notifications", "NotificationSequence")
+    value, batch = 0, []
+    for notification in Notification.objects.order_by("timestamp", "id").only("id").iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        value += 1
+        notification.sequence = value
+        batch.append(notification)
+        if len(batch) == BATCH_SIZE:
+            Notification.objects.bulk_update(batch, ["sequence"])
+            batch = []
+    Notification.objects.bulk_update(batch, ["sequence"])
+    NotificationSequence.objects.create(pk=1, value=value)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notifications', '0006_aggregation_window'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='sequence',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'sequence'], name='notif_recipient_seq_idx'),
+        ),
+        migrations.RunPython(number_notifications, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 20:02
+
+from django.core.management.color import no_style
+from django.db import migrations, models
+
+
+def continue_from_counter(apps, schema_editor):
+    # New ids must follow the positions already handed out: insert the
+    # highest one explicitly, move the table's sequence past it (SQLite's
+    # AUTOINCREMENT does this by itself) and drop the row again
+    Notification = apps.get_model("notifications", "Notification")
+    NotificationSequence = apps.get_model("notifications", "NotificationSequence")
+    NotificationSequence.objects.all().delete()
+    latest = Notification.objects.aggregate(latest=models.Max("sequence"))["latest"]
+    if not latest:
+        return
+    NotificationSequence.objects.create(pk=latest)
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [NotificationSequence]):
+            cursor.execute(sql)
+    NotificationSequence.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0007_stream_sequence'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='notificationsequence',
+            name='value',
+        ),
+        migrations.RunPython(continue_from_counter, migrations.RunPython.noop),
+    ]
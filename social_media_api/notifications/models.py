@@ -2,6 +2,26 @@ from django.db import models
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+
+
+def format_summary(actor_username, actor_count, verb):
+    """Notification text, e.g. 'alice and 3 others liked your post'"""
+    others = actor_count - 1
+    if others <= 0:
+        return f"{actor_username} {verb}"
+    noun = "other" if others == 1 else "others"
+    return f"{actor_username} and {others} {noun} {verb}"
+
+
+class NotificationQuerySet(models.QuerySet):
+    def with_related(self):
+        """
+        Load actors and recipients with a join and resolve the generic
+        targets in batches: prefetching `target` groups the rows by content
+        type and fetches each type's objects with a single query.
+        """
+        return self.select_related("actor", "recipient").prefetch_related("target")
 
 
 class Notification(models.Model):
@@ -17,11 +37,95 @@ class Notification(models.Model):
     )
     target_object_id = models.PositiveIntegerField(null=True, blank=True)
     target = GenericForeignKey("target_content_type", "target_object_id")
+    # Time of the latest activity; aggregates move up when they are updated
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Time of the first event, which anchors the aggregation window
+    created_at = models.DateTimeField(default=timezone.now)
     read = models.BooleanField(default=False)
+    # Aggregated notifications: `actor` is the most recent actor, `actor_count`
+    # how many actors the row stands for and `recent_actors` their latest ids.
+    # Only the latest ids are kept, so an actor who drops out of them and
+    # acts again is counted twice: `actor_count` is an upper bound.
+    actor_count = models.PositiveIntegerField(default=1)
+    recent_actors = models.JSONField(default=list, blank=True)
+    # Event stream position, assigned by dispatch.deliver() whenever the row
+    # is created or updated; see NotificationSequence
+    sequence = models.BigIntegerField(null=True, blank=True)
+
+    objects = NotificationQuerySet.as_manager()
 
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            # Keyset pagination key, see social_media_api.pagination
+            models.Index(
+                fields=["recipient", "-timestamp", "-id"],
+                name="notif_recipient_ts_id_idx",
+            ),
+            models.Index(
+                fields=["recipient", "read", "-timestamp"],
+                name="notif_recipient_read_ts_idx",
+            ),
+            # Smaller index over unread rows only; skipped on backends
+            # without partial index support
+            models.Index(
+                fields=["recipient", "-timestamp"],
+                condition=models.Q(read=False),
+                name="notif_unread_idx",
+            ),
+            # Stream resume point, see notifications.stream
+            models.Index(
+                fields=["recipient", "sequence"],
+                name="notif_recipient_seq_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return self.summary
+
+    @property
+    def summary(self):
+        return format_summary(self.actor.username, self.actor_count, self.verb)
+
+
+class NotificationSequence(models.Model):
+    """
+    Source of Notification.sequence values, a portable stand-in for a
+    database sequence: each delivered notification takes the id of a row
+    inserted here, and the rows are deleted again straight away.
+
+    Inserts don't wait for each other the way updates to one counter row
+    would, but ids are taken before commit and may become visible out of
+    order; notifications.stream re-reads recent rows to catch up.
+    """
+
+    def __str__(self):
+        return str(self.pk)
+
+
+class NotificationEvent(models.Model):
+    """
+    A queued notification waiting for the dispatch worker.
+
+    Rows are written on the request path and turned into Notification rows
+    in batches by `manage.py process_notifications`.
+    """
+
+    recipient = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    verb = models.CharField(max_length=255)
+    target_content_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, null=True, blank=True, related_name="+"
+    )
+    target_object_id = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
 
     def __str__(self):
-        return f"{self.actor.username} {self.verb}"
\ No newline at end of file
+        return f"{self.actor_id} {self.verb} (queued for {self.recipient_id})"
@@ -0,0 +1,252 @@
+"""
+Retention for the notifications table.
+
+Notification rows used to be kept forever. `run_retention()` bounds the
+table in three phases, each working in batches of at most `batch_size`
+rows (or groups) per transaction, so locks stay short and a run can be
+stopped at any point:
+
+* compact: read notifications older than NOTIFICATION_COMPACT_AFTER_DAYS
+  that share a recipient, verb and target are folded into the newest of
+  them, the way `dispatch.deliver()` aggregates unread ones.
+* purge: read notifications older than NOTIFICATION_RETENTION_DAYS are
+  deleted, after being appended to a gzipped NDJSON file when `archive_to`
+  is given.
+* maintenance: the table is ANALYZEd, or VACUUMed and analyzed when
+  `vacuum` is set, so the planner and the file size catch up with the
+  deletions.
+
+Unread notifications are never touched, so the unread counters stay valid.
+Rows are deleted without a post_delete per row (see `delete_read`), and
+each batch bumps the list version of every recipient it touched once.
+Each batch is timed; the returned RetentionReport holds the rows removed
+and seconds taken per batch, and `on_batch(stats)` is called after each one
+for schedulers that forward them to their own metrics. The
+prune_notifications command runs this once or every `--interval` seconds.
+"""
+import gzip
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .counters import bump_list_version
+from .dispatch import RECENT_ACTORS_LIMIT, get_group_key
+from .models import Notification
+
+DEFAULT_BATCH_SIZE = 1000
+ARCHIVE_FIELDS = [
+    "id",
+    "recipient_id",
+    "actor_id",
+    "verb",
+    "target_content_type_id",
+    "target_object_id",
+    "timestamp",
+    "created_at",
+    "read",
+    "actor_count",
+    "recent_actors",
+]
+
+
+def get_retention_days():
+    return getattr(settings, "NOTIFICATION_RETENTION_DAYS", 90)
+
+
+def get_compact_after_days():
+    return getattr(settings, "NOTIFICATION_COMPACT_AFTER_DAYS", 7)
+
+
+class BatchStats:
+    def __init__(self, phase, rows, seconds):
+        self.phase = phase
+        self.rows = rows
+        self.seconds = seconds
+
+
+class RetentionReport:
+    """Rows removed and time spent, per batch and per phase"""
+
+    def __init__(self):
+        self.batches = []
+
+    def add(self, phase, rows, seconds):
+        stats = BatchStats(phase, rows, seconds)
+        self.batches.append(stats)
+        return stats
+
+    def summary(self):
+        phases = {}
+        for stats in self.batches:
+            phase = phases.setdefault(
+                stats.phase, {"batches": 0, "rows": 0, "seconds": 0.0, "max_batch_seconds": 0.0}
+            )
+            phase["batches"] += 1
+            phase["rows"] += stats.rows
+            phase["seconds"] += stats.seconds
+            phase["max_batch_seconds"] = max(phase["max_batch_seconds"], stats.seconds)
+        return phases
+
+
+def delete_read(ids, recipient_ids):
+    """
+    Delete the read notifications `ids` in one statement. Nothing references
+    notifications and read ones are not counted, so the post_delete handler
+    would only bump each row's list version; bump each recipient's once.
+    """
+    deleted = Notification.objects.filter(id__in=ids)._raw_delete(Notification.objects.db)
+    for recipient_id in recipient_ids:
+        bump_list_version(recipient_id)
+    return deleted
+
+
+def compact_batch(cutoff, batch_size):
+    """
+    Fold up to `batch_size` groups of old read notifications into the newest
+    row of each group. Returns the number of rows deleted.
+    """
+    old_read = Notification.objects.filter(
+        read=True, timestamp__lt=cutoff, target_object_id__isnull=False
+    )
+    with transaction.atomic():
+        keys = set(
+            old_read.order_by()
+            .values_list("recipient_id", "verb", "target_content_type_id", "target_object_id")
+            .annotate(rows=Count("id"))
+            .filter(rows__gt=1)
+            .values_list("recipient_id", "verb", "target_content_type_id", "target_object_id")[
+                :batch_size
+            ]
+        )
+        if not keys:
+            return 0
+
+        candidates = old_read.select_for_update().filter(
+            recipient_id__in={key[0] for key in keys},
+            target_object_id__in={key[3] for key in keys},
+        )
+        groups = {}
+        for notification in candidates.order_by("-timestamp", "-id"):
+            key = get_group_key(notification)
+            if key in keys:
+                groups.setdefault(key, []).append(notification)
+
+        kept, removed_ids, recipient_ids = [], [], set()
+        for newest, *older in groups.values():
+            # Newest actors first, as dispatch.merge_actors keeps them
+            actor_ids = [
+                actor_id
+                for row in (newest, *older)
+                for actor_id in row.recent_actors or [row.actor_id]
+            ]
+            newest.recent_actors = list(dict.fromkeys(actor_ids))[:RECENT_ACTORS_LIMIT]
+            # Rows may share actors, so like the aggregates themselves this
+            # is an upper bound on the distinct actors
+            newest.actor_count += sum(row.actor_count for row in older)
+            kept.append(newest)
+            removed_ids.extend(row.id for row in older)
+            recipient_ids.add(newest.recipient_id)
+
+        Notification.objects.bulk_update(kept, ["actor_count", "recent_actors"])
+        delete_read(removed_ids, recipient_ids)
+    return len(removed_ids)
+
+
+def purge_batch(cutoff, after_id, batch_size, archive=None):
+    """
+    Delete up to `batch_size` read notifications older than `cutoff` with ids
+    above `after_id`, writing them to the `archive` file first if given.
+    Returns (rows deleted, last id seen).
+    """
+    expired = Notification.objects.filter(read=True, timestamp__lt=cutoff, id__gt=after_id)
+    with transaction.atomic():
+        rows = list(expired.order_by("id").values(*ARCHIVE_FIELDS)[:batch_size])
+        if not rows:
+            return 0, after_id
+        if archive is not None:
+            archive.writelines(json.dumps(row, cls=DjangoJSONEncoder) + "\n" for row in rows)
+            archive.flush()
+        ids = [row["id"] for row in rows]
+        deleted = delete_read(ids, {row["recipient_id"] for row in rows})
+    return deleted, ids[-1]
+
+
+def run_maintenance(vacuum=False):
+    """ANALYZE (and optionally VACUUM) the notifications table after deletions"""
+    table = connection.ops.quote_name(Notification._meta.db_table)
+    if connection.vendor == "sqlite":
+        # SQLite can only VACUUM the whole database file
+        statements = ["VACUUM", f"ANALYZE {table}"] if vacuum else [f"ANALYZE {table}"]
+    elif connection.vendor == "postgresql":
+        statements = [f"VACUUM ANALYZE {table}" if vacuum else f"ANALYZE {table}"]
+    elif connection.vendor == "mysql":
+        statements = [f"OPTIMIZE TABLE {table}" if vacuum else f"ANALYZE TABLE {table}"]
+    else:
+        return []
+    # VACUUM cannot run inside a transaction
+    if connection.in_atomic_block:
+        statements = [statement for statement in statements if "VACUUM" not in statement]
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+    return statements
+
+
+def run_retention(
+    retention_days=None,
+    compact_after_days=None,
+    batch_size=DEFAULT_BATCH_SIZE,
+    archive_to=None,
+    compact=True,
+    vacuum=False,
+    on_batch=None,
+):
+    """
+    Compact, purge and maintain the notifications table; see the module
+    docstring. Returns a RetentionReport.
+    """
+    if retention_days is None:
+        retention_days = get_retention_days()
+    if compact_after_days is None:
+        compact_after_days = get_compact_after_days()
+    now = timezone.now()
+    report = RetentionReport()
+
+    def record(phase, rows, started):
+        stats = report.add(phase, rows, time.perf_counter() - started)
+        if on_batch is not None:
+            on_batch(stats)
+
+    if compact:
+        cutoff = now - timedelta(days=compact_after_days)
+        while True:
+            started = time.perf_counter()
+            removed = compact_batch(cutoff, batch_size)
+            if not removed:
+                break
+            record("compact", removed, started)
+
+    cutoff = now - timedelta(days=retention_days)
+    archive = gzip.open(archive_to, "at", encoding="utf-8") if archive_to else None
+    try:
+        after_id = 0
+        while True:
+            started = time.perf_counter()
+            deleted, after_id = purge_batch(cutoff, after_id, batch_size, archive)
+            if not deleted:
+                break
+            record("purge", deleted, started)
+    finally:
+        if archive is not None:
+            archive.close()
+
+    started = time.perf_counter()
+    run_maintenance(vacuum)
+    record("maintenance", 0, started)
+    return report
@@ -1,10 +1,15 @@
+from asgiref.sync import sync_to_async
+from django.contrib.contenttypes.models import ContentType
 from rest_framework import serializers
-from .models import Notification
+from social_media_api.fast_serializers import ValuesSerializer, format_datetime
+from .models import Notification, format_summary
 
 
 class NotificationSerializer(serializers.ModelSerializer):
     actor = serializers.StringRelatedField(read_only=True)
     recipient = serializers.StringRelatedField(read_only=True)
+    summary = serializers.ReadOnlyField()
+    target_summary = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
@@ -17,5 +22,107 @@ class NotificationSerializer(serializers.ModelSerializer):
             "target_object_id",
             "timestamp",
             "read",
+            "actor_count",
+            "recent_actors",
+            "summary",
+            "target_summary",
         ]
-        read_only_fields = ["id", "recipient", "actor", "timestamp"]
\ No newline at end of file
+        read_only_fields = [
+            "id",
+            "recipient",
+            "actor",
+            "timestamp",
+            "actor_count",
+            "recent_actors",
+        ]
+
+    def get_target_summary(self, obj):
+        """A compact description of the target, e.g. a post's id and title"""
+        content_type_id = obj.target_content_type_id
+        if content_type_id is None or get_target_model(content_type_id) is None:
+            return None
+        return summarize_target(content_type_id, obj.target)
+
+
+def get_target_model(content_type_id):
+    """
+    The model behind a target content type, or None for a stale type whose
+    model no longer exists; targets of those are reported as null. Served
+    from ContentType's cache, so this adds no query.
+    """
+    return ContentType.objects.get_for_id(content_type_id).model_class()
+
+
+def summarize_target(content_type_id, target):
+    if target is None:
+        return None
+    # get_for_id is served from ContentType's cache, so this adds no query
+    content_type = ContentType.objects.get_for_id(content_type_id)
+    summary = {"type": content_type.model, "id": target.pk}
+    if hasattr(target, "title"):
+        summary["title"] = target.title
+    return summary
+
+
+class MarkReadSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=1000,
+    )
+    before = serializers.DateTimeField(required=False)
+
+
+class NotificationValuesSerializer(ValuesSerializer):
+    """NotificationSerializer's output built from values() rows"""
+
+    fields = (
+        ("id", "id", None),
+        ("recipient", "recipient__username", None),
+        ("actor", "actor__username", None),
+        ("verb", "verb", None),
+        ("target_content_type", "target_content_type_id", None),
+        ("target_object_id", "target_object_id", None),
+        ("timestamp", "timestamp", format_datetime),
+        ("read", "read", None),
+        ("actor_count", "actor_count", None),
+        ("recent_actors", "recent_actors", None),
+        ("summary", None, None),
+        ("target_summary", None, None),
+    )
+
+    def get_target_ids(self, rows):
+        """{content type id: target ids} for the rows that have a target"""
+        target_ids = {}
+        for row in rows:
+            if row["target_content_type_id"] is not None:
+                target_ids.setdefault(row["target_content_type_id"], set()).add(
+                    row["target_object_id"]
+                )
+        return target_ids
+
+    def add_summaries(self, rows, data, targets):
+        for row, item in zip(rows, data):
+            item["summary"] = format_summary(
+                row["actor__username"], row["actor_count"], row["verb"]
+            )
+            content_type_id = row["target_content_type_id"]
+            if content_type_id is not None:
+                target = targets[content_type_id].get(row["target_object_id"])
+                item["target_summary"] = summarize_target(content_type_id, target)
+
+    def add_related(self, rows, data):
+        """Fill in summaries, loading each target type with one query"""
+        targets = {}
+        for content_type_id, ids in self.get_target_ids(rows).items():
+            model = get_target_model(content_type_id)
+            targets[content_type_id] = model._base_manager.in_bulk(ids) if model else {}
+        self.add_summaries(rows, data, targets)
+
+    async def aadd_related(self, rows, data):
+        targets = {}
+        for content_type_id, ids in self.get_target_ids(rows).items():
+            model = await sync_to_async(get_target_model)(content_type_id)
+            targets[content_type_id] = await model._base_manager.ain_bulk(ids) if model else {}
+        self.add_summaries(rows, data, targets)
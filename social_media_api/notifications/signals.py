@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .counters import adjust_unread_count, bump_list_version
+from .models import Notification
+
+
+@receiver(post_save, sender=Notification)
+def count_new_notification(sender, instance, created, **kwargs):
+    if created and not instance.read:
+        adjust_unread_count(instance.recipient_id, 1)
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    if not instance.read:
+        adjust_unread_count(instance.recipient_id, -1)
+    # Removing a row does not move the newest timestamp
+    bump_list_version(instance.recipient_id)
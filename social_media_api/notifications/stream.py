@@ -0,0 +1,266 @@
+"""
+Server-sent events stream of new notifications.
+
+Instead of polling `unread_notifications`, a client keeps one connection to
+`notification_stream` open and receives each notification as it is created
+or re-aggregated. Every event id is the highest `sequence` the stream has
+sent, so a reconnecting EventSource sends it back as Last-Event-ID and the
+stream resumes from the notifications table.
+
+Sequences are ids taken from NotificationSequence before the delivering
+transaction commits, so a slow delivery can commit a row below a position
+a stream has already passed. Streams therefore also re-read rows stamped
+in the last LATE_COMMIT_SECONDS, skipping the ones they have sent; only a
+delivery that takes longer than that to commit can be missed. A resumed
+stream does not know what its predecessor sent, so it may repeat events
+from those last seconds; their `id` identifies the notification.
+
+`deliver()` publishes the recipients of each committed batch to a broker,
+which only wakes their streams; the rows themselves are always read from
+the table. Two brokers are available through NOTIFICATION_STREAM_BROKER:
+
+* "memory" (default): in-process pub/sub, waking streams served by the
+  same process that delivered the notifications.
+* "cache": a stand-in for a real broker such as Redis pub/sub. Publishing
+  writes a per-user stamp to the Django cache and streams poll it every
+  NOTIFICATION_STREAM_POLL_INTERVAL seconds, which reaches other processes
+  when CACHES is shared.
+
+Streams also read the table on every heartbeat, so with either broker a
+notification delivered by a separate worker process arrives within
+NOTIFICATION_STREAM_HEARTBEAT seconds. Connections are closed after
+NOTIFICATION_STREAM_TIMEOUT seconds; the client reconnects and resumes.
+The stream needs an ASGI server: under WSGI the response would be buffered.
+"""
+import asyncio
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from social_media_api.renderers import FastJSONRenderer
+from .models import Notification
+from .serializers import NotificationValuesSerializer
+
+CACHE_KEY = "notifications:stream:{user_id}"
+# Most notifications read from the table per query
+FETCH_BATCH_SIZE = 100
+# Milliseconds an EventSource waits before reconnecting
+RETRY_MILLISECONDS = 2000
+# Seconds a delivery may take between taking a sequence and committing
+LATE_COMMIT_SECONDS = 5
+
+
+def get_heartbeat():
+    return getattr(settings, "NOTIFICATION_STREAM_HEARTBEAT", 15)
+
+
+def get_stream_timeout():
+    return getattr(settings, "NOTIFICATION_STREAM_TIMEOUT", 60 * 5)
+
+
+def get_poll_interval():
+    return getattr(settings, "NOTIFICATION_STREAM_POLL_INTERVAL", 1.0)
+
+
+class Subscription:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+        self.stamp = None
+
+
+class MemoryBroker:
+    """In-process pub/sub; publish() may be called from any thread"""
+
+    def __init__(self):
+        self.subscriptions = {}
+        self.lock = threading.Lock()
+
+    async def subscribe(self, user_id):
+        subscription = Subscription(user_id)
+        with self.lock:
+            self.subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(subscription.user_id, None)
+
+    def publish(self, user_ids):
+        with self.lock:
+            subscriptions = [
+                subscription
+                for user_id in set(user_ids)
+                for subscription in self.subscriptions.get(user_id, ())
+            ]
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.event.set)
+            except RuntimeError:
+                # The stream's event loop has shut down
+                self.unsubscribe(subscription)
+
+    async def wait(self, subscription, timeout):
+        """Wait up to `timeout` seconds for a publish; True if one came"""
+        try:
+            await asyncio.wait_for(subscription.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        subscription.event.clear()
+        return True
+
+
+class CacheBroker:
+    """Pub/sub through per-user stamps in the Django cache, polled by streams"""
+
+    async def subscribe(self, user_id):
+        subscription = Subscription(user_id)
+        subscription.stamp = await cache.aget(CACHE_KEY.format(user_id=user_id))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        pass
+
+    def publish(self, user_ids):
+        stamp = time.time_ns()
+        cache.set_many(
+            {CACHE_KEY.format(user_id=user_id): stamp for user_id in set(user_ids)},
+            get_heartbeat() * 2,
+        )
+
+    async def wait(self, subscription, timeout):
+        key = CACHE_KEY.format(user_id=subscription.user_id)
+        deadline = time.monotonic() + timeout
+        while True:
+            stamp = await cache.aget(key)
+            if stamp is not None and stamp != subscription.stamp:
+                subscription.stamp = stamp
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(get_poll_interval(), remaining))
+
+
+memory_broker = MemoryBroker()
+cache_broker = CacheBroker()
+
+
+def get_broker():
+    if getattr(settings, "NOTIFICATION_STREAM_BROKER", "memory") == "cache":
+        return cache_broker
+    return memory_broker
+
+
+def publish(user_ids):
+    """Wake the streams of `user_ids`; call once their notifications are committed"""
+    get_broker().publish(user_ids)
+
+
+def encode_event_id(position):
+    return str(position)
+
+
+def decode_event_id(event_id):
+    """Sequence from a Last-Event-ID header, or None if it is not one of ours"""
+    try:
+        position = int(event_id or "")
+    except ValueError:
+        return None
+    return position if position >= 0 else None
+
+
+def format_event(event_id, data, event="notification"):
+    return (
+        f"id: {event_id}\nevent: {event}\n"
+        f"data: {FastJSONRenderer().render(data).decode()}\n\n"
+    )
+
+
+def get_late_commit_cutoff():
+    return timezone.now() - timedelta(seconds=LATE_COMMIT_SECONDS)
+
+
+async def get_start(user_id):
+    """
+    Position of the user's newest notification and the recent positions
+    below it, so a new stream skips history
+    """
+    notifications = Notification.objects.filter(recipient_id=user_id)
+    latest = await notifications.aaggregate(position=Max("sequence"))
+    recent = notifications.filter(
+        sequence__isnull=False, timestamp__gte=get_late_commit_cutoff()
+    ).values_list("sequence", flat=True)
+    return latest["position"] or 0, [sequence async for sequence in recent]
+
+
+async def fetch_since(user_id, position, sent=()):
+    """
+    Notifications of `user_id` after `position`, plus recent ones below it
+    that committed late, oldest first with their positions; positions in
+    `sent` are skipped.
+    """
+    notifications = (
+        Notification.objects.filter(recipient_id=user_id)
+        .filter(
+            Q(sequence__gt=position)
+            | Q(sequence__isnull=False, timestamp__gte=get_late_commit_cutoff())
+        )
+        .exclude(sequence__in=sent)
+        .order_by("sequence")
+    )
+    rows = notifications.values(*NotificationValuesSerializer.lookups, "sequence")[
+        :FETCH_BATCH_SIZE
+    ]
+    serializer = NotificationValuesSerializer([row async for row in rows])
+    data = await serializer.adata()
+    return [(row["sequence"], item) for row, item in zip(serializer.instance, data)]
+
+
+async def stream_notifications(user_id, last_event_id=None):
+    """
+    Yield SSE messages for `user_id`'s new notifications until the stream
+    times out, starting after `last_event_id` when it is given.
+    """
+    broker = get_broker()
+    # Subscribe before reading the table so nothing published in between is lost
+    subscription = await broker.subscribe(user_id)
+    try:
+        # Positions sent within the late commit window, with when they were sent
+        sent = {}
+        position = decode_event_id(last_event_id)
+        if position is None:
+            position, recent = await get_start(user_id)
+            sent = dict.fromkeys(recent, time.monotonic())
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+
+        deadline = time.monotonic() + get_stream_timeout()
+        while True:
+            while batch := await fetch_since(user_id, position, sent):
+                for sequence, data in batch:
+                    position = max(position, sequence)
+                    sent[sequence] = time.monotonic()
+                    yield format_event(encode_event_id(position), data)
+                if len(batch) < FETCH_BATCH_SIZE:
+                    break
+            # Rows stamped before this have left the window fetch_since re-reads
+            forget_before = time.monotonic() - LATE_COMMIT_SECONDS * 2
+            sent = {sequence: at for sequence, at in sent.items() if at >= forget_before}
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if not await broker.wait(subscription, min(get_heartbeat(), remaining)):
+                # Comments keep proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+    finally:
+        broker.unsubscribe(subscription)
@@ -1,3 +1,727 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from accounts import tokens
+from posts.models import Post
+
+from . import retention, stream
+from .counters import get_cache_timeout, get_unread_count
+from .dispatch import allocate_sequence, build_event, deliver, drain_queue, notify
+from .models import Notification, NotificationEvent, NotificationSequence
+from .serializers import NotificationSerializer, NotificationValuesSerializer
+
+User = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class NotificationListTests(APITestCase):
+    def setUp(self):
+        self.recipient = User.objects.create_user(username="recipient", password="pass12345")
+        self.actor = User.objects.create_user(username="actor", password="pass12345")
+        for _ in range(3):
+            Notification.objects.create(
+                recipient=self.recipient, actor=self.actor, verb="liked your post"
+            )
+        self.client.force_authenticate(user=self.recipient)
+
+    def test_list_is_unpaginated_by_default(self):
+        response = self.client.get(reverse("notifications-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 3)
+
+    def test_cursor_pagination_walks_every_notification_once(self):
+        response = self.client.get(
+            reverse("notifications-list"), {"pagination": "cursor", "page_size": 2}
+        )
+        ids = [item["id"] for item in response.data["results"]]
+        response = self.client.get(response.data["next"])
+        ids += [item["id"] for item in response.data["results"]]
+
+        self.assertIsNone(response.data["next"])
+        expected = Notification.objects.order_by("-timestamp", "-id").values_list("id", flat=True)
+        self.assertEqual(ids, list(expected))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class MarkReadTests(APITestCase):
+    def setUp(self):
+        self.recipient = User.objects.create_user(username="recipient", password="pass12345")
+        self.other = User.objects.create_user(username="other", password="pass12345")
+        self.notifications = [
+            Notification.objects.create(
+                recipient=self.recipient, actor=self.other, verb="liked your post"
+            )
+            for _ in range(3)
+        ]
+        self.foreign = Notification.objects.create(
+            recipient=self.other, actor=self.recipient, verb="liked your post"
+        )
+        self.client.force_authenticate(user=self.recipient)
+
+    def unread_ids(self):
+        return set(Notification.objects.filter(read=False).values_list("id", flat=True))
+
+    def test_mark_single_notification_read(self):
+        url = reverse("mark-notification-read", args=[self.notifications[0].id])
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_200_OK)
+        self.assertNotIn(self.notifications[0].id, self.unread_ids())
+
+        url = reverse("mark-notification-read", args=[self.foreign.id])
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bulk_mark_by_ids_only_touches_own_notifications(self):
+        ids = [self.notifications[0].id, self.foreign.id]
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                reverse("mark-notifications-read"), {"ids": ids}, format="json"
+            )
+
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(
+            self.unread_ids(),
+            {self.notifications[1].id, self.notifications[2].id, self.foreign.id},
+        )
+
+    def test_bulk_mark_all_and_up_to_timestamp(self):
+        cutoff = self.notifications[1].timestamp
+        Notification.objects.filter(pk=self.notifications[2].pk).update(
+            timestamp=cutoff + timedelta(minutes=1)
+        )
+        response = self.client.post(
+            reverse("mark-notifications-read"), {"before": cutoff.isoformat()}, format="json"
+        )
+        self.assertEqual(response.data["updated"], 2)
+
+        response = self.client.post(reverse("mark-notifications-read"))
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(self.unread_ids(), {self.foreign.id})
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class UnreadCountTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.recipient = User.objects.create_user(username="recipient", password="pass12345")
+        self.actor = User.objects.create_user(username="actor", password="pass12345")
+        self.client.force_authenticate(user=self.recipient)
+
+    def notify(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(
+                recipient=self.recipient, actor=self.actor, verb="liked your post"
+            )
+
+    def post(self, *args, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(*args, **kwargs)
+
+    def get_count(self):
+        response = self.client.get(reverse("unread-notifications-count"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["count"]
+
+    def test_counter_follows_create_read_and_delete(self):
+        first, second = self.notify(), self.notify()
+        self.assertEqual(self.get_count(), 2)
+
+        # Served from the cache once primed, and kept in step afterwards
+        third = self.notify()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_count(), 3)
+
+        self.post(reverse("mark-notification-read", args=[first.id]))
+        self.post(reverse("mark-notification-read", args=[first.id]))
+        self.assertEqual(self.get_count(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(self.get_count(), 1)
+
+        self.post(reverse("mark-notifications-read"), {"ids": [third.id]}, format="json")
+        self.assertEqual(self.get_count(), 0)
+
+    def test_a_lost_adjustment_is_recounted_when_the_key_expires(self):
+        self.notify()
+        self.assertEqual(self.get_count(), 1)
+        # Its on_commit adjustment never runs, like one lost to a recount
+        Notification.objects.create(
+            recipient=self.recipient, actor=self.actor, verb="liked your post"
+        )
+        self.assertEqual(self.get_count(), 1)
+
+        expired = time.time() + get_cache_timeout() + 1
+        with mock.patch("django.core.cache.backends.locmem.time.time", return_value=expired):
+            self.assertEqual(get_unread_count(self.recipient.id), 2)
+
+    def test_rolled_back_writes_leave_the_counter_alone(self):
+        self.notify()
+        self.assertEqual(self.get_count(), 1)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Notification.objects.create(
+                recipient=self.recipient, actor=self.actor, verb="liked your post"
+            )
+            raise RuntimeError
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_count(), 1)
+
+    def test_unread_list_is_capped(self):
+        for _ in range(5):
+            self.notify()
+        response = self.client.get(reverse("unread-notifications"), {"limit": 2})
+        self.assertEqual(response.data["count"], 5)
+        self.assertEqual(len(response.data["notifications"]), 2)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, NOTIFICATION_DISPATCH="queue")
+class DispatchQueueTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.fan = User.objects.create_user(username="fan", password="pass12345")
+        self.post = Post.objects.create(author=self.author, title="Hello", content="body")
+        self.client.force_authenticate(user=self.fan)
+
+    def test_like_enqueues_and_worker_creates_notification(self):
+        self.client.post(reverse("like-post", args=[self.post.id]))
+        self.assertEqual(NotificationEvent.objects.count(), 1)
+        self.assertFalse(Notification.objects.exists())
+
+        self.assertEqual(drain_queue(), 1)
+
+        notification = Notification.objects.get()
+        self.assertEqual(
+            (notification.recipient, notification.actor, notification.target),
+            (self.author, self.fan, self.post),
+        )
+        self.assertFalse(NotificationEvent.objects.exists())
+
+    def test_duplicate_events_collapse_into_one_insert(self):
+        for _ in range(3):
+            notify(self.author.id, self.fan.id, "liked your post", target=self.post)
+        notify(self.author.id, self.fan.id, "commented on your post", target=self.post)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(drain_queue(batch_size=10), 4)
+
+        table = Notification._meta.db_table
+        inserts = [q for q in queries if q["sql"].startswith(f'INSERT INTO "{table}"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Notification.objects.count(), 2)
+
+    @override_settings(NOTIFICATION_DISPATCH="inline")
+    def test_inline_mode_skips_the_queue(self):
+        notify(self.author.id, self.fan.id, "liked your post", target=self.post)
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertFalse(NotificationEvent.objects.exists())
+
+
+class AggregationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.fans = [
+            User.objects.create_user(username=f"fan{i}", password="pass12345") for i in range(4)
+        ]
+        self.post = Post.objects.create(author=self.author, title="Hello", content="body")
+
+    def like(self, fan):
+        notify(self.author.id, fan.id, "liked your post", target=self.post)
+
+    def test_likes_on_a_post_update_one_aggregate(self):
+        self.like(self.fans[0])
+        drain_queue()
+        for fan in self.fans[1:]:
+            self.like(fan)
+        self.like(self.fans[3])
+        drain_queue()
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor, self.fans[3])
+        self.assertEqual(notification.actor_count, 4)
+        self.assertEqual(
+            notification.recent_actors, [self.fans[3].id, self.fans[2].id, self.fans[1].id]
+        )
+        self.assertEqual(notification.summary, "fan3 and 3 others liked your post")
+
+    def test_read_or_expired_aggregates_are_not_reused(self):
+        self.like(self.fans[0])
+        drain_queue()
+        Notification.objects.update(read=True)
+        self.like(self.fans[1])
+        drain_queue()
+
+        Notification.objects.filter(read=False).update(
+            created_at=timezone.now() - timedelta(days=2)
+        )
+        with self.settings(NOTIFICATION_AGGREGATION_WINDOW=60):
+            self.like(self.fans[2])
+            drain_queue()
+
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertEqual(set(Notification.objects.values_list("actor_count", flat=True)), {1})
+
+    def test_window_is_anchored_to_the_first_event(self):
+        self.like(self.fans[0])
+        drain_queue()
+        # Recent activity does not extend the window of an old aggregate
+        Notification.objects.update(created_at=timezone.now() - timedelta(days=2))
+        with self.settings(NOTIFICATION_AGGREGATION_WINDOW=60 * 60 * 24):
+            self.like(self.fans[1])
+            drain_queue()
+            self.like(self.fans[2])
+            drain_queue()
+
+        self.assertEqual(
+            list(Notification.objects.order_by("id").values_list("actor_count", flat=True)),
+            [1, 2],
+        )
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class TargetResolutionTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.recipient = User.objects.create_user(username="recipient", password="pass12345")
+        self.client.force_authenticate(user=self.recipient)
+
+    def add_notifications(self, count):
+        for _ in range(count):
+            actor = User.objects.create(username=f"actor{User.objects.count()}")
+            post = Post.objects.create(author=self.recipient, title="Hello", content="body")
+            Notification.objects.create(
+                recipient=self.recipient, actor=actor, verb="liked your post", target=post
+            )
+            Notification.objects.create(recipient=self.recipient, actor=actor, verb="followed you")
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries), response
+
+    def test_targets_resolve_at_constant_query_cost(self):
+        for url in (reverse("notifications-list"), reverse("unread-notifications")):
+            with self.subTest(url=url):
+                Notification.objects.all().delete()
+                self.add_notifications(1)
+                few, _ = self.count_queries(url)
+                self.add_notifications(5)
+                many, response = self.count_queries(url)
+
+                self.assertEqual(few, many)
+                data = response.data
+                if isinstance(data, dict):
+                    data = data["notifications"]
+                summaries = [item["target_summary"] for item in data]
+                self.assertIn(None, summaries)
+                post_summary = next(summary for summary in summaries if summary)
+                self.assertEqual(post_summary["type"], "post")
+                self.assertEqual(post_summary["title"], "Hello")
+
+    def test_targets_of_stale_content_types_are_null(self):
+        # A type whose model was removed from the code base
+        stale = ContentType.objects.create(app_label="archive", model="story")
+        notification = Notification.objects.create(
+            recipient=self.recipient,
+            actor=self.recipient,
+            verb="liked your story",
+            target_content_type=stale,
+            target_object_id=1,
+        )
+        for url in (reverse("notifications-list"), reverse("async-notifications-list")):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertIsNone(response.json()[0]["target_summary"])
+        self.assertIsNone(NotificationSerializer(notification).data["target_summary"])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.recipient = User.objects.create_user(username="recipient", password="pass12345")
+        self.actor = User.objects.create_user(username="actor", password="pass12345")
+        self.notification = Notification.objects.create(
+            recipient=self.recipient, actor=self.actor, verb="liked your post"
+        )
+        self.client.force_authenticate(user=self.recipient)
+
+    def revalidate(self, url, response):
+        with CaptureQueriesContext(connection) as queries:
+            revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        return revalidated, len(queries)
+
+    def test_unchanged_list_returns_304_before_serializing(self):
+        url = reverse("notifications-list")
+        response = self.client.get(url)
+        # Read state is versioned in the ETag, which a date cannot follow
+        self.assertNotIn("Last-Modified", response)
+
+        revalidated, queries = self.revalidate(url, response)
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+        # Just the validator aggregate; nothing is fetched or serialized
+        self.assertEqual(queries, 1)
+
+    def test_new_and_read_notifications_change_the_etag(self):
+        for url in (reverse("notifications-list"), reverse("unread-notifications")):
+            response = self.client.get(url)
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.create(
+                    recipient=self.recipient, actor=self.actor, verb="followed you"
+                )
+            self.assertEqual(self.revalidate(url, response)[0].status_code, status.HTTP_200_OK)
+
+            response = self.client.get(url)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse("mark-notifications-read"))
+            self.assertEqual(self.revalidate(url, response)[0].status_code, status.HTTP_200_OK)
+
+    def test_if_modified_since_does_not_hide_read_state(self):
+        url = reverse("notifications-list")
+        self.client.get(url)
+        self.client.post(reverse("mark-notifications-read"))
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data[0]["read"])
+
+    def test_deleting_an_older_notification_changes_the_etag(self):
+        older = Notification.objects.create(
+            recipient=self.recipient, actor=self.actor, verb="followed you"
+        )
+        Notification.objects.filter(pk=older.pk).update(
+            timestamp=timezone.now() - timedelta(days=1)
+        )
+        url = reverse("notifications-list")
+        response = self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            older.delete()
+        self.assertEqual(self.revalidate(url, response)[0].status_code, status.HTTP_200_OK)
+
+
+class NotificationValuesSerializerTests(APITestCase):
+    def test_output_matches_notification_serializer(self):
+        recipient = User.objects.create_user(username="recipient", password="pass12345")
+        actor = User.objects.create_user(username="actor", password="pass12345")
+        post = Post.objects.create(author=recipient, title="Hello", content="Body")
+        deleted = Post.objects.create(author=recipient, title="Gone", content="Body")
+        Notification.objects.create(
+            recipient=recipient, actor=actor, verb="liked your post", target=post, actor_count=3
+        )
+        Notification.objects.create(
+            recipient=recipient, actor=actor, verb="commented on your post", target=deleted
+        )
+        Notification.objects.create(recipient=recipient, actor=actor, verb="followed you")
+        deleted.delete()
+
+        notifications = Notification.objects.with_related()
+        rows = NotificationValuesSerializer.get_queryset(notifications)
+        self.assertEqual(
+            NotificationValuesSerializer(rows).data,
+            NotificationSerializer(notifications, many=True).data,
+        )
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class AsyncNotificationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.recipient = User.objects.create_user(username="recipient", password="pass12345")
+        self.actor = User.objects.create_user(username="actor", password="pass12345")
+        post = Post.objects.create(author=self.recipient, title="Post", content="Body")
+        for verb in ("liked your post", "commented on your post", "followed you"):
+            Notification.objects.create(
+                recipient=self.recipient,
+                actor=self.actor,
+                verb=verb,
+                target=post if verb != "followed you" else None,
+            )
+        Notification.objects.filter(verb="followed you").update(read=True)
+        self.client.force_authenticate(user=self.recipient)
+
+    def assert_same_response(self, name, async_name, params=None):
+        expected = self.client.get(reverse(name), params)
+        response = self.client.get(reverse(async_name), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data, expected = response.json(), expected.json()
+        if "next" in data:
+            # Links point back at the view that served the page
+            self.assertIn(reverse(async_name), data.pop("next"))
+            expected.pop("next")
+        self.assertEqual(data, expected)
+        return response
+
+    def test_list_matches_sync_view(self):
+        self.assert_same_response("notifications-list", "async-notifications-list")
+        response = self.assert_same_response(
+            "notifications-list",
+            "async-notifications-list",
+            {"pagination": "cursor", "page_size": 2},
+        )
+        self.assertEqual(len(response.json()["results"]), 2)
+
+    def test_unread_matches_sync_view(self):
+        response = self.assert_same_response(
+            "unread-notifications", "async-unread-notifications", {"limit": 1}
+        )
+        self.assertEqual(response.json()["count"], 2)
+
+    def test_unread_revalidates_after_mark_read(self):
+        url = reverse("async-unread-notifications")
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("mark-notifications-read"))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json(), {"count": 0, "notifications": []})
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class NotificationStreamTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.recipient = User.objects.create_user(username="recipient", password="pass12345")
+        self.actor = User.objects.create_user(username="actor", password="pass12345")
+        # Stream positions are assigned by deliver()
+        with transaction.atomic():
+            deliver(
+                [build_event(self.recipient.id, self.actor.id, f"poked you {i}") for i in range(3)]
+            )
+        # Older than the window streams re-read for late commits
+        Notification.objects.update(timestamp=timezone.now() - timedelta(hours=1))
+        self.notifications = list(Notification.objects.order_by("sequence"))
+        token, _ = tokens.issue_token(self.recipient)
+        self.headers = {"Authorization": f"Token {token}"}
+
+    def get_event_id(self, notification):
+        return stream.encode_event_id(notification.sequence)
+
+    def parse_events(self, chunks):
+        events = []
+        for chunk in chunks:
+            fields = dict(
+                line.split(": ", 1) for line in chunk.strip().splitlines() if ": " in line
+            )
+            if fields.get("event") == "notification":
+                events.append((fields["id"], json.loads(fields["data"])))
+        return events
+
+    @override_settings(NOTIFICATION_STREAM_TIMEOUT=0)
+    async def test_resumes_after_last_event_id(self):
+        response = await self.async_client.get(
+            reverse("notification-stream"),
+            headers={**self.headers, "Last-Event-ID": self.get_event_id(self.notifications[0])},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        chunks = [chunk.decode() async for chunk in response.streaming_content]
+        self.assertTrue(chunks[0].startswith("retry:"))
+
+        events = self.parse_events(chunks)
+        self.assertEqual(
+            [data["verb"] for _, data in events], ["poked you 1", "poked you 2"]
+        )
+        self.assertEqual(events[-1][0], self.get_event_id(self.notifications[2]))
+        self.assertEqual(events[0][1]["summary"], "actor poked you 1")
+
+    @override_settings(
+        NOTIFICATION_DISPATCH="inline",
+        NOTIFICATION_STREAM_TIMEOUT=10,
+        NOTIFICATION_STREAM_HEARTBEAT=10,
+    )
+    async def test_pushes_new_notifications(self):
+        response = await self.async_client.get(
+            reverse("notification-stream"), headers=self.headers
+        )
+        chunks = aiter(response.streaming_content)
+        # New streams start at the newest notification instead of replaying
+        self.assertTrue((await anext(chunks)).startswith(b"retry:"))
+
+        await sync_to_async(notify)(self.recipient.id, self.actor.id, "waved")
+        # The test transaction never commits, so publish by hand
+        stream.publish([self.recipient.id])
+        notification = await Notification.objects.aget(verb="waved")
+        events = self.parse_events([(await anext(chunks)).decode()])
+        self.assertEqual(events, [(self.get_event_id(notification), events[0][1])])
+        self.assertEqual(events[0][1]["verb"], "waved")
+        await chunks.aclose()
+
+    async def test_late_commit_below_the_position_is_not_skipped(self):
+        # "waved" took its sequence first but committed after "later", which
+        # the stream has already sent
+        waved, later = await sync_to_async(self.deliver_each)(["waved", "later"])
+        position, sent = later.sequence, {later.sequence}
+        batch = await stream.fetch_since(self.recipient.id, position, sent)
+        self.assertEqual(
+            [(sequence, data["verb"]) for sequence, data in batch], [(waved.sequence, "waved")]
+        )
+        sent.add(waved.sequence)
+        self.assertEqual(await stream.fetch_since(self.recipient.id, position, sent), [])
+
+    def deliver_each(self, verbs):
+        for verb in verbs:
+            with transaction.atomic():
+                deliver([build_event(self.recipient.id, self.actor.id, verb)])
+        return [Notification.objects.get(verb=verb) for verb in verbs]
+
+    async def test_new_streams_skip_recent_history(self):
+        await sync_to_async(self.deliver_each)(["waved"])
+        position, recent = await stream.get_start(self.recipient.id)
+        waved = await Notification.objects.aget(verb="waved")
+        self.assertEqual((position, recent), (waved.sequence, [waved.sequence]))
+        self.assertEqual(await stream.fetch_since(self.recipient.id, position, recent), [])
+
+    def test_sequences_come_from_inserts_without_a_counter_row(self):
+        with transaction.atomic():
+            first = allocate_sequence(2)
+            second = allocate_sequence(1)
+        self.assertEqual(len(set(first + second)), 3)
+        self.assertGreater(second[0], max(first))
+        self.assertFalse(NotificationSequence.objects.exists())
+
+    def test_aggregate_updates_move_to_a_new_position(self):
+        post = Post.objects.create(author=self.recipient, title="Post", content="Body")
+        with transaction.atomic():
+            deliver([build_event(self.recipient.id, self.actor.id, "liked your post", post)])
+        first = Notification.objects.get(verb="liked your post").sequence
+        other = User.objects.create_user(username="other", password="pass12345")
+        with transaction.atomic():
+            deliver([build_event(self.recipient.id, other.id, "liked your post", post)])
+        notification = Notification.objects.get(verb="liked your post")
+        self.assertEqual(notification.actor_count, 2)
+        self.assertGreater(notification.sequence, first)
+
+    def test_decode_event_id_rejects_foreign_ids(self):
+        self.assertEqual(stream.decode_event_id("42"), 42)
+        for event_id in (None, "", "abc", "-1", "2026-01-01T00:00:00/3"):
+            self.assertIsNone(stream.decode_event_id(event_id))
+
+    @override_settings(NOTIFICATION_DISPATCH="inline", NOTIFICATION_STREAM_BROKER="cache")
+    def test_delivery_publishes_after_commit(self):
+        key = stream.CACHE_KEY.format(user_id=self.recipient.id)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            notify(self.recipient.id, self.actor.id, "waved")
+        self.assertIsNone(cache.get(key))
+        for callback in callbacks:
+            callback()
+        self.assertIsNotNone(cache.get(key))
+
+    def test_requires_authentication(self):
+        response = self.client.get(reverse("notification-stream"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class RetentionTests(APITestCase):
+    def setUp(self):
+        self.recipient = User.objects.create_user(username="recipient", password="pass12345")
+        self.actors = [
+            User.objects.create_user(username=f"actor{i}", password="pass12345")
+            for i in range(3)
+        ]
+        self.post = Post.objects.create(author=self.recipient, title="Post", content="Body")
+
+    def create(self, days_old, read=True, actor=None, target=None, recipient=None, **kwargs):
+        notification = Notification.objects.create(
+            recipient=recipient or self.recipient,
+            actor=actor or self.actors[0],
+            verb="liked your post",
+            target=target,
+            read=read,
+            **kwargs,
+        )
+        Notification.objects.filter(pk=notification.pk).update(
+            timestamp=timezone.now() - timedelta(days=days_old)
+        )
+        return notification
+
+    def test_purges_old_read_notifications_in_batches(self):
+        expired = [self.create(100) for _ in range(3)]
+        unread = self.create(100, read=False)
+        recent = self.create(10)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "archive.ndjson.gz")
+            report = retention.run_retention(
+                retention_days=90, batch_size=2, archive_to=path, compact=False
+            )
+            with gzip.open(path, "rt") as archive:
+                archived = [json.loads(line) for line in archive]
+
+        self.assertEqual(
+            sorted(Notification.objects.values_list("id", flat=True)), [unread.id, recent.id]
+        )
+        self.assertEqual([row["id"] for row in archived], [n.id for n in expired])
+        self.assertEqual(archived[0]["verb"], "liked your post")
+        summary = report.summary()
+        self.assertEqual((summary["purge"]["rows"], summary["purge"]["batches"]), (3, 2))
+        self.assertIn("maintenance", summary)
+
+    def test_batches_bump_each_recipient_list_version_once(self):
+        other = User.objects.create_user(username="other", password="pass12345")
+        for _ in range(3):
+            self.create(100)
+            self.create(100, recipient=other)
+        self.create(20, target=self.post)
+        self.create(19, target=self.post)
+
+        with mock.patch.object(retention, "bump_list_version") as bump:
+            retention.run_retention(retention_days=90, compact_after_days=7)
+        self.assertEqual(
+            sorted(call.args[0] for call in bump.call_args_list),
+            sorted([self.recipient.id, self.recipient.id, other.id]),
+        )
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_compacts_old_read_notifications_per_target(self):
+        for days_old, actor in zip([20, 19, 18], self.actors):
+            newest = self.create(days_old, actor=actor, target=self.post)
+        other_target = self.create(20, target=self.recipient)
+        unread = self.create(20, read=False, target=self.post)
+
+        removed = []
+        retention.run_retention(
+            retention_days=90, compact_after_days=7, on_batch=removed.append
+        )
+
+        self.assertEqual(
+            sorted(Notification.objects.values_list("id", flat=True)),
+            sorted([newest.id, other_target.id, unread.id]),
+        )
+        newest.refresh_from_db()
+        self.assertEqual(newest.actor_count, 3)
+        self.assertEqual(newest.recent_actors[0], newest.actor_id)
+        self.assertEqual(set(newest.recent_actors), {actor.id for actor in self.actors})
+        self.assertEqual([(stats.phase, stats.rows) for stats in removed[:1]], [("compact", 2)])
+
+    def test_command(self):
+        self.create(100)
+        out = StringIO()
+        call_command("prune_notifications", "--days", "90", stdout=out)
+        self.assertFalse(Notification.objects.exists())
+        self.assertIn("purge", out.getvalue())
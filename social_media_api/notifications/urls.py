@@ -1,8 +1,24 @@
 from django.urls import path
-from .views import NotificationListView, mark_notification_read, unread_notifications
+from .views import (
+    NotificationListView,
+    mark_notification_read,
+    mark_notifications_read,
+    unread_notifications,
+    unread_notifications_count,
+)
+from . import async_views
 
 urlpatterns = [
     path("", NotificationListView.as_view(), name="notifications-list"),
     path("<int:pk>/read/", mark_notification_read, name="mark-notification-read"),
+    path("read/", mark_notifications_read, name="mark-notifications-read"),
     path("unread/", unread_notifications, name="unread-notifications"),
+    path("unread/count/", unread_notifications_count, name="unread-notifications-count"),
+    path("async/", async_views.notification_list, name="async-notifications-list"),
+    path(
+        "async/unread/",
+        async_views.unread_notifications,
+        name="async-unread-notifications",
+    ),
+    path("stream/", async_views.notification_stream, name="notification-stream"),
 ]
\ No newline at end of file
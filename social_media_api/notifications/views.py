@@ -1,40 +1,117 @@
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from social_media_api.conditional import ConditionalGetMixin, conditional_get
+from social_media_api.fast_serializers import FastListMixin
+from social_media_api.pagination import NotificationPagination
+from .counters import adjust_unread_count, get_list_version, get_unread_count
 from .models import Notification
-from .serializers import NotificationSerializer
+from .serializers import (
+    MarkReadSerializer,
+    NotificationSerializer,
+    NotificationValuesSerializer,
+)
 
+UNREAD_LIST_LIMIT = 20
+UNREAD_LIST_MAX_LIMIT = 100
 
-class NotificationListView(generics.ListAPIView):
+
+def get_read_state_version(request):
+    # Marking notifications read or deleting them does not touch the newest
+    # timestamp
+    return [get_unread_count(request.user.id), get_list_version(request.user.id)]
+
+
+class NotificationListView(ConditionalGetMixin, FastListMixin, generics.ListAPIView):
     serializer_class = NotificationSerializer
+    fast_serializer_class = NotificationValuesSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationPagination
+    conditional_field = "timestamp"
+
+    def get_conditional_version(self):
+        return get_read_state_version(self.request)
 
     def get_queryset(self):
         # Return notifications for the current user
-        return Notification.objects.filter(recipient=self.request.user)
+        return Notification.objects.filter(recipient=self.request.user).with_related()
 
 
 @api_view(["POST"])
 @permission_classes([permissions.IsAuthenticated])
 def mark_notification_read(request, pk):
     """Mark a notification as read"""
-    try:
-        notification = Notification.objects.get(pk=pk, recipient=request.user)
-        notification.read = True
-        notification.save()
-        return Response(
-            {"message": "Notification marked as read"}, status=status.HTTP_200_OK
-        )
-    except Notification.DoesNotExist:
+    notifications = Notification.objects.filter(pk=pk, recipient=request.user)
+    updated = notifications.filter(read=False).update(read=True)
+    if updated:
+        adjust_unread_count(request.user.id, -updated)
+    elif not notifications.exists():
         return Response(
             {"error": "Notification not found"}, status=status.HTTP_404_NOT_FOUND
         )
+    return Response(
+        {"message": "Notification marked as read"}, status=status.HTTP_200_OK
+    )
+
+
+@api_view(["POST"])
+@permission_classes([permissions.IsAuthenticated])
+def mark_notifications_read(request):
+    """
+    Mark notifications as read in a single UPDATE.
+
+    With no body every unread notification is marked; `ids` limits the
+    update to those notifications and `before` to those up to that time.
+    """
+    serializer = MarkReadSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    notifications = Notification.objects.filter(recipient=request.user, read=False)
+    if "ids" in serializer.validated_data:
+        notifications = notifications.filter(id__in=serializer.validated_data["ids"])
+    if "before" in serializer.validated_data:
+        notifications = notifications.filter(timestamp__lte=serializer.validated_data["before"])
+
+    updated = notifications.update(read=True)
+    adjust_unread_count(request.user.id, -updated)
+    return Response(
+        {"message": f"{updated} notifications marked as read", "updated": updated},
+        status=status.HTTP_200_OK,
+    )
 
 
 @api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated])
+@conditional_get(
+    lambda request: Notification.objects.filter(recipient=request.user, read=False),
+    field="timestamp",
+    get_version=get_read_state_version,
+)
 def unread_notifications(request):
-    """Get unread notifications for the current user"""
-    notifications = Notification.objects.filter(recipient=request.user, read=False)
-    serializer = NotificationSerializer(notifications, many=True)
-    return Response({"count": notifications.count(), "notifications": serializer.data})
\ No newline at end of file
+    """
+    Get the most recent unread notifications for the current user.
+
+    `count` is the total number unread; the list holds at most `limit` items
+    (default UNREAD_LIST_LIMIT, capped at UNREAD_LIST_MAX_LIMIT).
+    """
+    try:
+        limit = int(request.query_params.get("limit", UNREAD_LIST_LIMIT))
+    except ValueError:
+        limit = UNREAD_LIST_LIMIT
+    limit = min(max(limit, 1), UNREAD_LIST_MAX_LIMIT)
+
+    notifications = Notification.objects.filter(
+        recipient=request.user, read=False
+    ).with_related()
+    rows = NotificationValuesSerializer.get_queryset(notifications)
+    serializer = NotificationValuesSerializer(rows[:limit])
+    return Response(
+        {"count": get_unread_count(request.user.id), "notifications": serializer.data}
+    )
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+def unread_notifications_count(request):
+    """Get just the number of unread notifications, e.g. for a badge"""
+    return Response({"count": get_unread_count(request.user.id)})
\ No newline at end of file
@@ -0,0 +1,38 @@
+"""
+Async versions of the posts read endpoints, for deployments under ASGI.
+
+They return the same responses as their counterparts in posts.views but
+await the database instead of blocking a worker thread on it.
+"""
+from asgiref.sync import sync_to_async
+from social_media_api.async_api import async_api_view
+from social_media_api.conditional import arespond_conditionally
+from social_media_api.pagination import PostPagination
+from . import timeline
+from .response_cache import get_activity_version
+from .serializers import PostValuesSerializer
+
+
+@async_api_view(throttle_scope="feed")
+async def feed_view(request):
+    """
+    Get posts from users that the current user follows
+    """
+    pull_author_ids = await timeline.aget_pull_author_ids(request.user)
+    feed_posts = timeline.get_feed_queryset(request.user, pull_author_ids)
+
+    async def render():
+        paginator = PostPagination()
+        paginated_posts = await paginator.apaginate_queryset(
+            PostValuesSerializer.get_queryset(feed_posts), request
+        )
+        serializer = PostValuesSerializer(paginated_posts)
+        return paginator.get_paginated_response(await serializer.adata())
+
+    # Like and comment counters, deletions and follows change the feed
+    # without touching updated_at
+    version = [
+        await sync_to_async(get_activity_version)(),
+        await sync_to_async(timeline.get_timeline_version)(request.user.id),
+    ]
+    return await arespond_conditionally(request, feed_posts, "updated_at", render, version)
@@ -0,0 +1,104 @@
+"""
+Bulk creation of posts and comments, e.g. when importing from elsewhere.
+
+Every item is validated first; the valid ones are then inserted with
+`bulk_create` in batches of BULK_CREATE_BATCH_SIZE inside one transaction,
+along with the timeline fan-out, counter updates and queued notifications
+that the single-item endpoints perform. Results are reported per item, in
+request order: the new id, or the validation errors.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from notifications.dispatch import notify_many
+
+from . import timeline
+from .models import Comment, Post
+from .response_cache import bump_post_versions, bump_versions
+from .serializers import BulkCommentSerializer, PostSerializer
+
+BULK_CREATE_BATCH_SIZE = 500
+
+
+def validate_items(serializer_class, items):
+    """Split items into [(index, validated_data)] and {index: errors}"""
+    valid, errors = [], {}
+    for index, item in enumerate(items):
+        serializer = serializer_class(data=item)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors[index] = serializer.errors
+    return valid, errors
+
+
+def build_results(count, created_ids, errors):
+    return [
+        {"index": index, "id": created_ids[index]}
+        if index in created_ids
+        else {"index": index, "errors": errors[index]}
+        for index in range(count)
+    ]
+
+
+def create_posts(author, items):
+    valid, errors = validate_items(PostSerializer, items)
+    with transaction.atomic():
+        posts = Post.objects.bulk_create(
+            [Post(author=author, **data) for _, data in valid],
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
+        timeline.fan_out_posts_on_commit(author, posts)
+        bump_versions()
+
+    created_ids = {index: post.id for (index, _), post in zip(valid, posts)}
+    return build_results(len(items), created_ids, errors)
+
+
+def create_comments(author, items):
+    valid, errors = validate_items(BulkCommentSerializer, items)
+    post_authors = dict(
+        Post.objects.filter(id__in={data["post_id"] for _, data in valid}).values_list(
+            "id", "author_id"
+        )
+    )
+    for index, data in valid:
+        if data["post_id"] not in post_authors:
+            message = f'Invalid pk "{data["post_id"]}" - object does not exist.'
+            errors[index] = {"post": [message]}
+    valid = [(index, data) for index, data in valid if index not in errors]
+
+    with transaction.atomic():
+        comments = Comment.objects.bulk_create(
+            [Comment(author=author, **data) for _, data in valid],
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
+        counts = Counter(comment.post_id for comment in comments)
+        add_to_comment_counts(counts)
+        notify_many(
+            (
+                post_authors[comment.post_id],
+                author.id,
+                "commented on your post",
+                Post(pk=comment.post_id),
+            )
+            for comment in comments
+            if post_authors[comment.post_id] != author.id
+        )
+        bump_post_versions(*counts)
+
+    created_ids = {index: comment.id for (index, _), comment in zip(valid, comments)}
+    return build_results(len(items), created_ids, errors)
+
+
+def add_to_comment_counts(counts):
+    """One UPDATE per distinct increment rather than one per post"""
+    post_ids_by_increment = defaultdict(list)
+    for post_id, increment in counts.items():
+        post_ids_by_increment[increment].append(post_id)
+    for increment, post_ids in post_ids_by_increment.items():
+        Post.objects.filter(id__in=post_ids).update(
+            comments_count=F("comments_count") + increment
+        )
@@ -0,0 +1,100 @@
+"""
+Streaming export of a user's posts and comments.
+
+Rows are read with `.values().iterator(chunk_size=...)`, so neither model
+instances nor the whole result set are held in memory, and rendered one
+line at a time as NDJSON or CSV. The generators below feed a
+StreamingHttpResponse; with gzip enabled each chunk is compressed as it is
+produced, so memory stays flat however large the account is.
+"""
+import csv
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Comment, Post
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+# Every exported record has these keys; fields that do not apply are None
+EXPORT_FIELDS = [
+    "type",
+    "id",
+    "post_id",
+    "title",
+    "content",
+    "created_at",
+    "updated_at",
+    "likes_count",
+    "comments_count",
+]
+
+
+def iter_records(user_id, chunk_size=EXPORT_CHUNK_SIZE):
+    """The user's posts, then their comments, oldest first"""
+    posts = (
+        Post.objects.filter(author_id=user_id)
+        .order_by("created_at", "id")
+        .values(
+            "id", "title", "content", "created_at", "updated_at", "likes_count", "comments_count"
+        )
+    )
+    for row in posts.iterator(chunk_size=chunk_size):
+        yield {"type": "post", "post_id": None, **row}
+
+    comments = (
+        Comment.objects.filter(author_id=user_id)
+        .order_by("created_at", "id")
+        .values("id", "post_id", "content", "created_at", "updated_at")
+    )
+    for row in comments.iterator(chunk_size=chunk_size):
+        yield {"type": "comment", "title": None, "likes_count": None, "comments_count": None, **row}
+
+
+def render_ndjson(records):
+    for record in records:
+        yield json.dumps(
+            {field: record[field] for field in EXPORT_FIELDS}, cls=DjangoJSONEncoder
+        ) + "\n"
+
+
+class Echo:
+    """File-like object whose write() hands the line back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(records):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for record in records:
+        yield writer.writerow(
+            [
+                record[field].isoformat() if field.endswith("_at") else record[field]
+                for field in EXPORT_FIELDS
+            ]
+        )
+
+
+def gzip_stream(chunks):
+    """Compress text chunks into a gzip stream as they are produced"""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        # zlib buffers small inputs; only yield once it emits a block
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(user_id, export_format, compress=False):
+    renderer = render_csv if export_format == "csv" else render_ndjson
+    chunks = renderer(iter_records(user_id))
+    if compress:
+        return gzip_stream(chunks)
+    return (chunk.encode() for chunk in chunks)
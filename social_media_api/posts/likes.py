@@ -0,0 +1,138 @@
+"""
+Race-free like/unlike.
+
+A like is inserted with INSERT ... ON CONFLICT DO NOTHING against the unique
+(user, post) constraint, and removed with DELETE ... RETURNING, so concurrent
+double-taps can neither create two likes nor decrement the counter twice.
+Decrements stop at zero, so a counter that drifted low cannot break the
+unsigned column.
+The post's likes_count is adjusted and its author id returned in the same
+round trip on PostgreSQL (one statement through a data-modifying CTE) and in
+two statements on SQLite. Other backends fall back to the ORM.
+"""
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Like, Post
+
+
+def supports_upsert_returning():
+    return connection.vendor in ("postgresql", "sqlite") and (
+        connection.features.can_return_columns_from_insert
+    )
+
+
+def get_table_names():
+    quote = connection.ops.quote_name
+    return quote(Like._meta.db_table), quote(Post._meta.db_table)
+
+
+def add_like(user_id, post_id):
+    """
+    Like `post_id` as `user_id`.
+
+    Returns the post author's id if a new like was stored, or None if the
+    like already existed or the post does not exist.
+    """
+    if not supports_upsert_returning():
+        return _add_like_with_orm(user_id, post_id)
+
+    like_table, post_table = get_table_names()
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                f"""
+                WITH inserted AS (
+                    INSERT INTO {like_table} (user_id, post_id, created_at)
+                    SELECT %s, id, %s FROM {post_table} WHERE id = %s
+                    ON CONFLICT DO NOTHING
+                    RETURNING post_id
+                )
+                UPDATE {post_table} SET likes_count = likes_count + 1
+                FROM inserted WHERE {post_table}.id = inserted.post_id
+                RETURNING {post_table}.author_id
+                """,
+                [user_id, now, post_id],
+            )
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+        # The WHERE clause keeps SQLite from parsing ON CONFLICT as a join
+        cursor.execute(
+            f"""
+            INSERT INTO {like_table} (user_id, post_id, created_at)
+            SELECT %s, id, %s FROM {post_table} WHERE id = %s
+            ON CONFLICT DO NOTHING
+            RETURNING post_id
+            """,
+            [user_id, now, post_id],
+        )
+        if cursor.fetchone() is None:
+            return None
+        cursor.execute(
+            f"UPDATE {post_table} SET likes_count = likes_count + 1 "
+            f"WHERE id = %s RETURNING author_id",
+            [post_id],
+        )
+        return cursor.fetchone()[0]
+
+
+def remove_like(user_id, post_id):
+    """Remove a like; returns True if one was deleted"""
+    if not supports_upsert_returning():
+        return _remove_like_with_orm(user_id, post_id)
+
+    like_table, post_table = get_table_names()
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                f"""
+                WITH deleted AS (
+                    DELETE FROM {like_table} WHERE user_id = %s AND post_id = %s
+                    RETURNING post_id
+                )
+                UPDATE {post_table} SET likes_count = GREATEST(likes_count - 1, 0)
+                FROM deleted WHERE {post_table}.id = deleted.post_id
+                RETURNING {post_table}.id
+                """,
+                [user_id, post_id],
+            )
+            return cursor.fetchone() is not None
+
+        cursor.execute(
+            f"DELETE FROM {like_table} WHERE user_id = %s AND post_id = %s RETURNING post_id",
+            [user_id, post_id],
+        )
+        if cursor.fetchone() is None:
+            return False
+        cursor.execute(
+            f"UPDATE {post_table} SET likes_count = MAX(likes_count - 1, 0) WHERE id = %s",
+            [post_id],
+        )
+        return True
+
+
+def _add_like_with_orm(user_id, post_id):
+    author_id = Post.objects.filter(pk=post_id).values_list("author_id", flat=True).first()
+    if author_id is None:
+        return None
+    try:
+        with transaction.atomic():
+            Like.objects.create(user_id=user_id, post_id=post_id)
+            Post.objects.filter(pk=post_id).update(likes_count=F("likes_count") + 1)
+    except IntegrityError:
+        return None
+    return author_id
+
+
+def _remove_like_with_orm(user_id, post_id):
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(user_id=user_id, post_id=post_id).delete()
+        if deleted:
+            Post.objects.filter(pk=post_id).update(
+                likes_count=Greatest(F("likes_count") - 1, 0)
+            )
+    return bool(deleted)
@@ -0,0 +1,208 @@
+"""
+Load test for the async feed and notification views.
+
+Start both servers against the same database this command uses (DB_NAME),
+with the same number of workers, and raise the throttle rates so the load
+is not rejected, for example:
+
+    export THROTTLE_RATE_USER=1000000/min THROTTLE_RATE_FEED=1000000/min
+    gunicorn social_media_api.wsgi -w 4 --threads 16 -b 127.0.0.1:8000 \\
+        --keyfile key.pem --certfile cert.pem
+    uvicorn social_media_api.asgi:application --workers 4 --port 8001 \\
+        --ssl-keyfile key.pem --ssl-certfile cert.pem
+    python manage.py benchmark_async --wsgi-url https://127.0.0.1:8000 \\
+        --asgi-url https://127.0.0.1:8001 --insecure
+
+SECURE_SSL_REDIRECT is on, so plain HTTP requests are answered with a
+redirect (reported as 301 errors); serve TLS, a self-signed certificate
+with --insecure will do.
+"""
+import http.client
+import ssl
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import tokens
+from notifications.models import Notification
+from posts.models import Comment, Post, TimelineEntry
+
+BENCH_USERNAME = "bench-async"
+BENCH_AUTHOR_USERNAME = "bench-async-author"
+
+# (label, sync path, async path)
+ENDPOINTS = [
+    ("feed", "/api/feed/", "/api/async/feed/"),
+    ("notifications", "/api/notifications/", "/api/notifications/async/"),
+    ("unread", "/api/notifications/unread/", "/api/notifications/async/unread/"),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the feed and notification endpoints over HTTP. Compares the "
+        "sync views under a WSGI server with the sync and async views under an "
+        "ASGI server, reporting requests/sec and p50/p99 latency per "
+        "concurrency level."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--wsgi-url", help="Base URL of the WSGI server")
+        parser.add_argument("--asgi-url", help="Base URL of the ASGI server")
+        parser.add_argument(
+            "--concurrency",
+            default="1,8,32,64",
+            help="Comma separated numbers of concurrent clients",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=500, help="Requests per measurement"
+        )
+        parser.add_argument(
+            "--token", help="Authenticate as this token's user instead of seeding one"
+        )
+        parser.add_argument("--posts", type=int, default=200, help="Posts to seed")
+        parser.add_argument(
+            "--notifications", type=int, default=200, help="Notifications to seed"
+        )
+        parser.add_argument(
+            "--insecure",
+            action="store_true",
+            help="Do not verify TLS certificates, e.g. self-signed ones",
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the seeded rows afterwards"
+        )
+
+    def handle(self, *args, **options):
+        if not options["wsgi_url"] and not options["asgi_url"]:
+            raise CommandError("Pass --wsgi-url, --asgi-url or both.")
+        try:
+            levels = [int(level) for level in options["concurrency"].split(",")]
+        except ValueError:
+            raise CommandError("--concurrency must be a list of integers.")
+        self.ssl_context = (
+            ssl._create_unverified_context() if options["insecure"] else None
+        )
+
+        users = []
+        token = options["token"]
+        if token is None:
+            users = self.seed(options["posts"], options["notifications"])
+            token, _ = tokens.issue_token(users[0])
+        try:
+            # Sync views on both servers; async views only help under ASGI
+            targets = []
+            if options["wsgi_url"]:
+                targets.append(("WSGI sync", options["wsgi_url"], 0))
+            if options["asgi_url"]:
+                targets.append(("ASGI sync", options["asgi_url"], 0))
+                targets.append(("ASGI async", options["asgi_url"], 1))
+            for label, *paths in ENDPOINTS:
+                self.stdout.write(self.style.MIGRATE_HEADING(label))
+                self.stdout.write(
+                    f"  {'server':<12} {'clients':>7} {'req/s':>9} {'p50 ms':>8} "
+                    f"{'p99 ms':>8}  errors"
+                )
+                for name, base_url, index in targets:
+                    url = base_url.rstrip("/") + paths[index]
+                    for level in levels:
+                        result = self.measure(url, token, level, options["requests"])
+                        self.report(name, level, *result)
+        finally:
+            if users and not options["keep"]:
+                for user in users:
+                    user.delete()
+
+    def seed(self, post_count, notification_count):
+        User = get_user_model()
+        reader = User.objects.create(username=BENCH_USERNAME)
+        author = User.objects.create(username=BENCH_AUTHOR_USERNAME)
+        reader.following.add(author)
+        posts = Post.objects.bulk_create(
+            [
+                Post(author=author, title=f"Post {i}", content="Benchmark body " * 20)
+                for i in range(post_count)
+            ]
+        )
+        Comment.objects.bulk_create(
+            [Comment(post=post, author=reader, content="Benchmark comment") for post in posts]
+        )
+        Post.objects.filter(author=author).update(comments_count=1)
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner=reader, post=post, created_at=post.created_at) for post in posts]
+        )
+        Notification.objects.bulk_create(
+            [
+                Notification(
+                    recipient=reader,
+                    actor=author,
+                    verb="liked your post",
+                    target=posts[i % len(posts)] if posts else None,
+                )
+                for i in range(notification_count)
+            ]
+        )
+        return [reader, author]
+
+    def connect(self, url):
+        parts = urlsplit(url)
+        if parts.scheme == "https":
+            return http.client.HTTPSConnection(parts.netloc, context=self.ssl_context)
+        return http.client.HTTPConnection(parts.netloc)
+
+    def measure(self, url, token, concurrency, total):
+        """Send `total` GETs to `url` from `concurrency` keep-alive clients"""
+        path = urlsplit(url).path
+        headers = {"Authorization": f"Token {token}", "Accept": "application/json"}
+        remaining = iter(range(total))
+        lock = threading.Lock()
+        latencies, statuses = [], Counter()
+
+        def client():
+            connection = self.connect(url)
+            try:
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+                    started = time.perf_counter()
+                    try:
+                        connection.request("GET", path, headers=headers)
+                        response = connection.getresponse()
+                        response.read()
+                        outcome = response.status
+                    except (OSError, http.client.HTTPException) as exc:
+                        connection.close()
+                        connection = self.connect(url)
+                        outcome = type(exc).__name__
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        latencies.append(elapsed)
+                        statuses[outcome] += 1
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for future in [executor.submit(client) for _ in range(concurrency)]:
+                future.result()
+        return total / (time.perf_counter() - started), latencies, statuses
+
+    def report(self, name, concurrency, rate, latencies, statuses):
+        if len(latencies) >= 2:
+            cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+            p50, p99 = cuts[49] * 1000, cuts[98] * 1000
+        else:
+            p50 = p99 = latencies[0] * 1000 if latencies else 0.0
+        line = f"  {name:<12} {concurrency:>7} {rate:>9.1f} {p50:>8.1f} {p99:>8.1f}"
+        errors = [f"{outcome}: {count}" for outcome, count in statuses.items() if outcome != 200]
+        if errors:
+            self.stdout.write(self.style.WARNING(f"{line}  {', '.join(errors)}"))
+        else:
+            self.stdout.write(line)
@@ -0,0 +1,194 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from notifications.models import Notification
+from posts.models import Comment, Like, Post
+
+BENCH_USER_PREFIX = "bench-index-"
+BATCH_SIZE = 5000
+
+# Indexes added for the hot read paths; dropped for the "before" run
+BENCHMARKED_INDEXES = [
+    (Post, "post_author_created_idx"),
+    (Comment, "comment_post_created_idx"),
+    (Notification, "notif_recipient_read_ts_idx"),
+    (Notification, "notif_unread_idx"),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic posts, comments, likes and notifications, then compare "
+        "EXPLAIN plans and latencies of the hot queries with and without the "
+        "access-pattern indexes (median over alternating warmed-up rounds). "
+        "Temporarily drops those indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000, help="Total rows to seed")
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=20, help="Timed runs per query")
+        parser.add_argument(
+            "--warmup", type=int, default=3, help="Untimed runs per query before timing"
+        )
+        parser.add_argument(
+            "--rounds",
+            type=int,
+            default=3,
+            help="Times each configuration is measured; the order alternates",
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the seeded rows afterwards"
+        )
+        parser.add_argument(
+            "--noinput",
+            "--no-input",
+            action="store_false",
+            dest="interactive",
+            help="Do not ask for confirmation before dropping indexes",
+        )
+
+    def handle(self, *args, **options):
+        if options["interactive"]:
+            confirm = input(
+                f"This seeds {options['rows']} rows into "
+                f"{connection.settings_dict['NAME']!r} and temporarily drops "
+                "indexes. Type 'yes' to continue: "
+            )
+            if confirm != "yes":
+                raise CommandError("Benchmark cancelled.")
+
+        users = self.seed(options["rows"], options["users"])
+        try:
+            queries = self.get_queries(users)
+            plans = {}
+            timings = {True: {}, False: {}}
+            # Measured ABBA-style (with, without, without, with, ...) so
+            # neither configuration always runs first against a cold cache;
+            # this also halves the index rebuilds
+            self.indexed = True
+            try:
+                for round_number in range(options["rounds"]):
+                    order = (True, False) if round_number % 2 == 0 else (False, True)
+                    for indexed in order:
+                        self.set_indexes(indexed)
+                        plans[indexed] = self.measure(
+                            queries, options["warmup"], options["repeat"], timings[indexed]
+                        )
+            finally:
+                self.set_indexes(True)
+            self.report(plans, timings)
+        finally:
+            if not options["keep"]:
+                get_user_model().objects.filter(username__startswith=BENCH_USER_PREFIX).delete()
+
+    def get_index(self, model, name):
+        return next(index for index in model._meta.indexes if index.name == name)
+
+    def set_indexes(self, indexed):
+        if indexed == self.indexed:
+            return
+        with connection.schema_editor() as editor:
+            for model, name in BENCHMARKED_INDEXES:
+                if indexed:
+                    editor.add_index(model, self.get_index(model, name))
+                else:
+                    editor.remove_index(model, self.get_index(model, name))
+        self.indexed = indexed
+
+    def seed(self, rows, user_count):
+        User = get_user_model()
+        User.objects.bulk_create(
+            [User(username=f"{BENCH_USER_PREFIX}{i}") for i in range(user_count)],
+            batch_size=BATCH_SIZE,
+        )
+        users = list(
+            User.objects.filter(username__startswith=BENCH_USER_PREFIX).values_list("id", flat=True)
+        )
+
+        # Split roughly 30/30/20/20 between posts, comments, likes and notifications
+        post_count = max(rows * 3 // 10, 1)
+        self.bulk_insert(
+            Post,
+            post_count,
+            lambda i: Post(author_id=users[i % len(users)], title=f"Post {i}", content="body"),
+        )
+        posts = list(
+            Post.objects.filter(author_id__in=users).values_list("id", flat=True)
+        )
+        self.bulk_insert(
+            Comment,
+            rows * 3 // 10,
+            lambda i: Comment(
+                post_id=posts[i % len(posts)], author_id=users[i % len(users)], content="body"
+            ),
+        )
+        # (user, post) pairs must be unique, so walk users before moving to the next post
+        like_count = min(rows * 2 // 10, len(users) * len(posts))
+        self.bulk_insert(
+            Like,
+            like_count,
+            lambda i: Like(user_id=users[i % len(users)], post_id=posts[i // len(users)]),
+        )
+        self.bulk_insert(
+            Notification,
+            rows * 2 // 10,
+            lambda i: Notification(
+                recipient_id=users[i % len(users)],
+                actor_id=users[(i + 1) % len(users)],
+                verb="liked your post",
+                read=i % 4 != 0,
+            ),
+        )
+        if connection.vendor in ("sqlite", "postgresql"):
+            # Refresh planner statistics so the plans reflect the seeded data
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+        return users
+
+    def bulk_insert(self, model, count, build):
+        for start in range(0, count, BATCH_SIZE):
+            stop = min(start + BATCH_SIZE, count)
+            model.objects.bulk_create([build(i) for i in range(start, stop)])
+        self.stdout.write(f"Seeded {count} {model._meta.verbose_name_plural}")
+
+    def get_queries(self, users):
+        user_id = users[len(users) // 2]
+        post_id = Post.objects.filter(author_id=user_id).values_list("id", flat=True).first()
+        return {
+            "feed (posts by followed authors)": Post.objects.filter(
+                author_id__in=users[:50]
+            ).order_by("-created_at")[:10],
+            "nested comments for a post": Comment.objects.filter(post_id=post_id).order_by(
+                "created_at"
+            ),
+            "unread notifications": Notification.objects.filter(
+                recipient_id=user_id, read=False
+            ).order_by("-timestamp")[:50],
+            "likes for a post": Like.objects.filter(post_id=post_id),
+        }
+
+    def measure(self, queries, warmup, repeat, timings):
+        """Time each query into `timings` (label -> ms list); returns the plans"""
+        plans = {}
+        for label, queryset in queries.items():
+            plans[label] = queryset.explain()
+            for _ in range(warmup):
+                list(queryset.all())
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.setdefault(label, []).append((time.perf_counter() - started) * 1000)
+        return plans
+
+    def report(self, plans, timings):
+        for label in plans[True]:
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            for name, indexed in (("before", False), ("after", True)):
+                ms = statistics.median(timings[indexed][label])
+                self.stdout.write(f"  {name + ':':7} {ms:.2f} ms (median)")
+                self.stdout.write(f"    {plans[indexed][label]}")
@@ -0,0 +1,103 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+
+from posts import search
+from posts.models import Post
+
+BENCH_USERNAME = "bench-search"
+BATCH_SIZE = 5000
+VOCABULARY_SIZE = 20000
+SYLLABLES = ["ka", "lo", "mi", "ren", "tu", "sha", "vo", "pel", "dri", "an", "es", "gor"]
+
+
+def build_vocabulary(rng):
+    """Pseudo-words with Zipf-like weights, so some terms are common and most rare"""
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    words = sorted(words)
+    rng.shuffle(words)
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    return words, weights
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic posts and compare the full-text index with the old "
+        "icontains filter on title and content"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000, help="Posts to seed")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per query")
+        parser.add_argument(
+            "--queries",
+            nargs="+",
+            help="Search terms; defaults to words of high, medium and low frequency",
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the seeded posts afterwards"
+        )
+        parser.add_argument(
+            "--noinput",
+            "--no-input",
+            action="store_false",
+            dest="interactive",
+            help="Do not ask for confirmation before seeding",
+        )
+
+    def handle(self, *args, **options):
+        if options["interactive"]:
+            confirm = input(
+                f"This seeds {options['rows']} posts into "
+                f"{connection.settings_dict['NAME']!r}. Type 'yes' to continue: "
+            )
+            if confirm != "yes":
+                raise CommandError("Benchmark cancelled.")
+
+        rng = random.Random(0)
+        words, weights = build_vocabulary(rng)
+        queries = options["queries"] or [words[10], words[1000], words[15000]]
+
+        author = get_user_model().objects.create(username=BENCH_USERNAME)
+        try:
+            self.seed(author, options["rows"], rng, words, weights)
+            for query in queries:
+                scan = Post.objects.filter(
+                    Q(title__icontains=query) | Q(content__icontains=query)
+                ).order_by("-created_at")
+                indexed = search.search(query)
+                self.stdout.write(self.style.MIGRATE_HEADING(f"q={query!r}"))
+                self.stdout.write(f"  icontains: {self.time(scan, options['repeat'])}")
+                self.stdout.write(f"  full-text: {self.time(indexed, options['repeat'])}")
+        finally:
+            if not options["keep"]:
+                author.delete()
+
+    def seed(self, author, rows, rng, words, weights):
+        for start in range(0, rows, BATCH_SIZE):
+            Post.objects.bulk_create(
+                Post(
+                    author=author,
+                    title=" ".join(rng.choices(words, weights, k=4)),
+                    content=" ".join(rng.choices(words, weights, k=40)),
+                )
+                for _ in range(start, min(start + BATCH_SIZE, rows))
+            )
+        self.stdout.write(f"Seeded {rows} posts")
+
+    def time(self, queryset, repeat):
+        """Median cost of what a paginated request runs: COUNT(*) plus one page"""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            matches = queryset.count()
+            list(queryset[:10])
+            timings.append((time.perf_counter() - started) * 1000)
+        return f"{statistics.median(timings):.2f} ms ({matches} matches)"
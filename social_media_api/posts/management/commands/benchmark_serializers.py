@@ -0,0 +1,112 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from notifications import counters
+from notifications.models import Notification
+from notifications.views import NotificationListView
+from posts.models import Comment, Post
+from posts.views import PostViewSet
+from social_media_api.renderers import FastJSONRenderer
+
+BENCH_USERNAME = "bench-serializers"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure requests/sec for a page of posts and a list of notifications "
+        "served through the ModelSerializer + JSONRenderer path and through "
+        "the values() serializers + orjson renderer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=100, help="Items per page")
+        parser.add_argument("--comments", type=int, default=3, help="Comments per post")
+        parser.add_argument("--seconds", type=float, default=3.0, help="Time per measurement")
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the seeded rows afterwards"
+        )
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.create(username=BENCH_USERNAME)
+        try:
+            self.seed(user, options["items"], options["comments"])
+            endpoints = {
+                "posts": (
+                    PostViewSet,
+                    {"actions": {"get": "list"}},
+                    {"page_size": options["items"]},
+                ),
+                "notifications": (NotificationListView, {}, {}),
+            }
+            for label, (view_class, view_kwargs, params) in endpoints.items():
+                # Unthrottled, so the user's bucket cannot turn later runs into 429s
+                slow = view_class.as_view(
+                    **view_kwargs,
+                    fast_serializer_class=None,
+                    renderer_classes=[JSONRenderer],
+                    throttle_classes=[],
+                )
+                fast = view_class.as_view(
+                    **view_kwargs, renderer_classes=[FastJSONRenderer], throttle_classes=[]
+                )
+                self.stdout.write(self.style.MIGRATE_HEADING(label))
+                for name, view in (("ModelSerializer", slow), ("values() + orjson", fast)):
+                    rate = self.measure(view, user, params, options["seconds"])
+                    self.stdout.write(f"  {name:<18} {rate:8.1f} req/s")
+        finally:
+            if not options["keep"]:
+                user_id = user.id
+                user.delete()
+                # Only the benchmark user's entries, which the delete above
+                # may have bumped; the cache may be shared
+                cache.delete_many(
+                    [
+                        counters.CACHE_KEY.format(user_id=user_id),
+                        counters.VERSION_KEY.format(user_id=user_id),
+                    ]
+                )
+
+    def seed(self, user, items, comments_per_post):
+        posts = Post.objects.bulk_create(
+            [
+                Post(author=user, title=f"Post {i}", content="Benchmark body " * 20)
+                for i in range(items)
+            ]
+        )
+        Comment.objects.bulk_create(
+            [
+                Comment(post=post, author=user, content="Benchmark comment")
+                for post in posts
+                for _ in range(comments_per_post)
+            ]
+        )
+        Post.objects.filter(author=user).update(comments_count=comments_per_post)
+        Notification.objects.bulk_create(
+            [
+                Notification(recipient=user, actor=user, verb="liked your post", target=post)
+                for post in posts
+            ]
+        )
+
+    def measure(self, view, user, params, seconds):
+        factory = APIRequestFactory()
+
+        def get():
+            request = factory.get("/", params)
+            force_authenticate(request, user=user)
+            view(request).render()
+
+        # An untimed request primes the per-user counters the views read, so
+        # both paths are timed against a warm cache. The requests are
+        # authenticated, so the anonymous post response cache is never used.
+        get()
+        requests, started = 0, time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            get()
+            requests += 1
+        return requests / (time.perf_counter() - started)
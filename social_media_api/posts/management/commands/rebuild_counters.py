@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from posts.models import Comment, Like, Post, count_subquery
+
+
+def get_counters():
+    """(model, counter field, expression that recomputes it) for every counter"""
+    User = get_user_model()
+    Follow = User.followers.through
+    return [
+        (Post, "likes_count", count_subquery(Like, "post")),
+        (Post, "comments_count", count_subquery(Comment, "post")),
+        (User, "followers_count", count_subquery(Follow, "from_user")),
+        (User, "following_count", count_subquery(Follow, "to_user")),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized like/comment/follow counters and report drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report drifted rows, do not fix them",
+        )
+
+    def handle(self, *args, **options):
+        total_drift = 0
+        for model, field, expression in get_counters():
+            drifted = (
+                model.objects.annotate(actual=expression)
+                .filter(~Q(**{field: F("actual")}))
+                .values_list("pk", field, "actual")
+            )
+            rows = list(drifted)
+            total_drift += len(rows)
+
+            label = f"{model._meta.label}.{field}"
+            if not rows:
+                self.stdout.write(f"{label}: ok")
+                continue
+
+            self.stdout.write(self.style.WARNING(f"{label}: {len(rows)} drifted rows"))
+            for pk, stored, actual in rows[:10]:
+                self.stdout.write(f"  pk={pk} stored={stored} actual={actual}")
+
+            if not options["dry_run"]:
+                model.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(
+                    **{field: expression}
+                )
+
+        if options["dry_run"] or not total_drift:
+            self.stdout.write(f"{total_drift} drifted counters found")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {total_drift} drifted counters"))
@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized home timelines from the current follow graph"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            action="append",
+            dest="usernames",
+            help="Only rebuild the timeline of this username (repeatable)",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=timeline.BACKFILL_LIMIT,
+            help="Recent posts to copy per followed author",
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by("id")
+        if options["usernames"]:
+            users = users.filter(username__in=options["usernames"])
+
+        total = 0
+        for user in users.iterator():
+            total += timeline.rebuild_timeline(user, limit=options["limit"])
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt timelines with {total} entries"))
@@ -0,0 +1,46 @@
+# Generated by Django 6.0 on 2026-10-18 18:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+
+    def count_related(model_name):
+        counts = (
+            apps.get_model("posts", model_name)
+            .objects.filter(post=OuterRef("pk"))
+            .order_by()
+            .values("post")
+            .annotate(total=Count("pk"))
+            .values("total")
+        )
+        return Coalesce(Subquery(counts), 0)
+
+    Post.objects.update(
+        comments_count=count_related("Comment"),
+        likes_count=count_related("Like"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
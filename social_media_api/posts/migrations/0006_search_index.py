@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from posts.search import get_backend
+
+    get_backend(schema_editor.connection.vendor).install(schema_editor)
+
+
+def uninstall_search_index(apps, schema_editor):
+    from posts.search import get_backend
+
+    get_backend(schema_editor.connection.vendor).uninstall(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_access_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
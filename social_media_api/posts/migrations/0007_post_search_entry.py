@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 20:10
+
+import django.db.models.deletion
+import posts.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSearchEntry',
+            fields=[
+                ('post', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='posts.post')),
+                ('document', posts.models.FullTextDocument(db_column='posts_post_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'posts_post_fts',
+                'managed': False,
+            },
+        ),
+    ]
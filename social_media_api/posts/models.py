@@ -1,7 +1,33 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.conf import settings
 
 
+class PostQuerySet(models.QuerySet):
+    def with_listing_data(self):
+        """
+        Load everything PostSerializer reads in a fixed number of queries:
+        the author is joined and comments with their authors are prefetched.
+        Comment and like totals are read from the counter columns.
+        """
+        comments = Comment.objects.select_related("author")
+        return self.select_related("author").prefetch_related(
+            models.Prefetch("comments", queryset=comments)
+        )
+
+
+def count_subquery(model, field, outer="pk"):
+    """COUNT(*) of `model` rows whose `field` points at the outer row"""
+    counts = (
+        model.objects.filter(**{field: models.OuterRef(outer)})
+        .order_by()
+        .values(field)
+        .annotate(total=models.Count("pk"))
+        .values("total")
+    )
+    return Coalesce(models.Subquery(counts), 0)
+
+
 class Post(models.Model):
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="posts"
@@ -10,9 +36,21 @@ class Post(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized totals, kept in step with F() updates in posts.likes
+    # (likes) and posts.views / posts.bulk (comments)
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pagination key, see social_media_api.pagination
+            models.Index(fields=["-created_at", "-id"], name="post_created_id_idx"),
+            # Pulled feeds and profile listings: posts by author, newest first
+            models.Index(fields=["author", "-created_at"], name="post_author_created_idx"),
+        ]
 
     def __str__(self):
         return self.title
@@ -29,6 +67,12 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ["created_at"]
+        indexes = [
+            # Keyset pagination key, see social_media_api.pagination
+            models.Index(fields=["created_at", "id"], name="comment_created_id_idx"),
+            # Nested comments under a post, oldest first
+            models.Index(fields=["post", "created_at"], name="comment_post_created_idx"),
+        ]
 
     def __str__(self):
         return f"Comment by {self.author.username} on {self.post.title}"
@@ -46,4 +90,68 @@ class Like(models.Model):
         ordering = ["-created_at"]
 
     def __str__(self):
-        return f"{self.user.username} likes {self.post.title}"
\ No newline at end of file
+        return f"{self.user.username} likes {self.post.title}"
+
+class TimelineEntry(models.Model):
+    """A post materialized into a follower's home timeline."""
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    # Copied from the post so the timeline can be ordered without a join
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("owner", "post")
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["owner", "-created_at"], name="timeline_owner_recent_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.post.title} in {self.owner.username}'s timeline"
+
+
+class FullTextDocument(models.TextField):
+    """
+    An FTS5 table's hidden column named after the table, which MATCH
+    queries compare against; see PostSearchEntry.
+    """
+
+
+@FullTextDocument.register_lookup
+class FullTextMatch(models.Lookup):
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", [*lhs_params, *rhs_params]
+
+
+class PostSearchEntry(models.Model):
+    """
+    A post's row in the SQLite FTS5 index (see posts.search), which shares
+    its rowid with the post. Unmanaged: the table is created by migration
+    0006_search_index and only exists on SQLite.
+    """
+
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column="rowid",
+        related_name="search_entry",
+    )
+    document = FullTextDocument(db_column="posts_post_fts")
+    # bm25() score of the current MATCH; lower is better
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = "posts_post_fts"
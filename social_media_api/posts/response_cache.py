@@ -0,0 +1,173 @@
+"""
+Response cache for anonymous post reads.
+
+Cached responses are keyed by the request path and query string (which holds
+the page cursor and any search) plus version stamps. A `retrieve` uses its
+post's version. A list page uses the list version, which moves only when
+posts are created, edited or deleted and so the page may hold other posts,
+plus the versions of the posts it holds. Likes and comments bump just their
+post's version, so they only invalidate the pages that show that post.
+
+Writes bump the versions once their transaction commits, so a reader can
+never re-cache the pre-write state. A list page's post ids are learned by
+rendering it; a render that overlapped a write to one of its posts is not
+cached. Stale entries are never read again and simply expire.
+
+The version-stamped key doubles as the ETag, so a client sending
+If-None-Match gets a 304 without the database being touched.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, quote_etag
+from rest_framework.response import Response
+
+LIST_VERSION_KEY = "posts:version:list"
+POST_VERSION_KEY = "posts:version:{post_id}"
+# Any post write; for validators of views that are not cached per post
+ACTIVITY_VERSION_KEY = "posts:version:activity"
+PAGE_KEY = "posts:page:{digest}"
+RESPONSE_KEY = "posts:response:{digest}"
+
+
+def get_cache_timeout():
+    return getattr(settings, "POST_RESPONSE_CACHE_TIMEOUT", 60 * 5)
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock rather than 1 so an evicted stamp can never
+        # come back as a value older responses were cached under
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key, 0)
+    return version
+
+
+def get_list_version():
+    return get_version(LIST_VERSION_KEY)
+
+
+def get_activity_version():
+    return get_version(ACTIVITY_VERSION_KEY)
+
+
+def get_post_version(post_id):
+    return get_version(POST_VERSION_KEY.format(post_id=post_id))
+
+
+def get_post_versions(post_ids, start=None):
+    """
+    The versions of `post_ids`, in order, in one round trip when all exist.
+    Missing ones start from `start` (default: now), like get_version().
+    """
+    keys = [POST_VERSION_KEY.format(post_id=post_id) for post_id in post_ids]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        stamp = start or time.time_ns()
+        for key in missing:
+            cache.add(key, stamp, None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, 0) for key in keys]
+
+
+def _bump(post_ids, lists):
+    stamp = time.time_ns()
+    versions = {POST_VERSION_KEY.format(post_id=post_id): stamp for post_id in post_ids}
+    versions[ACTIVITY_VERSION_KEY] = stamp
+    if lists:
+        versions[LIST_VERSION_KEY] = stamp
+    cache.set_many(versions, None)
+
+
+def bump_versions(*post_ids):
+    """Invalidate the given posts and every list page after commit"""
+    transaction.on_commit(lambda: _bump(post_ids, lists=True))
+
+
+def bump_post_versions(*post_ids):
+    """
+    Invalidate the given posts, and only the list pages showing them, after
+    commit. For writes that change posts' counters or comments but not which
+    posts a list holds.
+    """
+    transaction.on_commit(lambda: _bump(post_ids, lists=False))
+
+
+def get_page_post_ids(data):
+    rows = data["results"] if isinstance(data, dict) else data
+    return [row["id"] for row in rows]
+
+
+class CachedResponseMixin:
+    """
+    Serve `list` and `retrieve` for anonymous users from the cache.
+
+    Responses carry a version-stamped ETag for every reader.
+    """
+
+    def get_version_stamp(self):
+        if self.action == "retrieve":
+            return get_post_version(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        return get_list_version()
+
+    def cached_response(self, request, render, *args, **kwargs):
+        key = f"{request.get_full_path()}|{self.get_version_stamp()}"
+        return self.serve(request, key, lambda: render(request, *args, **kwargs))
+
+    def serve(self, request, key, render, rendered=None):
+        """Answer from the cache under `key`, else `rendered` or `render()`"""
+        digest = hashlib.md5(key.encode()).hexdigest()
+        etag = quote_etag(digest)
+
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        cache_key = RESPONSE_KEY.format(digest=digest)
+        anonymous = not request.user.is_authenticated
+        data = cache.get(cache_key) if anonymous else None
+        if data is not None:
+            response = Response(data)
+        else:
+            response = rendered if rendered is not None else render()
+            if anonymous and response.status_code == 200:
+                cache.set(cache_key, response.data, get_cache_timeout())
+        if response.status_code == 200:
+            response["ETag"] = etag
+        return response
+
+    def cached_list_response(self, request, render, *args, **kwargs):
+        page_key = f"{request.get_full_path()}|{get_list_version()}"
+        ids_key = PAGE_KEY.format(digest=hashlib.md5(page_key.encode()).hexdigest())
+        post_ids = cache.get(ids_key)
+        if post_ids is not None:
+            versions = get_post_versions(post_ids)
+            return self.serve(
+                request,
+                f"{page_key}|{versions}",
+                lambda: render(request, *args, **kwargs),
+            )
+
+        # First read of this page: render it to learn which posts it holds
+        started = time.time_ns()
+        response = render(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        post_ids = get_page_post_ids(response.data)
+        versions = get_post_versions(post_ids, start=started)
+        if any(version > started for version in versions):
+            # A write to one of the posts overlapped the render
+            return response
+        cache.set(ids_key, post_ids, get_cache_timeout())
+        return self.serve(request, f"{page_key}|{versions}", None, rendered=response)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_list_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
@@ -1,9 +1,13 @@
 from rest_framework import serializers
 from .models import Post, Comment, Like
 from django.contrib.auth import get_user_model
+from social_media_api.fast_serializers import ValuesSerializer, format_datetime
 
 User = get_user_model()
 
+# Upper bound on the items accepted by one bulk create request
+BULK_CREATE_MAX_ITEMS = 1000
+
 
 class CommentSerializer(serializers.ModelSerializer):
     author = serializers.StringRelatedField(read_only=True)
@@ -36,8 +40,6 @@ class PostSerializer(serializers.ModelSerializer):
     author = serializers.StringRelatedField(read_only=True)
     author_id = serializers.ReadOnlyField(source="author.id")
     comments = CommentSerializer(many=True, read_only=True)
-    comments_count = serializers.SerializerMethodField()
-    likes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
@@ -53,10 +55,84 @@ class PostSerializer(serializers.ModelSerializer):
             "comments_count",
             "likes_count",
         ]
-        read_only_fields = ["id", "created_at", "updated_at", "author", "author_id"]
+        read_only_fields = [
+            "id",
+            "created_at",
+            "updated_at",
+            "author",
+            "author_id",
+            "comments_count",
+            "likes_count",
+        ]
+
+
+class BulkCreateSerializer(serializers.Serializer):
+    """Envelope of a bulk create request; each item is validated separately"""
+
+    items = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=BULK_CREATE_MAX_ITEMS,
+    )
+
+
+class BulkCommentSerializer(serializers.ModelSerializer):
+    """One comment of a bulk request; the posts are looked up together"""
+
+    post = serializers.IntegerField(min_value=1, source="post_id")
+
+    class Meta:
+        model = Comment
+        fields = ["post", "content"]
+
+
+class CommentValuesSerializer(ValuesSerializer):
+    """CommentSerializer's output built from values() rows"""
+
+    fields = (
+        ("id", "id", None),
+        ("post", "post_id", None),
+        ("author", "author__username", None),
+        ("author_id", "author_id", None),
+        ("content", "content", None),
+        ("created_at", "created_at", format_datetime),
+        ("updated_at", "updated_at", format_datetime),
+    )
+
+
+class PostValuesSerializer(ValuesSerializer):
+    """PostSerializer's output built from values() rows"""
+
+    fields = (
+        ("id", "id", None),
+        ("author", "author__username", None),
+        ("author_id", "author_id", None),
+        ("title", "title", None),
+        ("content", "content", None),
+        ("created_at", "created_at", format_datetime),
+        ("updated_at", "updated_at", format_datetime),
+        ("comments", None, None),
+        ("comments_count", "comments_count", None),
+        ("likes_count", "likes_count", None),
+    )
+
+    def get_comments(self, data):
+        return CommentValuesSerializer(
+            CommentValuesSerializer.get_queryset(
+                Comment.objects.filter(post_id__in=[post["id"] for post in data])
+            )
+        )
+
+    def add_comments(self, data, comments):
+        comments_by_post = {post["id"]: [] for post in data}
+        for comment in comments:
+            comments_by_post[comment["post"]].append(comment)
+        for post in data:
+            post["comments"] = comments_by_post[post["id"]]
 
-    def get_comments_count(self, obj):
-        return obj.comments.count()
+    def add_related(self, rows, data):
+        """Fetch the comments of every post on the page in one query"""
+        self.add_comments(data, self.get_comments(data).data)
 
-    def get_likes_count(self, obj):
-        return obj.likes.count()
\ No newline at end of file
+    async def aadd_related(self, rows, data):
+        self.add_comments(data, await self.get_comments(data).adata())
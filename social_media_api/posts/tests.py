@@ -1,3 +1,829 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from accounts import tokens
+from social_media_api import throttling
+from social_media_api.renderers import FastJSONRenderer
+
+from . import likes, timeline
+from notifications.models import NotificationEvent
+
+from .models import Comment, Like, Post, TimelineEntry
+from .serializers import (
+    CommentSerializer,
+    CommentValuesSerializer,
+    PostSerializer,
+    PostValuesSerializer,
+)
+
+User = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class FeedTimelineTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username="reader", password="pass12345")
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.stranger = User.objects.create_user(username="stranger", password="pass12345")
+        self.client.force_authenticate(user=self.reader)
+        self.client.post(reverse("follow-user", args=[self.author.id]))
+
+    def create_post(self, user, title, commit=True):
+        self.client.force_authenticate(user=user)
+        with self.captureOnCommitCallbacks(execute=commit):
+            response = self.client.post(
+                reverse("post-list"), {"title": title, "content": "body"}, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Post.objects.get(pk=response.data["id"])
+
+    def get_feed_titles(self):
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get(reverse("feed"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post["title"] for post in response.data["results"]]
+
+    def test_create_pushes_post_into_follower_timelines(self):
+        post = self.create_post(self.author, "Hello")
+        self.create_post(self.stranger, "Not followed")
+
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.reader, post=post).exists())
+        self.assertEqual(self.get_feed_titles(), ["Hello"])
+
+    def test_fan_out_waits_for_commit(self):
+        self.create_post(self.author, "Rolled back", commit=False)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=1)
+    def test_high_follower_authors_are_pulled_at_read_time(self):
+        self.author.refresh_from_db()
+        self.create_post(self.author, "Celebrity post")
+
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.get_feed_titles(), ["Celebrity post"])
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=2)
+    def test_fan_out_rereads_the_follower_count(self):
+        post = Post.objects.create(author=self.author, title="Hello", content="body")
+        # A cached request.user misses F() updates to its counters
+        stale_author = User.objects.get(pk=self.author.pk)
+        User.objects.filter(pk=self.author.pk).update(followers_count=2)
+
+        self.assertEqual(timeline.fan_out_posts(stale_author, [post]), 0)
+
+    def test_follow_backfills_and_unfollow_clears_timeline(self):
+        self.create_post(self.stranger, "Older post")
+
+        self.client.force_authenticate(user=self.reader)
+        self.client.post(reverse("follow-user", args=[self.stranger.id]))
+        self.assertEqual(self.get_feed_titles(), ["Older post"])
+
+        self.client.post(reverse("unfollow-user", args=[self.stranger.id]))
+        self.assertEqual(self.get_feed_titles(), [])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class PostQueryCountTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username="reader", password="pass12345")
+        self.client.force_authenticate(user=self.reader)
+
+    def add_posts(self, count):
+        for i in range(count):
+            author = User.objects.create(username=f"author{User.objects.count()}")
+            self.reader.following.add(author)
+            post = Post.objects.create(
+                author=author,
+                title=f"Post {i}",
+                content="body",
+                comments_count=2,
+                likes_count=1,
+            )
+            TimelineEntry.objects.create(owner=self.reader, post=post, created_at=post.created_at)
+            Comment.objects.create(post=post, author=author, content="first")
+            Comment.objects.create(post=post, author=self.reader, content="second")
+            Like.objects.create(post=post, user=self.reader)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries), response
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        for url in (reverse("post-list"), reverse("feed")):
+            with self.subTest(url=url):
+                Post.objects.all().delete()
+                self.add_posts(2)
+                small_page, _ = self.count_queries(url)
+                self.add_posts(8)
+                large_page, response = self.count_queries(url)
+
+                self.assertEqual(small_page, large_page)
+                self.assertEqual(len(response.data["results"]), 10)
+                first = response.data["results"][0]
+                self.assertEqual(first["comments_count"], 2)
+                self.assertEqual(first["likes_count"], 1)
+                self.assertEqual(len(first["comments"]), 2)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CounterTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.fan = User.objects.create_user(username="fan", password="pass12345")
+        self.post = Post.objects.create(author=self.author, title="Hello", content="body")
+        self.client.force_authenticate(user=self.fan)
+
+    def test_like_comment_and_follow_update_counters(self):
+        self.client.post(reverse("like-post", args=[self.post.id]))
+        self.client.post(
+            reverse("comment-list"), {"post": self.post.id, "content": "Nice"}, format="json"
+        )
+        self.client.post(reverse("follow-user", args=[self.author.id]))
+
+        self.post.refresh_from_db()
+        self.author.refresh_from_db()
+        self.fan.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (1, 1))
+        self.assertEqual((self.author.followers_count, self.fan.following_count), (1, 1))
+
+        self.client.post(reverse("unlike-post", args=[self.post.id]))
+        self.client.post(reverse("unfollow-user", args=[self.author.id]))
+
+        self.post.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+        self.assertEqual(self.author.followers_count, 0)
+
+    def test_drifted_counters_stop_at_zero(self):
+        # Rows written behind the counters' back, which leaves them at zero
+        Like.objects.create(user=self.fan, post=self.post)
+        comment = Comment.objects.create(post=self.post, author=self.fan, content="Hi")
+        self.author.followers.add(self.fan)
+
+        self.client.post(reverse("unlike-post", args=[self.post.id]))
+        response = self.client.delete(reverse("comment-detail", args=[comment.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        response = self.client.post(reverse("unfollow-user", args=[self.author.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.post.refresh_from_db()
+        self.author.refresh_from_db()
+        self.fan.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (0, 0))
+        self.assertEqual((self.author.followers_count, self.fan.following_count), (0, 0))
+
+    def test_rebuild_counters_reports_and_fixes_drift(self):
+        Like.objects.create(user=self.fan, post=self.post)
+        self.author.followers.add(self.fan)
+
+        out = StringIO()
+        call_command("rebuild_counters", "--dry-run", stdout=out)
+        self.assertIn("3 drifted counters found", out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+        call_command("rebuild_counters", stdout=StringIO())
+        self.post.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(self.author.followers_count, 1)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        for i in range(5):
+            Post.objects.create(author=self.author, title=f"Post {i}", content="body")
+
+    def test_cursor_walk_is_stable_when_posts_arrive(self):
+        response = self.client.get(reverse("post-list"), {"pagination": "cursor", "page_size": 2})
+        self.assertNotIn("count", response.data)
+        titles = [post["title"] for post in response.data["results"]]
+
+        # A new post at the head of the list must not shift later pages
+        Post.objects.create(author=self.author, title="Newest", content="body")
+
+        next_url = response.data["next"]
+        while next_url:
+            response = self.client.get(next_url)
+            titles += [post["title"] for post in response.data["results"]]
+            next_url = response.data["next"]
+
+        self.assertEqual(titles, [f"Post {i}" for i in range(4, -1, -1)])
+
+    def test_page_numbers_remain_the_default(self):
+        response = self.client.get(reverse("post-list"), {"page": 2, "page_size": 2})
+        self.assertEqual(response.data["count"], 5)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse("post-list"), {"cursor": "garbage"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class LikeTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.fan = User.objects.create_user(username="fan", password="pass12345")
+        self.post = Post.objects.create(author=self.author, title="Hello", content="body")
+        self.client.force_authenticate(user=self.fan)
+
+    def test_like_and_unlike_are_idempotent(self):
+        url = reverse("like-post", args=[self.post.id])
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+
+        url = reverse("unlike-post", args=[self.post.id])
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_missing_post_returns_404(self):
+        for name in ("like-post", "unlike-post"):
+            response = self.client.post(reverse(name, args=[self.post.id + 100]))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_add_like_returns_author_id(self):
+        self.assertEqual(likes.add_like(self.fan.id, self.post.id), self.author.id)
+        self.assertIsNone(likes.add_like(self.fan.id, self.post.id))
+        self.assertTrue(likes.remove_like(self.fan.id, self.post.id))
+        self.assertFalse(likes.remove_like(self.fan.id, self.post.id))
+
+
+@contextmanager
+def shareable_database():
+    """
+    Point new connections at a file copy of SQLite's in-memory test
+    database, which several connections can't write to concurrently.
+    Other databases are used as they are.
+    """
+    if connection.vendor != "sqlite" or not connection.is_in_memory_db():
+        yield
+        return
+    settings_dict = connection.settings_dict
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "concurrency.sqlite3")
+        connection.ensure_connection()
+        with closing(sqlite3.connect(path)) as target:
+            connection.connection.backup(target)
+        name, settings_dict["NAME"] = settings_dict["NAME"], path
+        try:
+            yield
+        finally:
+            settings_dict["NAME"] = name
+
+
+def in_thread(function, *args):
+    """Call `function` on a fresh connection in another thread"""
+
+    def run(*args):
+        try:
+            return function(*args)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(run, *args).result()
+
+
+class LikeConcurrencyTests(TransactionTestCase):
+    def test_concurrent_double_taps_store_one_like(self):
+        author = User.objects.create(username="author")
+        fans = [User.objects.create(username=f"fan{i}") for i in range(5)]
+        post = Post.objects.create(author=author, title="Hello", content="body")
+
+        def tap(fan):
+            try:
+                return likes.add_like(fan.id, post.id)
+            finally:
+                connection.close()
+
+        def counts():
+            return Like.objects.filter(post=post).count(), Post.objects.get(pk=post.pk).likes_count
+
+        with shareable_database():
+            with ThreadPoolExecutor(max_workers=10) as pool:
+                results = list(pool.map(tap, fans * 4))
+            self.assertEqual(in_thread(counts), (5, 5))
+        self.assertEqual(sum(result is not None for result in results), 5)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class SearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.django = Post.objects.create(
+            author=self.author, title="Django tips", content="Django django django"
+        )
+        self.mention = Post.objects.create(
+            author=self.author, title="Weekend", content="Went hiking, read about Django"
+        )
+        Post.objects.create(author=self.author, title="Cooking", content="Pasta night")
+
+    def search_titles(self, query):
+        response = self.client.get(reverse("post-list"), {"search": query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post["title"] for post in response.data["results"]]
+
+    def test_results_are_ranked(self):
+        self.assertEqual(self.search_titles("django"), ["Django tips", "Weekend"])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.mention.content = "Went hiking"
+        self.mention.save()
+        # ORM writes bypass the views, so drop the cached responses by hand
+        cache.clear()
+        self.assertEqual(self.search_titles("django"), ["Django tips"])
+
+        self.django.delete()
+        cache.clear()
+        self.assertEqual(self.search_titles("django"), [])
+        self.assertEqual(self.search_titles("hik"), ["Weekend"])
+
+    def test_words_match_from_their_start_only(self):
+        # The index matches word prefixes, not substrings as icontains did
+        self.assertEqual(self.search_titles("past"), ["Cooking"])
+        self.assertEqual(self.search_titles("asta"), [])
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(self.search_titles('pasta" (night'), ["Cooking"])
+        self.assertEqual(self.search_titles("*"), [])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="exporter", password="pass12345")
+        other = User.objects.create_user(username="other", password="pass12345")
+        self.post = Post.objects.create(author=self.user, title="Mine", content="Hello")
+        Comment.objects.create(post=self.post, author=self.user, content="Own comment")
+        Comment.objects.create(post=self.post, author=other, content="Not mine")
+        Post.objects.create(author=other, title="Theirs", content="Nope")
+        self.client.force_authenticate(user=self.user)
+
+    def export(self, **params):
+        response = self.client.get(reverse("export"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content)
+
+    def test_ndjson_contains_only_own_posts_and_comments(self):
+        response, body = self.export()
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        records = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(
+            [(record["type"], record.get("title") or record["content"]) for record in records],
+            [("post", "Mine"), ("comment", "Own comment")],
+        )
+        self.assertEqual(records[1]["post_id"], self.post.id)
+
+    def test_csv(self):
+        _, body = self.export(output="csv")
+        rows = list(csv.DictReader(StringIO(body.decode())))
+        self.assertEqual([row["type"] for row in rows], ["post", "comment"])
+        self.assertEqual(rows[0]["title"], "Mine")
+
+    def test_gzip(self):
+        response, body = self.export(output="csv", compress="gzip")
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn("exporter.csv.gz", response["Content-Disposition"])
+        self.assertTrue(gzip.decompress(body).decode().startswith("type,id,post_id"))
+
+    def test_unknown_output_is_rejected(self):
+        response = self.client.get(reverse("export"), {"output": "xml"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.reader = User.objects.create_user(username="reader", password="pass12345")
+        self.post = Post.objects.create(author=self.author, title="Cached", content="Body")
+        self.detail_url = reverse("post-detail", args=[self.post.id])
+
+    def count_queries(self, url, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, **headers)
+        return response, len(queries)
+
+    def test_anonymous_reads_are_served_from_cache(self):
+        for url in (reverse("post-list"), self.detail_url):
+            response, first = self.count_queries(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            cached, second = self.count_queries(url)
+            self.assertGreater(first, 0)
+            self.assertEqual(second, 0)
+            self.assertEqual(cached.data, response.data)
+
+    def test_if_none_match_returns_304(self):
+        response = self.client.get(self.detail_url)
+        not_modified, queries = self.count_queries(
+            self.detail_url, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(queries, 0)
+
+    def test_writes_invalidate_the_post_and_lists(self):
+        other = Post.objects.create(author=self.author, title="Other", content="Body")
+        other_url = reverse("post-detail", args=[other.id])
+        etag = self.client.get(self.detail_url)["ETag"]
+        other_etag = self.client.get(other_url)["ETag"]
+        list_etag = self.client.get(reverse("post-list"))["ETag"]
+
+        self.client.force_authenticate(user=self.reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("like-post", args=[self.post.id]))
+        self.client.force_authenticate(user=None)
+
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["likes_count"], 1)
+        self.assertNotEqual(self.client.get(reverse("post-list"))["ETag"], list_etag)
+        # Other posts keep their cached responses
+        response = self.client.get(other_url, HTTP_IF_NONE_MATCH=other_etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_likes_only_invalidate_list_pages_showing_the_post(self):
+        Post.objects.create(author=self.author, title="Newer", content="Body")
+        first_page = reverse("post-list") + "?page_size=1"
+        second_page = reverse("post-list") + "?page_size=1&page=2"
+        first_etag = self.client.get(first_page)["ETag"]
+        second_etag = self.client.get(second_page)["ETag"]
+
+        self.client.force_authenticate(user=self.reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("like-post", args=[self.post.id]))
+        self.client.force_authenticate(user=None)
+
+        response, queries = self.count_queries(first_page, HTTP_IF_NONE_MATCH=first_etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(queries, 0)
+        response = self.client.get(second_page, HTTP_IF_NONE_MATCH=second_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["likes_count"], 1)
+
+    def test_new_posts_invalidate_every_list_page(self):
+        etag = self.client.get(reverse("post-list"))["ETag"]
+        self.client.force_authenticate(user=self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("post-list"), {"title": "New", "content": "Body"})
+        self.client.force_authenticate(user=None)
+
+        response = self.client.get(reverse("post-list"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["title"], "New")
+
+    def test_comments_invalidate_the_post(self):
+        self.client.get(self.detail_url)
+        self.client.force_authenticate(user=self.reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("comment-list"), {"post": self.post.id, "content": "Hi"})
+        self.client.force_authenticate(user=None)
+
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.data["comments_count"], 1)
+        self.assertEqual(len(response.data["comments"]), 1)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.post = Post.objects.create(author=self.author, title="Post", content="Body")
+        self.comment = Comment.objects.create(post=self.post, author=self.author, content="Hi")
+        self.client.force_authenticate(user=self.author)
+
+    def test_comment_validators(self):
+        url = reverse("comment-detail", args=[self.comment.id])
+        response = self.client.get(url)
+        # Deletions are versioned in the ETag, which a date cannot follow
+        self.assertNotIn("Last-Modified", response)
+        etag = response["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(url, {"content": "Edited"})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["content"], "Edited")
+
+    def test_feed_revalidates_after_likes(self):
+        reader = User.objects.create_user(username="reader", password="pass12345")
+        TimelineEntry.objects.create(
+            owner=reader, post=self.post, created_at=self.post.created_at
+        )
+        self.client.force_authenticate(user=reader)
+        etag = self.client.get(reverse("feed"))["ETag"]
+        response = self.client.get(reverse("feed"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("like-post", args=[self.post.id]))
+        response = self.client.get(reverse("feed"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_feed_revalidates_after_unfollow(self):
+        reader = User.objects.create_user(username="reader", password="pass12345")
+        other = User.objects.create_user(username="other", password="pass12345")
+        Post.objects.filter(pk=self.post.pk).update(created_at=timezone.now() - timedelta(days=1))
+        Post.objects.create(author=other, title="Newer", content="Body")
+        self.client.force_authenticate(user=reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("follow-user", args=[self.author.id]))
+            self.client.post(reverse("follow-user", args=[other.id]))
+        etag = self.client.get(reverse("feed"))["ETag"]
+
+        # The newest post stays, so only the timeline version can tell
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("unfollow-user", args=[self.author.id]))
+        response = self.client.get(reverse("feed"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([post["title"] for post in response.data["results"]], ["Newer"])
+
+    def test_cursor_pages_do_not_count_rows(self):
+        reader = User.objects.create_user(username="reader", password="pass12345")
+        self.client.force_authenticate(user=reader)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("feed"), {"pagination": "cursor"})
+        self.assertFalse(any("COUNT(" in query["sql"] for query in queries.captured_queries))
+
+
+class ValuesSerializerTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.commenter = User.objects.create_user(username="zoë", password="pass12345")
+        for i in range(3):
+            post = Post.objects.create(
+                author=self.author, title=f"Post {i} \u2028", content="Ünïcode ✓"
+            )
+            for _ in range(i):
+                Comment.objects.create(post=post, author=self.commenter, content="Nice")
+
+    def assert_identical(self, expected, actual):
+        self.assertEqual(actual, expected)
+        self.assertEqual(FastJSONRenderer().render(actual), JSONRenderer().render(expected))
+
+    def test_posts_match_post_serializer(self):
+        posts = Post.objects.with_listing_data()
+        self.assert_identical(
+            PostSerializer(posts, many=True).data,
+            PostValuesSerializer(PostValuesSerializer.get_queryset(posts)).data,
+        )
+
+    def test_comments_match_comment_serializer(self):
+        comments = Comment.objects.select_related("author")
+        self.assert_identical(
+            CommentSerializer(comments, many=True).data,
+            CommentValuesSerializer(CommentValuesSerializer.get_queryset(comments)).data,
+        )
+
+    def test_post_page_uses_a_fixed_number_of_queries(self):
+        rows = PostValuesSerializer.get_queryset(Post.objects.all())
+        with self.assertNumQueries(2):
+            PostValuesSerializer(rows).data
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class BulkCreateTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.follower = User.objects.create_user(username="follower", password="pass12345")
+        self.client.force_authenticate(user=self.follower)
+        self.client.post(reverse("follow-user", args=[self.author.id]))
+        self.client.force_authenticate(user=self.author)
+
+    def test_bulk_posts_reports_each_item_and_fans_out(self):
+        items = [{"title": f"Imported {i}", "content": "Body"} for i in range(3)]
+        items.insert(1, {"content": "Missing title"})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("post-bulk"), {"items": items}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual((response.data["created"], response.data["failed"]), (3, 1))
+        results = response.data["results"]
+        self.assertIn("title", results[1]["errors"])
+        created_ids = [result["id"] for result in results if "id" in result]
+        self.assertEqual(
+            list(Post.objects.order_by("id").values_list("id", flat=True)), created_ids
+        )
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.follower).count(), 3)
+
+    @override_settings(NOTIFICATION_DISPATCH="queue")
+    def test_bulk_comments_update_counters_and_queue_notifications(self):
+        post = Post.objects.create(author=self.follower, title="Theirs", content="Body")
+        own = Post.objects.create(author=self.author, title="Mine", content="Body")
+        items = [
+            {"post": post.id, "content": "One"},
+            {"post": post.id, "content": "Two"},
+            {"post": own.id, "content": "Self"},
+            {"post": 999999, "content": "Nowhere"},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("comment-bulk"), {"items": items}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertIn("post", response.data["results"][3]["errors"])
+        post.refresh_from_db()
+        own.refresh_from_db()
+        self.assertEqual((post.comments_count, own.comments_count), (2, 1))
+        # Comments on your own post do not notify you
+        self.assertEqual(NotificationEvent.objects.filter(recipient=self.follower).count(), 2)
+        self.assertEqual(NotificationEvent.objects.count(), 2)
+        inserts = [q for q in queries.captured_queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 2)
+
+    def test_all_invalid_items_is_a_bad_request(self):
+        response = self.client.post(
+            reverse("comment-bulk"), {"items": [{"content": "No post"}]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Comment.objects.exists())
+
+
+def with_throttle_rates(**rates):
+    return override_settings(
+        REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": {
+                **settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"],
+                **rates,
+            },
+        }
+    )
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ThrottlingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        throttling.memory_store.clear()
+        throttling.metrics.reset()
+        self.user = User.objects.create_user(username="user", password="pass12345")
+        self.post = Post.objects.create(author=self.user, title="Post", content="Body")
+        self.client.force_authenticate(user=self.user)
+
+    def like_and_unlike(self):
+        self.client.post(reverse("like-post", args=[self.post.id]))
+        return self.client.post(reverse("unlike-post", args=[self.post.id]))
+
+    @with_throttle_rates(likes="2/min")
+    def test_scoped_bucket_rejects_with_retry_after(self):
+        self.assertEqual(self.like_and_unlike().status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse("like-post", args=[self.post.id]))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # The cache backend counts per minute, so the wait is until it ends
+        self.assertIn(int(response["Retry-After"]), range(1, 61))
+
+        # Other endpoints and other users have their own buckets
+        self.assertEqual(self.client.get(reverse("feed")).status_code, status.HTTP_200_OK)
+        other = User.objects.create_user(username="other", password="pass12345")
+        self.client.force_authenticate(user=other)
+        response = self.client.post(reverse("like-post", args=[self.post.id]))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @with_throttle_rates(user="3/min")
+    def test_memory_backend(self):
+        with self.settings(THROTTLE_BACKEND="memory"):
+            codes = [self.client.get(reverse("feed")).status_code for _ in range(4)]
+        self.assertEqual(codes[-2:], [status.HTTP_200_OK, status.HTTP_429_TOO_MANY_REQUESTS])
+        self.assertEqual(len(throttling.memory_store.buckets), 2)
+
+    def test_bucket_refills_over_time(self):
+        allowed, state, _ = throttling.refill(None, 0, 2, 1)
+        allowed, state, _ = throttling.refill(state, 0, 2, 1)
+        allowed, state, wait = throttling.refill(state, 0.5, 2, 1)
+        self.assertEqual((allowed, wait), (False, 0.5))
+        allowed, state, _ = throttling.refill(state, 1, 2, 1)
+        self.assertTrue(allowed)
+
+    def test_cache_window_hands_out_each_slot_once(self):
+        clients = 20
+        barrier = threading.Barrier(clients)
+
+        def consume(_):
+            barrier.wait()
+            return throttling.cache_store.consume("throttle:test:burst", 5, 5 / 60, 30)[0]
+
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            results = list(pool.map(consume, range(clients)))
+        self.assertEqual(sum(results), 5)
+
+    def test_cache_window_resets_when_the_period_ends(self):
+        consume = throttling.cache_store.consume
+        self.assertTrue(consume("throttle:test:window", 2, 2 / 60, 10)[0])
+        self.assertTrue(consume("throttle:test:window", 2, 2 / 60, 20)[0])
+        self.assertEqual(consume("throttle:test:window", 2, 2 / 60, 45), (False, 15))
+        self.assertTrue(consume("throttle:test:window", 2, 2 / 60, 60)[0])
+
+    @with_throttle_rates(likes="1/min")
+    def test_metrics(self):
+        self.like_and_unlike()
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse("throttle-metrics"))
+        self.assertEqual(response.data["scopes"]["likes"], {"allowed": 1, "throttled": 1})
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class AsyncFeedTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        throttling.metrics.reset()
+        self.reader = User.objects.create_user(username="reader", password="pass12345")
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.reader.following.add(self.author)
+        for i in range(3):
+            post = Post.objects.create(author=self.author, title=f"Post {i}", content="Body")
+            Comment.objects.create(post=post, author=self.reader, content="Hi")
+            TimelineEntry.objects.create(owner=self.reader, post=post, created_at=post.created_at)
+        self.token, _ = tokens.issue_token(self.reader)
+
+    def test_matches_sync_feed(self):
+        self.client.force_authenticate(user=self.reader)
+        for params in ({}, {"page_size": 2, "page": 2}, {"pagination": "cursor", "page_size": 2}):
+            expected = self.client.get(reverse("feed"), params)
+            response = self.client.get(reverse("async-feed"), params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                json.loads(response.content)["results"], json.loads(expected.content)["results"]
+            )
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=1)
+    def test_pulls_high_follower_authors(self):
+        TimelineEntry.objects.all().delete()
+        User.objects.filter(pk=self.author.pk).update(followers_count=1)
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get(reverse("async-feed"))
+        self.assertEqual(response.json()["count"], 3)
+
+    def test_conditional_get(self):
+        self.client.force_authenticate(user=self.reader)
+        etag = self.client.get(reverse("async-feed"))["ETag"]
+        response = self.client.get(reverse("async-feed"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_requires_authentication(self):
+        response = self.client.get(reverse("async-feed"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response["WWW-Authenticate"], "Token")
+
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.post(reverse("async-feed"))
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    @with_throttle_rates(feed="1/min")
+    def test_feed_scope_is_throttled(self):
+        self.client.force_authenticate(user=self.reader)
+        self.assertEqual(self.client.get(reverse("async-feed")).status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse("async-feed"))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn(int(response["Retry-After"]), range(1, 61))
+
+    async def test_served_through_asgi_with_token(self):
+        response = await self.async_client.get(
+            reverse("async-feed"), headers={"Authorization": f"Token {self.token}"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        titles = [post["title"] for post in response.json()["results"]]
+        self.assertEqual(titles, ["Post 2", "Post 1", "Post 0"])
+        self.assertEqual(len(response.json()["results"][0]["comments"]), 1)
@@ -0,0 +1,193 @@
+"""
+Materialized home timelines (fan-out on write).
+
+When a post is created its id is pushed into the timeline of every follower,
+so reading a feed is a lookup on the reader's own timeline rows instead of a
+join across everyone they follow. Authors with at least
+TIMELINE_FANOUT_THRESHOLD followers are not fanned out; their posts are pulled
+at read time and merged into the feed. Fan-out runs once the post's
+transaction commits, so a rolled-back post never reaches a timeline.
+
+Which side of the threshold an author is on is decided per post, and
+crossing it does not move existing posts. An author who grows past it keeps
+their old timeline entries, which the pulled posts simply overlap. One who
+drops below it stops being pulled, so the posts written while they were
+pulled disappear from their followers' feeds until `manage.py
+rebuild_timelines` copies them back in.
+
+Changes to who a user follows are recorded in a per-user timeline version
+stamp, which the feed's conditional GET validators include.
+"""
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from accounts import graph
+
+from .models import Post, TimelineEntry
+from .response_cache import get_version
+
+FANOUT_BATCH_SIZE = 1000
+# How many recent posts to copy into a timeline when a new follow happens
+BACKFILL_LIMIT = 50
+TIMELINE_VERSION_KEY = "posts:version:timeline:{user_id}"
+
+
+def get_fanout_threshold():
+    return getattr(settings, "TIMELINE_FANOUT_THRESHOLD", 10000)
+
+
+def is_pull_author(author):
+    """Authors with many followers are read on demand instead of fanned out"""
+    # Read from the database: request.user may come from the token cache,
+    # whose followers_count misses the F() updates made since
+    return (
+        get_user_model()
+        .objects.filter(pk=author.pk, followers_count__gte=get_fanout_threshold())
+        .exists()
+    )
+
+
+def get_pull_author_ids(user):
+    """Ids of the accounts `user` follows whose posts are pulled at read time"""
+    following_ids = graph.get_following_ids(user.id)
+    if not following_ids:
+        return []
+    return list(
+        get_user_model()
+        .objects.filter(id__in=following_ids, followers_count__gte=get_fanout_threshold())
+        .values_list("id", flat=True)
+    )
+
+
+def fan_out_post(post):
+    """Push a new post into its author's followers' timelines after commit"""
+    fan_out_posts_on_commit(post.author, [post])
+
+
+def fan_out_posts_on_commit(author, posts):
+    """fan_out_posts() once the current transaction commits"""
+    transaction.on_commit(lambda: fan_out_posts(author, posts))
+
+
+def fan_out_posts(author, posts):
+    """
+    Push several new posts by `author` into each follower's timeline.
+
+    Followers are read once and the entries written in batches of
+    FANOUT_BATCH_SIZE. Returns the number of entries written.
+    """
+    if not posts or is_pull_author(author):
+        return 0
+
+    follower_ids = list(author.followers.values_list("id", flat=True))
+    entries = (
+        TimelineEntry(owner_id=follower_id, post_id=post.id, created_at=post.created_at)
+        for post in posts
+        for follower_id in follower_ids
+    )
+    written = 0
+    while batch := list(islice(entries, FANOUT_BATCH_SIZE)):
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        written += len(batch)
+    return written
+
+
+def get_timeline_version(user_id):
+    return get_version(TIMELINE_VERSION_KEY.format(user_id=user_id))
+
+
+def bump_timeline_version(user_id):
+    """Change `user_id`'s timeline version once the current transaction commits"""
+    transaction.on_commit(
+        lambda: cache.set(TIMELINE_VERSION_KEY.format(user_id=user_id), time.time_ns(), None)
+    )
+
+
+def backfill_timeline(user, author_ids, limit=BACKFILL_LIMIT):
+    """
+    Copy the `limit` most recent posts of each of `author_ids` into `user`'s
+    timeline after a follow, in a single query. Pull authors are skipped.
+    """
+    # Pull authors change the feed as well, so bump before skipping them
+    bump_timeline_version(user.id)
+    recent_posts = (
+        Post.objects.filter(
+            author_id__in=author_ids,
+            author__followers_count__lt=get_fanout_threshold(),
+        )
+        .annotate(
+            rank=Window(
+                RowNumber(), partition_by=F("author_id"), order_by=F("created_at").desc()
+            )
+        )
+        .filter(rank__lte=limit)
+        .values_list("id", "created_at")
+    )
+    entries = [
+        TimelineEntry(owner_id=user.id, post_id=post_id, created_at=created_at)
+        for post_id, created_at in recent_posts
+    ]
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=FANOUT_BATCH_SIZE, ignore_conflicts=True
+    )
+    return len(entries)
+
+
+def remove_authors_from_timeline(user, author_ids):
+    """Drop the posts of `author_ids` from `user`'s timeline after an unfollow"""
+    bump_timeline_version(user.id)
+    deleted, _ = TimelineEntry.objects.filter(
+        owner=user, post__author_id__in=author_ids
+    ).delete()
+    return deleted
+
+
+def rebuild_timeline(user, limit=BACKFILL_LIMIT):
+    """Recreate `user`'s timeline from the accounts they currently follow"""
+    TimelineEntry.objects.filter(owner=user).delete()
+    return backfill_timeline(user, graph.get_following_ids(user.id), limit)
+
+
+async def aget_pull_author_ids(user):
+    """Async get_pull_author_ids() for async views"""
+    following_ids = await graph.aget_following_ids(user.id)
+    if not following_ids:
+        return []
+    authors = (
+        get_user_model()
+        .objects.filter(id__in=following_ids, followers_count__gte=get_fanout_threshold())
+        .values_list("id", flat=True)
+    )
+    return [author_id async for author_id in authors]
+
+
+def get_feed_queryset(user, pull_author_ids=None):
+    """
+    Posts for `user`'s home feed, newest first.
+
+    Reads post ids from the materialized timeline and, if the user follows
+    any high-follower accounts, merges in those authors' posts directly.
+    Callers that already have `pull_author_ids` (from get_pull_author_ids()
+    or aget_pull_author_ids()) pass them in to save the lookup.
+    """
+    if pull_author_ids is None:
+        pull_author_ids = get_pull_author_ids(user)
+    if not pull_author_ids:
+        # Ordered by the entries' copy of created_at so the page is read in
+        # order from the (owner, -created_at) index instead of sorted
+        return Post.objects.filter(timeline_entries__owner=user).order_by(
+            "-timeline_entries__created_at"
+        )
+
+    # Pulled posts have no timeline entry, so the merge orders by the post
+    timeline_post_ids = TimelineEntry.objects.filter(owner=user).values("post_id")
+    return Post.objects.filter(
+        Q(id__in=timeline_post_ids) | Q(author_id__in=pull_author_ids)
+    ).order_by("-created_at")
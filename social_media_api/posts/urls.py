@@ -1,6 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PostViewSet, CommentViewSet, feed_view, like_post, unlike_post
+from .views import (
+    PostViewSet,
+    CommentViewSet,
+    export_view,
+    feed_view,
+    like_post,
+    unlike_post,
+)
+from . import async_views
 
 router = DefaultRouter()
 router.register(r"posts", PostViewSet, basename="post")
@@ -9,6 +17,8 @@ router.register(r"comments", CommentViewSet, basename="comment")
 urlpatterns = [
     path("", include(router.urls)),
     path("feed/", feed_view, name="feed"),
+    path("async/feed/", async_views.feed_view, name="async-feed"),
+    path("export/", export_view, name="export"),
     path("posts/<int:pk>/like/", like_post, name="like-post"),
     path("posts/<int:pk>/unlike/", unlike_post, name="unlike-post"),
 ]
\ No newline at end of file
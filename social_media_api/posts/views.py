@@ -1,11 +1,49 @@
-from rest_framework import viewsets, permissions, filters, status, generics
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework import viewsets, permissions, status, generics
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.contrib.contenttypes.models import ContentType
-from .models import Post, Comment, Like
-from .serializers import PostSerializer, CommentSerializer, LikeSerializer
+from notifications.dispatch import notify
+from social_media_api.conditional import ConditionalGetMixin, respond_conditionally
+from social_media_api.fast_serializers import FastListMixin
+from social_media_api.pagination import CommentPagination, PostPagination
+from social_media_api.throttling import throttle_scope
+from .models import Post, Comment
+from .serializers import (
+    BulkCreateSerializer,
+    CommentSerializer,
+    CommentValuesSerializer,
+    LikeSerializer,
+    PostSerializer,
+    PostValuesSerializer,
+)
+from . import bulk, export, likes, timeline
+from .response_cache import (
+    CachedResponseMixin,
+    bump_post_versions,
+    bump_versions,
+    get_activity_version,
+)
+from .search import FullTextSearchFilter
+
+
+def bulk_create_response(results):
+    """201 if every item was created, 207 if some were, 400 if none were"""
+    failed = sum("errors" in result for result in results)
+    if not failed:
+        response_status = status.HTTP_201_CREATED
+    elif failed < len(results):
+        response_status = status.HTTP_207_MULTI_STATUS
+    else:
+        response_status = status.HTTP_400_BAD_REQUEST
+    return Response(
+        {"created": len(results) - failed, "failed": failed, "results": results},
+        status=response_status,
+    )
 
 
 class IsAuthorOrReadOnly(permissions.BasePermission):
@@ -21,90 +59,160 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
         return obj.author == request.user
 
 
-class StandardResultsPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = "page_size"
-    max_page_size = 100
-
-
-class PostViewSet(viewsets.ModelViewSet):
-    queryset = Post.objects.all()
+class PostViewSet(CachedResponseMixin, FastListMixin, viewsets.ModelViewSet):
+    queryset = Post.objects.with_listing_data()
     serializer_class = PostSerializer
+    fast_serializer_class = PostValuesSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
-    pagination_class = StandardResultsPagination
-    filter_backends = [filters.SearchFilter]
-    search_fields = ["title", "content"]
+    pagination_class = PostPagination
+    # Ranked full-text search over title and content (?search=...); matches
+    # whole words or word prefixes, not arbitrary substrings (see posts.search)
+    filter_backends = [FullTextSearchFilter]
+    # Only the bulk action is throttled per endpoint
+    throttle_scope = None
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        # Push the new post into each follower's home timeline after commit
+        timeline.fan_out_post(post)
+        bump_versions()
+
+    def perform_update(self, serializer):
+        post = serializer.save()
+        bump_versions(post.pk)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        serializer_class=BulkCreateSerializer,
+        throttle_scope="bulk",
+    )
+    def bulk(self, request):
+        """Create up to BULK_CREATE_MAX_ITEMS posts: {"items": [{...}, ...]}"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return bulk_create_response(
+            bulk.create_posts(request.user, serializer.validated_data["items"])
+        )
 
+    def perform_destroy(self, instance):
+        post_id = instance.pk
+        instance.delete()
+        bump_versions(post_id)
 
-class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.all()
+
+class CommentViewSet(ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
+    queryset = Comment.objects.select_related("author")
     serializer_class = CommentSerializer
+    fast_serializer_class = CommentValuesSerializer
+    # Only the bulk action is throttled per endpoint
+    throttle_scope = None
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
-    pagination_class = StandardResultsPagination
+    pagination_class = CommentPagination
+
+    def get_conditional_version(self):
+        # Bumped by every comment write, deletions included
+        return [get_activity_version()]
 
+    @transaction.atomic
     def perform_create(self, serializer):
         comment = serializer.save(author=self.request.user)
-        # Create notification for post author
-        from notifications.models import Notification
-
-        if comment.post.author != self.request.user:
-            Notification.objects.create(
-                recipient=comment.post.author,
-                actor=self.request.user,
+        Post.objects.filter(pk=comment.post_id).update(
+            comments_count=F("comments_count") + 1
+        )
+        bump_post_versions(comment.post_id)
+        # Queue a notification for the post author
+        if comment.post.author_id != self.request.user.id:
+            notify(
+                recipient_id=comment.post.author_id,
+                actor_id=self.request.user.id,
                 verb="commented on your post",
                 target=comment.post,
             )
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        post_id = instance.post_id
+        instance.delete()
+        Post.objects.filter(pk=post_id).update(
+            comments_count=Greatest(F("comments_count") - 1, 0)
+        )
+        bump_post_versions(post_id)
+
+    def perform_update(self, serializer):
+        comment = serializer.save()
+        bump_post_versions(comment.post_id)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        serializer_class=BulkCreateSerializer,
+        throttle_scope="bulk",
+    )
+    def bulk(self, request):
+        """Create up to BULK_CREATE_MAX_ITEMS comments: {"items": [{...}, ...]}"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return bulk_create_response(
+            bulk.create_comments(request.user, serializer.validated_data["items"])
+        )
 
+
+@throttle_scope("feed")
 @api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated])
 def feed_view(request):
     """
     Get posts from users that the current user follows
     """
-    # Get users that the current user is following
-    following_users = request.user.following.all()
+    # Read posts from the user's materialized timeline, most recent first.
+    # The pull authors are looked up once for both the validators and the page.
+    pull_author_ids = timeline.get_pull_author_ids(request.user)
+    feed_posts = timeline.get_feed_queryset(request.user, pull_author_ids)
 
-    # Get posts from those users, ordered by most recent first
-    feed_posts = Post.objects.filter(author__in=following_users).order_by("-created_at")
+    def render():
+        # Paginate the results
+        paginator = PostPagination()
+        paginated_posts = paginator.paginate_queryset(
+            PostValuesSerializer.get_queryset(feed_posts), request
+        )
 
-    # Paginate the results
-    paginator = StandardResultsPagination()
-    paginated_posts = paginator.paginate_queryset(feed_posts, request)
+        # Serialize the data straight from values() rows
+        serializer = PostValuesSerializer(paginated_posts)
 
-    # Serialize the data
-    serializer = PostSerializer(paginated_posts, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
-    return paginator.get_paginated_response(serializer.data)
+    # Like and comment counters, deletions and follows change the feed
+    # without touching updated_at
+    version = [get_activity_version(), timeline.get_timeline_version(request.user.id)]
+    return respond_conditionally(request, feed_posts, "updated_at", render, version)
 
 
+@throttle_scope("likes")
 @api_view(["POST"])
 @permission_classes([permissions.IsAuthenticated])
 def like_post(request, pk):
     """Like a post"""
-    post = generics.get_object_or_404(Post, pk=pk)
-
-    # Use get_or_create to handle liking
-    like, created = Like.objects.get_or_create(user=request.user, post=post)
+    # Inserts the like, bumps the counter and returns the author in one go
+    author_id = likes.add_like(request.user.id, pk)
 
-    if not created:
+    if author_id is None:
+        generics.get_object_or_404(Post, pk=pk)
         return Response(
             {"error": "You have already liked this post"},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    # Create notification for post author
-    from notifications.models import Notification
+    bump_post_versions(pk)
 
-    if post.author != request.user:
-        Notification.objects.create(
-            recipient=post.author,
-            actor=request.user,
+    # Queue a notification for the post author
+    if author_id != request.user.id:
+        notify(
+            recipient_id=author_id,
+            actor_id=request.user.id,
             verb="liked your post",
-            target=post,
+            target=Post(pk=pk),
         )
 
     return Response(
@@ -112,21 +220,49 @@ def like_post(request, pk):
     )
 
 
+@throttle_scope("likes")
 @api_view(["POST"])
 @permission_classes([permissions.IsAuthenticated])
 def unlike_post(request, pk):
     """Unlike a post"""
-    post = generics.get_object_or_404(Post, pk=pk)
-
-    # Check if like exists
-    try:
-        like = Like.objects.get(user=request.user, post=post)
-        like.delete()
+    if likes.remove_like(request.user.id, pk):
+        bump_post_versions(pk)
         return Response(
             {"message": "Post unliked successfully"}, status=status.HTTP_200_OK
         )
-    except Like.DoesNotExist:
+
+    generics.get_object_or_404(Post, pk=pk)
+    return Response(
+        {"error": "You have not liked this post"},
+        status=status.HTTP_400_BAD_REQUEST,
+    )
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+def export_view(request):
+    """
+    Stream the current user's posts and comments.
+
+    ?output=ndjson (default) or csv; ?compress=gzip compresses on the fly.
+    """
+    export_format = request.query_params.get("output", "ndjson")
+    if export_format not in export.EXPORT_FORMATS:
         return Response(
-            {"error": "You have not liked this post"},
+            {"error": f"output must be one of: {', '.join(export.EXPORT_FORMATS)}"},
             status=status.HTTP_400_BAD_REQUEST,
-        )
\ No newline at end of file
+        )
+    compress = request.query_params.get("compress") == "gzip"
+
+    filename = f"export-{request.user.username}.{export_format}"
+    content_type = export.EXPORT_FORMATS[export_format]
+    if compress:
+        filename += ".gz"
+        content_type = "application/gzip"
+
+    response = StreamingHttpResponse(
+        export.stream_export(request.user.id, export_format, compress),
+        content_type=content_type,
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
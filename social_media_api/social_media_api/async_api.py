@@ -0,0 +1,91 @@
+"""
+Plumbing for async API views.
+
+DRF's APIView dispatches synchronously, so under ASGI every request to it
+holds a worker thread for its whole lifetime, including the time spent
+waiting on the database. `async_api_view` runs a coroutine view instead,
+with the same policy as the sync endpoints: DEFAULT_AUTHENTICATION_CLASSES,
+an authenticated user, DEFAULT_THROTTLE_CLASSES (with `throttle_scope`)
+and errors from EXCEPTION_HANDLER. Authentication and throttling read the
+token and bucket caches, falling back to the database on a miss, so they
+run through sync_to_async; the view itself uses the async ORM. Responses
+are rendered as JSON with FastJSONRenderer.
+"""
+import math
+from functools import wraps
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .renderers import FastJSONRenderer
+
+ALLOWED_METHODS = ("GET", "HEAD")
+
+
+def check_request(request, view):
+    """Authenticate, require a user and apply the throttles, like APIView.initial()"""
+    if not (request.user and request.user.is_authenticated):
+        exc = exceptions.NotAuthenticated()
+        if request.authenticators:
+            exc.auth_header = request.authenticators[0].authenticate_header(request)
+        raise exc
+
+    waits = []
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, view):
+            waits.append(throttle.wait())
+    if waits:
+        wait = max((wait for wait in waits if wait is not None), default=None)
+        raise exceptions.Throttled(math.ceil(wait) if wait is not None else None)
+
+
+def render_response(response, request, view):
+    if not isinstance(response, Response):
+        return response
+    response.accepted_renderer = FastJSONRenderer()
+    response.accepted_media_type = FastJSONRenderer.media_type
+    response.renderer_context = {"request": request, "view": view, "response": response}
+    return response.render()
+
+
+def handle_exception(exc, request, view):
+    response = api_settings.EXCEPTION_HANDLER(exc, {"request": request, "view": view})
+    if response is None:
+        raise exc
+    return render_response(response, request, view)
+
+
+def async_api_view(throttle_scope=None):
+    """
+    Decorator for `async def view(request, ...)` read endpoints.
+
+    The view receives a DRF Request and returns a Response (rendered here)
+    or a plain HttpResponse such as a 304.
+    """
+
+    def decorator(view_func):
+        view = SimpleNamespace(throttle_scope=throttle_scope)
+
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            request = Request(
+                request,
+                authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+            )
+            try:
+                if request.method not in ALLOWED_METHODS:
+                    raise exceptions.MethodNotAllowed(request.method)
+                await sync_to_async(check_request)(request, view)
+                response = await view_func(request, *args, **kwargs)
+            except Exception as exc:
+                return handle_exception(exc, request, view)
+            return render_response(response, request, view)
+
+        return wrapper
+
+    return decorator
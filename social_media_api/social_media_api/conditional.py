@@ -0,0 +1,139 @@
+"""
+Conditional GET support shared by the posts and notifications apps.
+
+Validators come from one cheap aggregate over the result set, the newest
+modification time (an index seek, no COUNT over the rows), plus the full
+request path for the page being read. That time cannot see every change:
+deleted rows, counters updated in place, rows marked read. Views add version
+parts, stamps bumped whenever such a change happens, so the ETag moves with
+them. A date cannot follow those parts, so views passing a version get no
+Last-Modified and If-Modified-Since is ignored for them. When the client's
+validators still match, a 304 is returned before anything is fetched or
+serialized.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Max
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+
+def get_validators(request, queryset, field, version=()):
+    """(etag, last_modified) for `queryset`, using the max of `field`"""
+    summary = queryset.order_by().aggregate(last_modified=Max(field))
+    return build_validators(request, summary["last_modified"], version)
+
+
+async def aget_validators(request, queryset, field, version=()):
+    """get_validators() for async views"""
+    summary = await queryset.order_by().aaggregate(last_modified=Max(field))
+    return build_validators(request, summary["last_modified"], version)
+
+
+def build_validators(request, last_modified, version):
+    parts = [
+        request.get_full_path(),
+        last_modified.isoformat() if last_modified else "",
+        *version,
+    ]
+    etag = quote_etag(hashlib.md5("|".join(map(str, parts)).encode()).hexdigest())
+    if version:
+        # The date does not move when only a version part changes
+        last_modified = None
+    return etag, last_modified
+
+
+def get_not_modified(request, etag, last_modified):
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+
+
+def set_validators(response, etag, last_modified):
+    if response.status_code == 200:
+        response["ETag"] = etag
+        if last_modified:
+            response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
+
+
+def respond_conditionally(request, queryset, field, render, version=()):
+    """Return a 304 if the client is up to date, else `render()` with validators"""
+    etag, last_modified = get_validators(request, queryset, field, version)
+    not_modified = get_not_modified(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    return set_validators(render(), etag, last_modified)
+
+
+async def arespond_conditionally(request, queryset, field, render, version=()):
+    """respond_conditionally() for async views; `render` is a coroutine function"""
+    etag, last_modified = await aget_validators(request, queryset, field, version)
+    not_modified = get_not_modified(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    return set_validators(await render(), etag, last_modified)
+
+
+def conditional_get(get_queryset, field="updated_at", get_version=None):
+    """
+    Decorator for function views; apply it below @api_view.
+
+    `get_queryset(request)` returns the rows the response is built from and
+    `get_version(request)` any extra version parts.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            version = get_version(request) if get_version else ()
+            return respond_conditionally(
+                request,
+                get_queryset(request),
+                field,
+                lambda: view(request, *args, **kwargs),
+                version,
+            )
+
+        return wrapper
+
+    return decorator
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified for a generic view's `list` and `retrieve`.
+
+    Set `conditional_field` to the model's modification timestamp and
+    override `get_conditional_version()` to add version parts.
+    """
+
+    conditional_field = "updated_at"
+
+    def get_conditional_version(self):
+        return ()
+
+    def get_conditional_queryset(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        if getattr(self, "action", None) == "retrieve":
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return queryset
+
+    def conditional_response(self, render, request, *args, **kwargs):
+        return respond_conditionally(
+            request,
+            self.get_conditional_queryset(),
+            self.conditional_field,
+            lambda: render(request, *args, **kwargs),
+            self.get_conditional_version(),
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
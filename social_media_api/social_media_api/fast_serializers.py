@@ -0,0 +1,109 @@
+"""
+Read-only serializers over `.values()` rows for the hot list endpoints.
+
+A ModelSerializer instantiates a model per row and walks its declared fields
+through `to_representation` one at a time. A ValuesSerializer declares its
+output once as (name, lookup, formatter) triples; the lookups are compiled
+to `itemgetter`s when the class is created and rows are turned into dicts
+directly, which is several times cheaper on large pages. Each subclass must
+produce output identical to the ModelSerializer it stands in for.
+
+`FastListMixin` switches a generic view's `list` over to the fast path.
+Async views await `adata()` instead of reading `data`.
+"""
+from operator import itemgetter
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from rest_framework.response import Response
+
+
+def format_datetime(value):
+    """Same output as DRF's DateTimeField with the default ISO 8601 format"""
+    if value is None:
+        return None
+    value = value.astimezone(timezone.get_current_timezone()).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+class ValuesSerializer:
+    """
+    Serialize `.values()` rows (or a values queryset) into dicts.
+
+    `fields` is a sequence of (output name, values() lookup, formatter)
+    triples; formatter may be None. A lookup of None reserves the key for
+    `add_related()` to fill in, keeping the key order of the original
+    serializer.
+    """
+
+    fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.lookups = list(dict.fromkeys(lookup for _, lookup, _ in cls.fields if lookup))
+        cls.accessors = tuple(
+            (name, itemgetter(lookup) if lookup else None, formatter)
+            for name, lookup, formatter in cls.fields
+        )
+
+    def __init__(self, instance):
+        self.instance = instance
+
+    @classmethod
+    def get_queryset(cls, queryset):
+        """Turn a model queryset into the values queryset this class reads"""
+        return queryset.prefetch_related(None).values(*cls.lookups)
+
+    def to_representation(self, row):
+        data = {}
+        for name, get, formatter in self.accessors:
+            if get is None:
+                data[name] = None
+            elif formatter is None:
+                data[name] = get(row)
+            else:
+                data[name] = formatter(get(row))
+        return data
+
+    def add_related(self, rows, data):
+        """Hook for filling in related data for the whole page at once"""
+
+    async def aadd_related(self, rows, data):
+        """add_related() for async views; override it to use the async ORM"""
+        await sync_to_async(self.add_related)(rows, data)
+
+    @property
+    def data(self):
+        rows = list(self.instance)
+        data = [self.to_representation(row) for row in rows]
+        self.add_related(rows, data)
+        return data
+
+    async def adata(self):
+        """`data` for async views, fetching unevaluated querysets with the async ORM"""
+        if isinstance(self.instance, (list, tuple)):
+            rows = list(self.instance)
+        else:
+            rows = [row async for row in self.instance]
+        data = [self.to_representation(row) for row in rows]
+        await self.aadd_related(rows, data)
+        return data
+
+
+class FastListMixin:
+    """Serve `list` through `fast_serializer_class`; None uses the normal path"""
+
+    fast_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        if self.fast_serializer_class is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.fast_serializer_class.get_queryset(queryset)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.fast_serializer_class(page).data)
+        return Response(self.fast_serializer_class(rows).data)
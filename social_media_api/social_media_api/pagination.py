@@ -0,0 +1,204 @@
+"""
+Pagination classes shared by the posts and notifications apps.
+
+Page-number pagination stays the default. Clients can opt in to keyset
+(cursor) pagination by sending ``?pagination=cursor`` or a ``cursor`` value
+returned by a previous page. Keyset pages seek on an indexed ``(timestamp,
+id)`` pair, so deep pages cost the same as the first one, no COUNT(*) is run
+and rows created between requests never shift or duplicate items.
+"""
+import base64
+import json
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class StandardResultsPagination(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views, using the async ORM"""
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Fill Paginator's cached count so paginator.page() does not query
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(
+                self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            )
+        self.page.object_list = [row async for row in self.page.object_list]
+        return list(self.page)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only keyset pagination over ``ordering``, a (timestamp, id) pair.
+
+    Both fields must sort in the same direction, and a composite index on
+    them should exist for the filtered queryset.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset, page_size = self.get_page_queryset(queryset, request)
+        return self.set_page(list(queryset[: page_size + 1]), page_size)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views, using the async ORM"""
+        queryset, page_size = self.get_page_queryset(queryset, request)
+        return self.set_page([row async for row in queryset[: page_size + 1]], page_size)
+
+    def get_page_queryset(self, queryset, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_seek_filter(position))
+        return queryset, page_size
+
+    def set_page(self, results, page_size):
+        """Keep the page, using the extra row fetched to tell if there is a next one"""
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_field_names(self):
+        return [field.lstrip("-") for field in self.ordering]
+
+    def get_seek_filter(self, position):
+        """WHERE clause selecting the rows after `position` in `ordering`"""
+        (time_field, id_field), (timestamp, pk) = self.get_field_names(), position
+        lookup = "lt" if self.ordering[0].startswith("-") else "gt"
+        return Q(**{f"{time_field}__{lookup}": timestamp}) | Q(
+            **{time_field: timestamp, f"{id_field}__{lookup}": pk}
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        time_field, id_field = self.get_field_names()
+        last = self.page[-1]
+        if isinstance(last, dict):
+            # Rows from a values() queryset, see social_media_api.fast_serializers
+            position = (last[time_field], last[id_field])
+        else:
+            position = (getattr(last, time_field), getattr(last, id_field))
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(position))
+
+    def encode_cursor(self, position):
+        timestamp, pk = position
+        payload = json.dumps([timestamp.isoformat(), pk]).encode()
+        return base64.urlsafe_b64encode(payload).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw_timestamp, pk = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            timestamp = parse_datetime(raw_timestamp)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if timestamp is None:
+            raise NotFound(self.invalid_cursor_message)
+        return timestamp, pk
+
+
+class OptInKeysetPagination(KeysetPagination):
+    """
+    Keyset pagination for clients that ask for it, ``fallback_class``
+    (page numbers by default, or no pagination when None) for everyone else.
+    """
+
+    fallback_class = StandardResultsPagination
+    mode_query_param = "pagination"
+    mode_query_value = "cursor"
+
+    def wants_keyset(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == self.mode_query_value
+            or self.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.fallback = None
+        if self.wants_keyset(request):
+            return super().paginate_queryset(queryset, request, view)
+        if self.fallback_class is None:
+            return None
+        self.fallback = self.fallback_class()
+        return self.fallback.paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.fallback = None
+        if self.wants_keyset(request):
+            return await super().apaginate_queryset(queryset, request, view)
+        if self.fallback_class is None:
+            return None
+        self.fallback = self.fallback_class()
+        return await self.fallback.apaginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class PostPagination(OptInKeysetPagination):
+    ordering = ("-created_at", "-id")
+
+
+class CommentPagination(OptInKeysetPagination):
+    ordering = ("created_at", "id")
+
+
+class NotificationPagination(OptInKeysetPagination):
+    ordering = ("-timestamp", "-id")
+    # The notifications list has always returned every row unpaginated
+    fallback_class = None
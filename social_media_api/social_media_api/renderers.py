@@ -0,0 +1,42 @@
+"""
+JSON renderer backed by orjson when it is installed.
+
+Output is byte-for-byte what DRF's JSONRenderer produces for the same data:
+compact separators, UTF-8, and \\u2028/\\u2029 escaped. Types orjson would
+format differently (datetimes, decimals, lazy strings, ...) are handed to
+DRF's encoder. Indented output, and everything when orjson is missing, falls
+back to the stock renderer.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    if orjson
+    else 0
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    def can_render_fast(self, accepted_media_type, renderer_context):
+        return (
+            orjson is not None
+            and self.compact
+            and not self.ensure_ascii
+            and self.get_indent(accepted_media_type, renderer_context or {}) is None
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if not self.can_render_fast(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        encoder = self.encoder_class()
+        ret = orjson.dumps(data, default=encoder.default, option=ORJSON_OPTIONS)
+        # Same escaping as JSONRenderer: keep the output a JavaScript subset
+        return ret.replace("\u2028".encode(), b"\\u2028").replace("\u2029".encode(), b"\\u2029")
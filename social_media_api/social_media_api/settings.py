@@ -98,6 +98,20 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Use a shared backend (e.g. Redis or Memcached) when running several workers.
+
+CACHES = {
+    "default": {
+        "BACKEND": config(
+            "CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": config("CACHE_LOCATION", default="social-media-api"),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -144,11 +158,31 @@ MEDIA_ROOT = BASE_DIR / "media"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        # Signed, expiring tokens (accounts.tokens) with cached lookups;
+        # legacy authtoken keys are still accepted
+        "accounts.authentication.ExpiringTokenAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ],
+    # Token buckets per client, plus per endpoint for views with a
+    # throttle_scope; see social_media_api.throttling
+    "DEFAULT_THROTTLE_CLASSES": [
+        "social_media_api.throttling.UserTokenBucketThrottle",
+        "social_media_api.throttling.ScopedTokenBucketThrottle",
+    ],
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": config("THROTTLE_RATE_ANON", default="300/min"),
+        "user": config("THROTTLE_RATE_USER", default="1200/min"),
+        "feed": config("THROTTLE_RATE_FEED", default="120/min"),
+        "likes": config("THROTTLE_RATE_LIKES", default="120/min"),
+        "bulk": config("THROTTLE_RATE_BULK", default="10/min"),
+    },
+    # Same output as JSONRenderer, rendered with orjson when installed
+    "DEFAULT_RENDERER_CLASSES": [
+        "social_media_api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
 }
 
 if not DEBUG:
@@ -162,4 +196,70 @@ if not DEBUG:
     SECURE_HSTS_INCLUDE_SUBDOMAINS = True
     SECURE_HSTS_PRELOAD = True
 
-AUTH_USER_MODEL = 'accounts.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'accounts.User'
+
+# Timelines: posts are pushed to followers on write, except for authors with
+# at least this many followers, whose posts are pulled at read time instead.
+TIMELINE_FANOUT_THRESHOLD = config("TIMELINE_FANOUT_THRESHOLD", default=10000, cast=int)
+
+# Unread notification counters are recounted at least this often (seconds),
+# which bounds how long a recount racing a write can leave one off
+NOTIFICATION_UNREAD_COUNT_TIMEOUT = config(
+    "NOTIFICATION_UNREAD_COUNT_TIMEOUT", default=60 * 5, cast=int
+)
+
+# "inline" creates notifications directly on the request path; "queue" writes
+# notification events for the process_notifications worker, which must then
+# be running or no notifications are delivered.
+NOTIFICATION_DISPATCH = config("NOTIFICATION_DISPATCH", default="inline")
+
+# Unread notifications for the same recipient, verb and target created within
+# this many seconds are aggregated into one row ("alice and 3 others ...").
+NOTIFICATION_AGGREGATION_WINDOW = config(
+    "NOTIFICATION_AGGREGATION_WINDOW", default=60 * 60 * 24, cast=int
+)
+
+# Seconds to cache the set of account ids each user follows
+FOLLOWING_CACHE_TIMEOUT = config("FOLLOWING_CACHE_TIMEOUT", default=60 * 60, cast=int)
+
+# Seconds before precomputed "people you may know" lists expire
+RECOMMENDATIONS_CACHE_TIMEOUT = config(
+    "RECOMMENDATIONS_CACHE_TIMEOUT", default=60 * 60 * 6, cast=int
+)
+
+# Seconds anonymous post list/detail responses stay cached; writes invalidate
+# them sooner through per-post version stamps (see posts.response_cache)
+POST_RESPONSE_CACHE_TIMEOUT = config("POST_RESPONSE_CACHE_TIMEOUT", default=60 * 5, cast=int)
+
+# Where throttling state lives: "cache" (fixed-window counters shared
+# through CACHES; per process with the default LocMemCache) or "memory"
+# (token buckets per process, for single-process deployments)
+THROTTLE_BACKEND = config("THROTTLE_BACKEND", default="cache")
+
+# Authenticated tokens are cached for this many seconds in each process and
+# for TOKEN_AUTH_CACHE_TIMEOUT seconds in the shared cache
+TOKEN_AUTH_LOCAL_TTL = config("TOKEN_AUTH_LOCAL_TTL", default=30, cast=int)
+TOKEN_AUTH_CACHE_TIMEOUT = config("TOKEN_AUTH_CACHE_TIMEOUT", default=60 * 5, cast=int)
+
+# Seconds an API token issued at login or registration stays valid
+AUTH_TOKEN_TTL = config("AUTH_TOKEN_TTL", default=60 * 60 * 24 * 14, cast=int)
+
+# Date (or ISO datetime) from which legacy authtoken keys are refused and
+# purge_tokens deletes them; empty keeps accepting them
+LEGACY_TOKEN_SUNSET = config("LEGACY_TOKEN_SUNSET", default="")
+
+# Notification event streams: "memory" wakes streams in the delivering
+# process, "cache" polls stamps in the shared cache every POLL_INTERVAL
+# seconds. Streams send a heartbeat (and re-read the table) every HEARTBEAT
+# seconds and close after TIMEOUT seconds; clients resume with Last-Event-ID.
+NOTIFICATION_STREAM_BROKER = config("NOTIFICATION_STREAM_BROKER", default="memory")
+NOTIFICATION_STREAM_POLL_INTERVAL = config(
+    "NOTIFICATION_STREAM_POLL_INTERVAL", default=1.0, cast=float
+)
+NOTIFICATION_STREAM_HEARTBEAT = config("NOTIFICATION_STREAM_HEARTBEAT", default=15, cast=int)
+NOTIFICATION_STREAM_TIMEOUT = config("NOTIFICATION_STREAM_TIMEOUT", default=60 * 5, cast=int)
+
+# prune_notifications deletes read notifications older than RETENTION_DAYS
+# and folds read ones for the same target older than COMPACT_AFTER_DAYS
+NOTIFICATION_RETENTION_DAYS = config("NOTIFICATION_RETENTION_DAYS", default=90, cast=int)
+NOTIFICATION_COMPACT_AFTER_DAYS = config("NOTIFICATION_COMPACT_AFTER_DAYS", default=7, cast=int)
@@ -0,0 +1,198 @@
+"""
+Token bucket request throttling.
+
+Each client gets a bucket per scope holding up to N tokens, refilled at N
+per period, for rates written the DRF way ("120/min"). A request takes one
+token; an empty bucket rejects it with 429 and a Retry-After header saying
+when the next token arrives. Unlike DRF's SimpleRateThrottle, which keeps
+a list of request timestamps per client, a bucket is two numbers and each
+check is O(1).
+
+Two throttles are installed by default:
+
+* UserTokenBucketThrottle: one bucket per user (or per IP for anonymous
+  clients) across the whole API, scope "user" or "anon".
+* ScopedTokenBucketThrottle: a bucket per user and endpoint for views
+  that set `throttle_scope`; function views use the `throttle_scope`
+  decorator.
+
+By default the limits are kept in the Django cache, which is shared between
+workers when CACHES points at Redis or Memcached. The cache API has no
+atomic read-modify-write for a bucket, so there the limit is counted in
+fixed windows of one period with cache.incr() instead (see
+CacheWindowStore). Set THROTTLE_BACKEND = "memory" for single-process
+deployments to keep real buckets in a bounded in-process LRU instead; with
+the default LocMemCache the cache is per process anyway. Allowed/throttled counts per scope are kept in
+process and served to staff users by social_media_api.views.throttle_metrics.
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+CACHE_KEY = "throttle:{scope}:{ident}"
+# Most buckets kept by the in-memory backend; the least recently used go first
+MEMORY_MAX_BUCKETS = 100_000
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 60 * 60 * 24}
+
+
+def parse_rate(rate):
+    """Parse a rate such as "120/min" into (capacity, tokens per second)"""
+    count, period = rate.split("/")
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+def refill(state, now, capacity, refill_rate):
+    """Take a token from a bucket; returns (allowed, new state, seconds to wait)"""
+    tokens, updated = state if state is not None else (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * refill_rate)
+    if tokens >= 1:
+        return True, (tokens - 1, now), 0
+    return False, (tokens, now), (1 - tokens) / refill_rate
+
+
+class MemoryBucketStore:
+    """Buckets in a process-local LRU; every operation is O(1)"""
+
+    def __init__(self, max_buckets=MEMORY_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate, now):
+        with self.lock:
+            allowed, state, wait = refill(self.buckets.get(key), now, capacity, refill_rate)
+            self.buckets[key] = state
+            self.buckets.move_to_end(key)
+            if len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        return allowed, wait
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class CacheWindowStore:
+    """
+    Fixed-window counters in the Django cache, shared by every worker using it.
+
+    Each client gets a counter per period-long window: cache.add() starts it
+    and cache.incr() takes a slot, both atomic on every backend, so a check
+    is two round trips with no lock to wait for and concurrent requests
+    cannot share the last slot. Unlike a bucket, a window allows its full
+    capacity again as soon as it ends, so a client can fit up to twice the
+    rate into one period that straddles a window boundary.
+    """
+
+    def consume(self, key, capacity, refill_rate, now):
+        period = round(capacity / refill_rate)
+        window = int(now // period)
+        window_key = f"{key}:{window}"
+        # Kept a second past the window's end for clock skew between workers
+        timeout = period + 1
+        cache.add(window_key, 0, timeout)
+        try:
+            count = cache.incr(window_key)
+        except ValueError:
+            # Evicted between add() and incr(); start the window again
+            count = 1 if cache.add(window_key, 1, timeout) else cache.incr(window_key)
+        if count <= capacity:
+            return True, 0
+        return False, (window + 1) * period - now
+
+
+class ThrottleMetrics:
+    """Per-process counts of allowed and throttled requests by scope"""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def record(self, scope, allowed):
+        with self.lock:
+            self.counts[(scope, "allowed" if allowed else "throttled")] += 1
+
+    def snapshot(self):
+        with self.lock:
+            counts = dict(self.counts)
+        scopes = sorted({scope for scope, _ in counts})
+        return {
+            scope: {
+                "allowed": counts.get((scope, "allowed"), 0),
+                "throttled": counts.get((scope, "throttled"), 0),
+            }
+            for scope in scopes
+        }
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+
+
+memory_store = MemoryBucketStore()
+cache_store = CacheWindowStore()
+metrics = ThrottleMetrics()
+
+
+def get_store():
+    if getattr(settings, "THROTTLE_BACKEND", "cache") == "memory":
+        return memory_store
+    return cache_store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Base class: subclasses pick the scope and client identity"""
+
+    def get_scope(self, request, view):
+        raise NotImplementedError
+
+    def get_ident_for(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return f"ip:{self.get_ident(request)}"
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope) if scope else None
+        if rate is None:
+            return True
+
+        capacity, refill_rate = parse_rate(rate)
+        key = CACHE_KEY.format(scope=scope, ident=self.get_ident_for(request))
+        allowed, self.wait_seconds = get_store().consume(key, capacity, refill_rate, time.time())
+        metrics.record(scope, allowed)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """One bucket per user, or per IP address for anonymous clients"""
+
+    def get_scope(self, request, view):
+        return "user" if request.user and request.user.is_authenticated else "anon"
+
+
+class ScopedTokenBucketThrottle(TokenBucketThrottle):
+    """A bucket per client for each view that sets `throttle_scope`"""
+
+    def get_scope(self, request, view):
+        return getattr(view, "throttle_scope", None)
+
+
+def throttle_scope(scope):
+    """Set `throttle_scope` on a function view; apply it above @api_view"""
+
+    def decorator(view):
+        view.cls.throttle_scope = scope
+        return view
+
+    return decorator
+
@@ -18,12 +18,14 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from .views import throttle_metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
      path("api/accounts/", include("accounts.urls")),
     path("api/", include("posts.urls")),
     path("api/notifications/", include("notifications.urls")), # add this
+    path("api/throttling/metrics/", throttle_metrics, name="throttle-metrics"),
 ]
 
 # Serve media files in development
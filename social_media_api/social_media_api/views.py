@@ -0,0 +1,20 @@
+from django.conf import settings
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .throttling import metrics
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAdminUser])
+def throttle_metrics(request):
+    """Allowed and throttled request counts per scope in this process"""
+    return Response(
+        {
+            "backend": getattr(settings, "THROTTLE_BACKEND", "cache"),
+            "rates": api_settings.DEFAULT_THROTTLE_RATES,
+            "scopes": metrics.snapshot(),
+        }
+    )